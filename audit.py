@@ -0,0 +1,198 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+from contextlib import closing
+from datetime import datetime
+
+from db import SqlServerBackend, SqliteBackend, sql_server_connection_string
+from schema import TABLES
+
+
+FLUSH_INTERVAL = 2.0
+FLUSH_THRESHOLD = 200
+MAX_BUFFERED = 10000
+# Failed flushes are retried after FLUSH_INTERVAL, doubling up to this
+MAX_RETRY_INTERVAL = 300.0
+IMAGE_HALVES = {'INSERT': ('inserted',), 'UPDATE': ('deleted', 'inserted'), 'DELETE': ('deleted',)}
+IMAGE_TYPES = {'INTEGER': 'BIGINT', 'REAL': 'FLOAT', 'TEXT': 'NVARCHAR(MAX)'}
+
+INSERT_SQL = """
+INSERT INTO Audit_Log (changed_at, changed_by, action, entity, entity_id, before_values, after_values)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def to_json(values):
+    if values is None:
+        return None
+    return json.dumps(values, default=str, sort_keys=True)
+
+
+def output_into(action, table, statement):
+    # A bare OUTPUT clause fails (Msg 334) once the target table has an enabled trigger, so
+    # the {output} placeholder in statement becomes OUTPUT ... INTO a table variable, which
+    # is selected afterwards with the columns in output_images' layout.
+    columns = [(half, name, col_type) for half in IMAGE_HALVES[action] for name, col_type in TABLES[table]]
+    declared = ', '.join(f"{half}_{name} {IMAGE_TYPES[col_type]}" for half, name, col_type in columns)
+    output = ', '.join(f"{half}.{name}" for half, name, _ in columns)
+    selected = ', '.join(f"{half}_{name} AS {name}" for half, name, _ in columns)
+    return (f"SET NOCOUNT ON;\nDECLARE @images TABLE ({declared});\n"
+            f"{statement.replace('{output}', f'OUTPUT {output} INTO @images').strip()};\n"
+            f"SELECT {selected} FROM @images;")
+
+
+def output_images(action, cursor):
+    # Splits the rows output_into selects (deleted then inserted columns) into (before, after) dicts:
+    # UPDATE returns both halves, INSERT only inserted.*, DELETE only deleted.*.
+    rows = cursor.fetchall()
+    names = [col[0] for col in cursor.description]
+    images = []
+    for row in rows:
+        if action == 'UPDATE':
+            half = len(names) // 2
+            images.append((dict(zip(names[:half], row[:half])), dict(zip(names[half:], row[half:]))))
+        elif action == 'INSERT':
+            images.append((None, dict(zip(names, row))))
+        else:
+            images.append((dict(zip(names, row)), None))
+    return images
+
+
+class AuditLog:
+    def __init__(self, backend, user, flush_interval=FLUSH_INTERVAL, flush_threshold=FLUSH_THRESHOLD, enabled=True):
+        # enabled=False (Audit_Log is missing) makes record() a no-op instead of failing every flush
+        self.backend = backend
+        self.user = user
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.enabled = enabled
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        # Consecutive failed flushes; the retry interval backs off while this is non-zero
+        self.failures = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        if enabled:
+            self.thread.start()
+        else:
+            logging.warning("Audit_Log is missing, data changes are not audited. "
+                            "Run 'python migrations.py upgrade' to create it.")
+
+    def record(self, action, entity, entity_id, before=None, after=None):
+        if not self.enabled:
+            return
+        entry = (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'), self.user, action, entity, str(entity_id),
+                 to_json(before), to_json(after))
+        with self.lock:
+            self.buffer.append(entry)
+            size = len(self.buffer)
+        if size >= self.flush_threshold and not self.failures:
+            self.wakeup.set()
+
+    def retry_interval(self):
+        return min(self.flush_interval * 2 ** self.failures, MAX_RETRY_INTERVAL)
+
+    def run(self):
+        while not self.closed:
+            self.wakeup.wait(self.retry_interval())
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            entries, self.buffer = self.buffer, []
+        if not entries:
+            return 0
+        try:
+            with closing(self.backend.connect()) as conn:
+                cursor = conn.cursor()
+                if self.backend.dialect == 'mssql':
+                    cursor.fast_executemany = True
+                cursor.executemany(INSERT_SQL, entries)
+                conn.commit()
+        except Exception as e:
+            # Log the first failure of a run of them; the rest only at debug level
+            if not self.failures:
+                logging.error(f"Audit flush of {len(entries)} entries failed, retrying with backoff: {e}")
+            else:
+                logging.debug(f"Audit flush retry {self.failures} failed: {e}")
+            self.failures += 1
+            with self.lock:
+                self.buffer = entries + self.buffer
+                if len(self.buffer) > MAX_BUFFERED:
+                    dropped = len(self.buffer) - MAX_BUFFERED
+                    self.buffer = self.buffer[dropped:]
+                    logging.warning(f"Audit buffer full, dropped {dropped} oldest entries")
+            return 0
+        if self.failures:
+            logging.info(f"Audit flush succeeded after {self.failures} failed attempt(s)")
+            self.failures = 0
+        return len(entries)
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+
+
+def query_audit(backend, start=None, end=None, entity=None, entity_id=None, limit=1000):
+    # Served by IX_Audit_Log_entity when an entity is given, otherwise IX_Audit_Log_changed_at
+    conditions, params = [], []
+    if entity:
+        conditions.append("entity = ?")
+        params.append(entity)
+    if entity_id is not None:
+        conditions.append("entity_id = ?")
+        params.append(str(entity_id))
+    if start:
+        conditions.append("changed_at >= ?")
+        params.append(start)
+    if end:
+        conditions.append("changed_at < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    columns = "changed_at, changed_by, action, entity, entity_id, before_values, after_values"
+    if backend.dialect == 'mssql':
+        query = f"SELECT TOP ({int(limit)}) {columns} FROM Audit_Log {where} ORDER BY changed_at DESC"
+    else:
+        query = f"SELECT {columns} FROM Audit_Log {where} ORDER BY changed_at DESC LIMIT {int(limit)}"
+    with closing(backend.connect()) as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the pharmacy audit trail')
+    parser.add_argument('--server', default='LAPTOP-VIO2PNI9', help='SQL Server instance name')
+    parser.add_argument('--database', default='project2', help='Database name')
+    parser.add_argument('--sqlite', help='Path to an embedded SQLite database instead of SQL Server')
+    parser.add_argument('--since', help='Start of the time range (YYYY-MM-DD[ HH:MM:SS])')
+    parser.add_argument('--until', help='End of the time range, exclusive')
+    parser.add_argument('--entity', help='Table name, e.g. Medication')
+    parser.add_argument('--id', help='Entity ID, e.g. a med_id')
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.sqlite:
+        backend = SqliteBackend(args.sqlite)
+    else:
+        backend = SqlServerBackend(sql_server_connection_string(args.server, args.database))
+    for changed_at, changed_by, action, entity, entity_id, before, after in query_audit(
+            backend, args.since, args.until, args.entity, args.id, args.limit):
+        print(f"{changed_at} {changed_by} {action} {entity} {entity_id}")
+        if before:
+            print(f"    before: {before}")
+        if after:
+            print(f"    after:  {after}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
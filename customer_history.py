@@ -0,0 +1,75 @@
+from row_mapping import ColumnSpec, RowMapper
+from tree_sort import TableQuery
+
+
+HISTORY_PAGE_SIZE = 50
+
+# Sale line items and prescriptions for one customer, newest first. Each branch is served by
+# a (cust_id, date) index, and (kind, ref_id, line_id) identifies a row for keyset paging.
+HISTORY_SOURCE = """(
+    SELECT 'Sale' AS kind, s.sale_date AS event_date, s.sale_id AS ref_id, m.med_name AS detail,
+           d.sell_quantity AS quantity, d.total AS amount, d.med_id AS line_id
+    FROM Sales s
+    JOIN Sales_Details d ON d.sale_id = s.sale_id
+    LEFT JOIN Medication m ON m.med_id = d.med_id
+    WHERE s.cust_id = ?
+    UNION ALL
+    SELECT 'Prescription', p.p_issue_date, p.p_id, p.doctor, NULL, NULL, 0
+    FROM Prescription p
+    WHERE p.cust_id = ?
+) history"""
+
+HISTORY = RowMapper(HISTORY_SOURCE, [
+    ColumnSpec('Date', 'event_date', 'date'), ColumnSpec('Type', 'kind'), ColumnSpec('Ref ID', 'ref_id', 'int'),
+    ColumnSpec('Item / Doctor', 'detail', width=160), ColumnSpec('Quantity', 'quantity', 'int'),
+    ColumnSpec('Amount', 'amount', 'money'),
+], ['kind', 'ref_id', 'line_id'])
+
+
+class CustomerHistory:
+    # Pages of one customer's history are cached for the session, so selecting the
+    # customer again shows what was already fetched without another query.
+    def __init__(self, fetch, dialect='mssql', page_size=HISTORY_PAGE_SIZE):
+        self.fetch = fetch
+        self.page_size = page_size
+        columns = [(spec.heading, spec.column) for spec in HISTORY.columns] + [('Line', 'line_id')]
+        self.query = TableQuery(HISTORY_SOURCE, columns, HISTORY.key_columns, dialect)
+        self.entries = {}
+
+    def rows(self, cust_id):
+        cust_id = str(cust_id).strip()
+        if cust_id not in self.entries:
+            self.entries[cust_id] = {'rows': [], 'after': None, 'complete': False}
+            self.load_more(cust_id)
+        return self.entries[cust_id]['rows']
+
+    def has_more(self, cust_id):
+        entry = self.entries.get(str(cust_id).strip())
+        return entry is not None and not entry['complete']
+
+    def load_more(self, cust_id):
+        cust_id = str(cust_id).strip()
+        entry = self.entries.get(cust_id)
+        if entry is None:
+            return self.rows(cust_id)
+        if entry['complete']:
+            return []
+        sql, params = self.query.select(sort_column='event_date', descending=True, after=entry['after'],
+                                        limit=self.page_size)
+        rows = self.fetch(sql, (cust_id, cust_id) + params)
+        if rows is None:
+            # The query failed; drop the entry so the next selection retries
+            del self.entries[cust_id]
+            return []
+        if rows:
+            last = rows[-1]
+            entry['after'] = {col: last[i] for i, (_, col) in enumerate(self.query.columns)}
+        entry['rows'].extend(rows)
+        entry['complete'] = len(rows) < self.page_size
+        return rows
+
+    def invalidate(self, cust_id=None):
+        if cust_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(str(cust_id).strip(), None)
@@ -0,0 +1,37 @@
+import sqlite3
+
+
+def sql_server_connection_string(server, database, trusted_connection='yes'):
+    return (
+        'DRIVER={SQL Server};'
+        f'SERVER={server};'
+        f'DATABASE={database};'
+        f'Trusted_Connection={trusted_connection};'
+    )
+
+
+class SqlServerBackend:
+    dialect = 'mssql'
+
+    def __init__(self, conn_str):
+        self.conn_str = conn_str
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.conn_str)
+
+    def describe(self):
+        return self.conn_str
+
+
+class SqliteBackend:
+    dialect = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    def describe(self):
+        return f"sqlite:{self.path}"
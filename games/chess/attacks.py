@@ -0,0 +1,87 @@
+from bitboard import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, lsb, rook_attacks, squares
+from gamestate import BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK
+
+
+def piece_attacks(piece, sq, occ):
+    piece_type = piece & 7
+    if piece_type == PAWN:
+        return PAWN_ATTACKS[piece >> 3][sq]
+    if piece_type == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if piece_type == BISHOP:
+        return bishop_attacks(sq, occ)
+    if piece_type == ROOK:
+        return rook_attacks(sq, occ)
+    if piece_type == QUEEN:
+        return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+    return KING_ATTACKS[sq]
+
+
+def attackers_to(state, sq, color, occ=None):
+    # Pieces of `color` attacking sq: look outward from sq with each piece's own pattern
+    bitboards = state.bitboards
+    base = color << 3
+    if occ is None:
+        occ = state.occupied()
+    queens = bitboards[base | QUEEN]
+    return ((PAWN_ATTACKS[color ^ 1][sq] & bitboards[base | PAWN])
+            | (KNIGHT_ATTACKS[sq] & bitboards[base | KNIGHT])
+            | (KING_ATTACKS[sq] & bitboards[base | KING])
+            | (bishop_attacks(sq, occ) & (bitboards[base | BISHOP] | queens))
+            | (rook_attacks(sq, occ) & (bitboards[base | ROOK] | queens)))
+
+
+class AttackMaps:
+    # Per-square attack sets kept current across make_move/unmake_move. A move changes the
+    # occupancy of at most four squares; only pieces standing on them and sliders whose
+    # current attack set reaches one of them need recomputing. The per-side unions are
+    # rebuilt on first use after a change, so a search that never asks pays nothing for them.
+    __slots__ = ('state', 'attacks_from', 'attacked', 'stale')
+
+    def __init__(self, state):
+        self.state = state
+        self.attacks_from = [0] * 64
+        self.attacked = [0, 0]
+        self.refresh()
+
+    def refresh(self):
+        state = self.state
+        occ = state.occupied()
+        board = state.board
+        self.attacks_from = [piece_attacks(board[sq], sq, occ) if board[sq] else 0 for sq in range(64)]
+        self.stale = True
+
+    def update(self, changed):
+        state = self.state
+        board, bitboards = state.board, state.bitboards
+        occ = state.occupied()
+        attacks_from = self.attacks_from
+        for sq in squares(changed):
+            piece = board[sq]
+            attacks_from[sq] = piece_attacks(piece, sq, occ) if piece else 0
+        sliders = (bitboards[BISHOP] | bitboards[ROOK] | bitboards[QUEEN]
+                   | bitboards[8 | BISHOP] | bitboards[8 | ROOK] | bitboards[8 | QUEEN]) & ~changed
+        for sq in squares(sliders):
+            if attacks_from[sq] & changed:
+                attacks_from[sq] = piece_attacks(board[sq], sq, occ)
+        self.stale = True
+
+    def attacked_by(self, color):
+        if self.stale:
+            attacks_from, board = self.attacks_from, self.state.board
+            attacked = [0, 0]
+            for sq in squares(self.state.occupied()):
+                attacked[board[sq] >> 3] |= attacks_from[sq]
+            self.attacked = attacked
+            self.stale = False
+        return self.attacked[color]
+
+    def in_check(self, color):
+        king = self.state.bitboards[color << 3 | KING]
+        if self.stale:
+            # Cheaper to look outward from the king than to rebuild the union
+            return bool(king) and bool(attackers_to(self.state, lsb(king), color ^ 1))
+        return bool(self.attacked[color ^ 1] & king)
+
+    def is_attacked(self, sq, by_color):
+        return bool(self.attacked_by(by_color) >> sq & 1)
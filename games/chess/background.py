@@ -0,0 +1,106 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+from engine import SearchResult
+from transposition import DEFAULT_HASH_MB
+
+UCI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uci.py')
+
+
+def parse_info(line):
+    # 'info depth 5 score cp 30 nodes ... pv e2e4 e7e5' -> SearchResult with pv as move names
+    tokens = line.split()
+    values = {}
+    for name in ('depth', 'cp', 'nodes', 'time'):
+        if name in tokens:
+            values[name] = int(tokens[tokens.index(name) + 1])
+    pv = tuple(tokens[tokens.index('pv') + 1:]) if 'pv' in tokens else ()
+    return SearchResult(pv[0] if pv else None, values.get('cp', 0), values.get('depth', 0),
+                        values.get('nodes', 0), values.get('time', 0) / 1000, pv)
+
+
+class BackgroundEngine:
+    # Runs uci.py in a child process so the pygame loop never waits on a search. A reader
+    # thread queues the engine's output; poll() hands it to the loop without blocking.
+    # Every go is recorded as 'think' or 'ponder', and each bestmove answers the oldest one,
+    # so the move from a cancelled ponder is recognised and dropped.
+    def __init__(self, hash_mb=DEFAULT_HASH_MB, book=None):
+        self.process = subprocess.Popen([sys.executable, UCI_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+        self.lines = queue.Queue()
+        self.reader = threading.Thread(target=self.read, daemon=True)
+        self.reader.start()
+        self.pending = []
+        self.stop_sent = False
+        self.send(f'setoption name Hash value {hash_mb}')
+        if book:
+            self.send(f'setoption name Book value {os.path.abspath(book)}')
+
+    def read(self):
+        for line in self.process.stdout:
+            self.lines.put(line.strip())
+
+    def send(self, line):
+        self.process.stdin.write(line + '\n')
+        self.process.stdin.flush()
+
+    @property
+    def thinking(self):
+        return 'think' in self.pending
+
+    @property
+    def pondering(self):
+        return bool(self.pending) and self.pending[-1] == 'ponder'
+
+    def start(self, kind, fen, moves, go):
+        self.stop()
+        self.stop_sent = False
+        position = f"position fen {fen}" + (f" moves {' '.join(moves)}" if moves else '')
+        self.send(position)
+        self.send(go)
+        self.pending.append(kind)
+
+    def think(self, fen, moves, depth=None, time_limit=None):
+        go = f'go depth {depth}' if depth else f'go movetime {int((time_limit or 1.0) * 1000)}'
+        self.start('think', fen, moves, go)
+
+    def ponder(self, fen, moves):
+        # Searches the position the human is to move in until stopped, leaving what it learns
+        # in the engine's table for the reply
+        self.start('ponder', fen, moves, 'go infinite')
+
+    def stop(self):
+        # Once per search; the loop may ask on every frame until the bestmove arrives
+        if self.pending and not self.stop_sent:
+            self.send('stop')
+            self.stop_sent = True
+
+    def new_game(self):
+        self.stop()
+        self.send('ucinewgame')
+
+    def poll(self):
+        # ('info', kind, SearchResult) for progress and ('bestmove', kind, move name) when a
+        # search ends; kind is 'think' or 'ponder'
+        events = []
+        while True:
+            try:
+                line = self.lines.get_nowait()
+            except queue.Empty:
+                return events
+            if line.startswith('info') and self.pending:
+                events.append(('info', self.pending[0], parse_info(line)))
+            elif line.startswith('bestmove') and self.pending:
+                events.append(('bestmove', self.pending.pop(0), line.split()[1]))
+
+    def close(self):
+        if self.process.poll() is None:
+            self.stop()
+            self.send('quit')
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
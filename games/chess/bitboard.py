@@ -0,0 +1,179 @@
+# 64-bit bitboards for the chess game. Squares are numbered a1 = 0, b1 = 1 ... h8 = 63.
+# main.py draws the board with white at the top and the files mirrored (the king starts
+# at x = 3), so its (x, y) screen coordinates map to square y * 8 + (7 - x).
+
+FULL = 0xFFFFFFFFFFFFFFFF
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+# c2-h7 diagonal; multiplying an a-file gathers its bits onto the 8th rank
+DIAG_C2_H7 = 0x0080402010080400
+
+WHITE = 0
+BLACK = 1
+
+ROOK_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_STEPS = ((1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2))
+KING_STEPS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+
+def square(x, y):
+    return y * 8 + 7 - x
+
+
+def coords(sq):
+    return 7 - (sq & 7), sq >> 3
+
+
+def squares(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def from_locations(locations):
+    bb = 0
+    for x, y in locations:
+        bb |= 1 << square(x, y)
+    return bb
+
+
+def to_locations(bb):
+    return [coords(sq) for sq in squares(bb)]
+
+
+def step_targets(sq, steps):
+    file, rank = sq & 7, sq >> 3
+    bb = 0
+    for df, dr in steps:
+        f, r = file + df, rank + dr
+        if 0 <= f < 8 and 0 <= r < 8:
+            bb |= 1 << (r * 8 + f)
+    return bb
+
+
+def ray_attacks(sq, occ, directions):
+    # Walks each ray up to and including the first blocker; only used to build the tables
+    file, rank = sq & 7, sq >> 3
+    bb = 0
+    for df, dr in directions:
+        f, r = file + df, rank + dr
+        while 0 <= f < 8 and 0 <= r < 8:
+            bb |= 1 << (r * 8 + f)
+            if occ >> (r * 8 + f) & 1:
+                break
+            f, r = f + df, r + dr
+    return bb
+
+
+def line_mask(sq, df, dr):
+    # Squares on the line through sq in direction (df, dr), excluding sq itself
+    return ray_attacks(sq, 0, ((df, dr), (-df, -dr)))
+
+
+def between_mask(a, b):
+    # Squares strictly between a and b when they share a rank, file or diagonal, else 0
+    df, dr = (b & 7) - (a & 7), (b >> 3) - (a >> 3)
+    if not (df == 0 or dr == 0 or abs(df) == abs(dr)) or a == b:
+        return 0
+    df, dr = (df > 0) - (df < 0), (dr > 0) - (dr < 0)
+    bb = 0
+    f, r = (a & 7) + df, (a >> 3) + dr
+    while r * 8 + f != b:
+        bb |= 1 << (r * 8 + f)
+        f, r = f + df, r + dr
+    return bb
+
+
+KNIGHT_ATTACKS = [step_targets(sq, KNIGHT_STEPS) for sq in range(64)]
+KING_ATTACKS = [step_targets(sq, KING_STEPS) for sq in range(64)]
+PAWN_ATTACKS = [[step_targets(sq, ((1, 1), (-1, 1))) for sq in range(64)],
+                [step_targets(sq, ((1, -1), (-1, -1))) for sq in range(64)]]
+
+BETWEEN = [[between_mask(a, b) for b in range(64)] for a in range(64)]
+
+FILE_MASKS = [line_mask(sq, 0, 1) for sq in range(64)]
+DIAGONAL_MASKS = [line_mask(sq, 1, 1) for sq in range(64)]
+ANTI_DIAGONAL_MASKS = [line_mask(sq, 1, -1) for sq in range(64)]
+
+
+# Kindergarten bitboards: the occupancy of one line is gathered into a 6-bit index with a
+# shift or a single multiplication, then looked up in a per-square table. That gives the
+# same O(1) lookups as magic bitboards without a magic-number search at import time.
+def gathered_index(occ, mask, multiplier):
+    return (((occ & mask) * multiplier) & FULL) >> 58
+
+
+def file_index(sq, occ):
+    return ((((occ >> (sq & 7)) & FILE_A) * DIAG_C2_H7) & FULL) >> 58
+
+
+def build_line_table(sq, directions, index_of):
+    # Every 6-bit index maps back to the inner squares it encodes; the attacks for that
+    # occupancy are found by walking the rays once at import time.
+    mask = ray_attacks(sq, 0, directions)
+    contributions = {}
+    for target in squares(mask):
+        index = index_of(1 << target)
+        if index:
+            contributions[index] = target
+    table = [0] * 64
+    for index in range(64):
+        occ = 0
+        for bit_value, target in contributions.items():
+            if index & bit_value:
+                occ |= 1 << target
+        table[index] = ray_attacks(sq, occ, directions)
+    return table
+
+
+RANK_TABLES = [build_line_table(sq, ((1, 0), (-1, 0)), lambda occ, shift=(sq & ~7) + 1: (occ >> shift) & 63)
+               for sq in range(64)]
+FILE_TABLES = [build_line_table(sq, ((0, 1), (0, -1)), lambda occ, sq=sq: file_index(sq, occ)) for sq in range(64)]
+DIAGONAL_TABLES = [build_line_table(sq, ((1, 1), (-1, -1)),
+                                    lambda occ, mask=DIAGONAL_MASKS[sq]: gathered_index(occ, mask, FILE_B))
+                   for sq in range(64)]
+ANTI_DIAGONAL_TABLES = [build_line_table(sq, ((1, -1), (-1, 1)),
+                                         lambda occ, mask=ANTI_DIAGONAL_MASKS[sq]: gathered_index(occ, mask, FILE_B))
+                        for sq in range(64)]
+RANK_SHIFTS = [(sq & ~7) + 1 for sq in range(64)]
+FILE_SHIFTS = [sq & 7 for sq in range(64)]
+
+
+def rook_attacks(sq, occ):
+    return (RANK_TABLES[sq][(occ >> RANK_SHIFTS[sq]) & 63]
+            | FILE_TABLES[sq][((((occ >> FILE_SHIFTS[sq]) & FILE_A) * DIAG_C2_H7) & FULL) >> 58])
+
+
+def bishop_attacks(sq, occ):
+    return (DIAGONAL_TABLES[sq][(((occ & DIAGONAL_MASKS[sq]) * FILE_B) & FULL) >> 58]
+            | ANTI_DIAGONAL_TABLES[sq][(((occ & ANTI_DIAGONAL_MASKS[sq]) * FILE_B) & FULL) >> 58])
+
+
+def queen_attacks(sq, occ):
+    return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+
+
+def pawn_pushes(sq, color, occ):
+    # Single push, plus the double push from the starting rank when both squares are empty
+    if color == WHITE:
+        one = (1 << (sq + 8)) & ~occ if sq < 56 else 0
+        if one and 8 <= sq < 16:
+            return one | ((one << 8) & ~occ)
+    else:
+        one = (1 << (sq - 8)) & ~occ if sq >= 8 else 0
+        if one and 48 <= sq < 56:
+            return one | ((one >> 8) & ~occ)
+    return one
@@ -0,0 +1,208 @@
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+from collections import defaultdict
+
+from gamestate import BISHOP, CASTLING_ROOKS, FLAG_CASTLE, KING, KNIGHT, PAWN, QUEEN, ROOK, GameState, move_name
+from movegen import generate_moves
+
+# Polyglot book entries: 16 bytes, big-endian key, move, weight and learn fields, sorted
+# by key. GameState keys use Polyglot's Random64 table (see zobrist.py), so books built
+# here and existing Polyglot .bin books can be used interchangeably.
+ENTRY = struct.Struct('>QHHI')
+# Polyglot promotion codes
+PROMOTION_CODES = {KNIGHT: 1, BISHOP: 2, ROOK: 3, QUEEN: 4}
+SAN_PIECES = {'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING}
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+MAX_WEIGHT = 0xFFFF
+
+
+def to_polyglot(move):
+    # Polyglot squares number like ours (a1 = 0); castling is written as the king taking its rook
+    from_sq, to_sq = move & 63, move >> 6 & 63
+    if move >> 15 == FLAG_CASTLE:
+        to_sq = CASTLING_ROOKS[to_sq][0]
+    return to_sq | from_sq << 6 | PROMOTION_CODES.get(move >> 12 & 7, 0) << 12
+
+
+def from_polyglot(state, book_move):
+    # The legal move in state that book_move encodes, or None
+    for move in generate_moves(state):
+        if to_polyglot(move) == book_move:
+            return move
+    return None
+
+
+def parse_san(state, san):
+    san = san.rstrip('+#!?')
+    moves = generate_moves(state)
+    if san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        long_castle = san.count('-') == 2
+        for move in moves:
+            if move >> 15 == FLAG_CASTLE and ((move >> 6 & 7) == 2) == long_castle:
+                return move
+        raise ValueError(f"Illegal castling {san} in {state.fen()}")
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        raise ValueError(f"Unreadable move {san}")
+    piece, file, rank, target, promotion = match.groups()
+    piece_type = SAN_PIECES[piece] if piece else PAWN
+    to_sq = (int(target[1]) - 1) * 8 + 'abcdefgh'.index(target[0])
+    promotion = SAN_PIECES[promotion] if promotion else 0
+    candidates = [move for move in moves
+                  if move >> 6 & 63 == to_sq and state.board[move & 63] & 7 == piece_type
+                  and move >> 12 & 7 == promotion
+                  and (file is None or (move & 7) == 'abcdefgh'.index(file))
+                  and (rank is None or (move & 63) >> 3 == int(rank) - 1)]
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move {san} in {state.fen()}")
+    return candidates[0]
+
+
+def read_pgn(lines):
+    # Yields (result, [SAN moves]) per game; comments, variations, NAGs and move numbers are dropped
+    headers, movetext = {}, []
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            if movetext:
+                yield pgn_game(headers, movetext)
+                headers, movetext = {}, []
+            tag = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+            if tag:
+                headers[tag.group(1)] = tag.group(2)
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+    if movetext:
+        yield pgn_game(headers, movetext)
+
+
+def pgn_game(headers, movetext):
+    text = re.sub(r'\{[^}]*\}|;[^\n]*', ' ', '\n'.join(movetext))
+    while '(' in text:
+        text = re.sub(r'\([^()]*\)', ' ', text)
+    tokens = [token for token in re.sub(r'\$\d+|\d+\.(\.\.)?', ' ', text).split()
+              if token not in ('1-0', '0-1', '1/2-1/2', '*')]
+    return headers.get('Result', '*'), tokens
+
+
+def build_book(games, max_ply=20, min_games=1):
+    # Weights follow Polyglot's convention: 2 per win and 1 per draw for the side that moved.
+    # Returns sorted (key, move, weight) entries.
+    weights = defaultdict(int)
+    counts = defaultdict(int)
+    for result, sans in games:
+        state = GameState()
+        for san in sans[:max_ply]:
+            try:
+                move = parse_san(state, san)
+            except ValueError:
+                break
+            score = {'1-0': (2, 0), '0-1': (0, 2)}.get(result, (1, 1))[state.side]
+            entry = (state.key, to_polyglot(move))
+            weights[entry] += score
+            counts[entry] += 1
+            state.make_move(move)
+    entries = [(key, move, weight) for (key, move), weight in weights.items()
+               if counts[key, move] >= min_games and weight > 0]
+    top = max((weight for _, _, weight in entries), default=0)
+    if top > MAX_WEIGHT:
+        entries = [(key, move, max(1, weight * MAX_WEIGHT // top)) for key, move, weight in entries]
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    return entries
+
+
+def write_book(path, entries):
+    with open(path, 'wb') as f:
+        for key, move, weight in entries:
+            f.write(ENTRY.pack(key, move, weight, 0))
+
+
+class OpeningBook:
+    # Opened with mmap, so nothing is read up front; a probe binary-searches the sorted
+    # entries and touches only the pages it lands on.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // ENTRY.size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    def key_at(self, index):
+        return ENTRY.unpack_from(self.map, index * ENTRY.size)[0]
+
+    def entries(self, key):
+        # [(polyglot move, weight)] for key, heaviest first
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.map, low * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight))
+            low += 1
+        return found
+
+    def choose(self, state, rng=random):
+        # A legal book move for state picked in proportion to weight, or None
+        candidates = []
+        for book_move, weight in self.entries(state.key):
+            move = from_polyglot(state, book_move)
+            if move is not None and weight:
+                candidates.append((move, weight))
+        if not candidates:
+            return None
+        return rng.choices([move for move, _ in candidates], [weight for _, weight in candidates])[0]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or probe an opening book')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='Compile PGN games into a book')
+    build.add_argument('pgn', nargs='+', help='PGN files')
+    build.add_argument('--output', '-o', default='book.bin')
+    build.add_argument('--max-ply', type=int, default=20, help='Plies per game to include')
+    build.add_argument('--min-games', type=int, default=1, help='Games a move needs to be kept')
+    probe = commands.add_parser('probe', help='List book moves for a position')
+    probe.add_argument('book')
+    probe.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        def games():
+            for path in args.pgn:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    yield from read_pgn(f)
+        entries = build_book(games(), args.max_ply, args.min_games)
+        write_book(args.output, entries)
+        print(f"Wrote {len(entries):,} entries to {args.output}")
+        return 0
+
+    book = OpeningBook(args.book)
+    state = GameState(args.fen)
+    found = [(from_polyglot(state, move), weight) for move, weight in book.entries(state.key)]
+    book.close()
+    if not found:
+        print('Position not in book')
+        return 1
+    for move, weight in found:
+        print(f"{move_name(move) if move is not None else '????'}  {weight}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,400 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+from bitboard import BLACK, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, WHITE, bishop_attacks, rook_attacks
+from evaluation import evaluate
+from gamestate import BISHOP, FLAG_EN_PASSANT, KING, KNIGHT, PAWN, QUEEN, ROOK, GameState, move_name
+from movegen import generate_moves, in_check
+from tablebase import DRAW, Tablebases
+from transposition import DEFAULT_HASH_MB, EXACT, LOWER, UPPER, TranspositionTable
+
+# Exchange values by piece type; the king is worth more than anything it could win
+SEE_VALUES = (0, 100, 320, 330, 500, 900, 20000)
+# Captures that cannot lift the stand-pat score to alpha by this margin are skipped
+DELTA_MARGIN = 200
+MATE = 100000
+INFINITY = MATE + 1
+MAX_DEPTH = 64
+# Plies including quiescence; sizes the killer table
+MAX_PLY = 128
+# Scores beyond this are mates (or tablebase wins) in some number of plies: up to MAX_PLY
+# from the root plus, for a tablebase win, up to that many more to mate from the probe
+MATE_BOUND = MATE - 2 * MAX_PLY
+DEFAULT_TIME = 1.0
+# How often, in nodes, the clock is read
+CHECK_INTERVAL = 1024
+# Move ordering bands: table move, then captures and promotions, then killers, then quiet
+# moves by history score (which stays below the killer band)
+TABLE_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 22
+HISTORY_LIMIT = (1 << 22) - 1
+BENCHMARK_POSITIONS = (
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+)
+
+# pv: the expected line from the root, read back from the transposition table
+SearchResult = namedtuple('SearchResult', 'move score depth nodes seconds pv', defaults=((),))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def score_to_table(score, ply):
+    # Mate scores are stored relative to the node, not the root, so they stay valid when
+    # the same position is reached at another ply
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def attackers(state, sq, occ):
+    # Both sides' pieces attacking sq through occupancy occ
+    bitboards = state.bitboards
+    diagonal = bitboards[BISHOP] | bitboards[QUEEN] | bitboards[8 | BISHOP] | bitboards[8 | QUEEN]
+    straight = bitboards[ROOK] | bitboards[QUEEN] | bitboards[8 | ROOK] | bitboards[8 | QUEEN]
+    return ((PAWN_ATTACKS[1][sq] & bitboards[PAWN]) | (PAWN_ATTACKS[0][sq] & bitboards[8 | PAWN])
+            | (KNIGHT_ATTACKS[sq] & (bitboards[KNIGHT] | bitboards[8 | KNIGHT]))
+            | (KING_ATTACKS[sq] & (bitboards[KING] | bitboards[8 | KING]))
+            | (bishop_attacks(sq, occ) & diagonal) | (rook_attacks(sq, occ) & straight)) & occ
+
+
+def see(state, move):
+    # Static exchange evaluation: material the mover comes out with if both sides keep
+    # recapturing on the target square with their least valuable piece, either side free to
+    # stop. Pieces lifted off the square's lines reveal sliders behind them.
+    board, bitboards = state.board, state.bitboards
+    from_sq, to_sq = move & 63, move >> 6 & 63
+    occ = state.occupied()
+    victim = board[to_sq] & 7
+    if move >> 15 == FLAG_EN_PASSANT:
+        victim = PAWN
+        occ ^= 1 << (to_sq - 8 if state.side == WHITE else to_sq + 8)
+    gains = [SEE_VALUES[victim]]
+    attacker_type = board[from_sq] & 7
+    from_bit = 1 << from_sq
+    remaining = attackers(state, to_sq, occ)
+    side = state.side
+    while True:
+        # What the other side stands to gain by recapturing the piece that just moved in
+        gains.append(SEE_VALUES[attacker_type] - gains[-1])
+        occ ^= from_bit
+        remaining = (remaining | attackers(state, to_sq, occ)) & occ
+        side ^= 1
+        base = side << 3
+        for attacker_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            candidates = remaining & bitboards[base | attacker_type]
+            if candidates:
+                from_bit = candidates & -candidates
+                break
+        else:
+            break
+    # The last capture has no reply, so its speculative entry is dropped before folding back
+    gains.pop()
+    while len(gains) > 1:
+        last = gains.pop()
+        gains[-1] = -max(-gains[-1], last)
+    return gains[0]
+
+
+class Engine:
+    # Negamax alpha-beta with iterative deepening. Each iteration searches the previous
+    # iteration's best move first, so a search cut off by the clock still returns the best
+    # move found so far. The transposition table and history scores persist between searches.
+    def __init__(self, hash_mb=DEFAULT_HASH_MB, ordering=True, table=None):
+        self.nodes = 0
+        self.deadline = None
+        # Anything with is_set() (such as a multiprocessing.Event); checked with the clock
+        self.stop = None
+        # Called with a SearchResult after each completed iteration
+        self.report = None
+        self.state = None
+        self.table = TranspositionTable(hash_mb) if table is None else table
+        # ordering=False searches in generator order (with the table move first), for benchmarks
+        self.ordering = ordering
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        # Indexed by piece code, then destination square
+        self.history = [[0] * 64 for _ in range(16)]
+        # Whichever endgame tables tablebase.py has generated
+        self.tablebases = Tablebases()
+
+    def search(self, state, depth=None, time_limit=None, depth_offset=0):
+        # Searches a copy, so the caller's state (and any attack maps on it) is left alone.
+        # depth_offset shifts every iteration deeper, for parallel helpers.
+        if depth is None and time_limit is None:
+            time_limit = DEFAULT_TIME
+        self.state = state.copy()
+        self.nodes = 0
+        self.table.new_search()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        for scores in self.history:
+            scores[:] = [score >> 1 for score in scores]
+        start = time.perf_counter()
+        moves = generate_moves(self.state)
+        found = self.tablebases.best_move(self.state, moves) if moves and self.in_tables(self.state) else None
+        if found is not None:
+            # The tables already know the outcome; no search needed
+            move, result, plies = found
+            score = result * (MATE - plies) if result != DRAW else 0
+            result = SearchResult(move, score, 1, 0, time.perf_counter() - start, (move,))
+            if self.report is not None:
+                self.report(result)
+            return result
+        if self.ordering:
+            self.order_moves(moves, 0, 0)
+        best_move, best_score, completed = (moves[0] if moves else None), 0, 0
+        for current in range(1 + depth_offset, min((depth or MAX_DEPTH) + depth_offset, MAX_DEPTH) + 1):
+            # The first iteration always completes so there is a move to play
+            self.deadline = start + time_limit if time_limit is not None and current > 1 + depth_offset else None
+            try:
+                move, score = self.search_root(moves, current)
+            except SearchTimeout as timeout:
+                move, score = timeout.args
+                if move is not None:
+                    best_move, best_score = move, score
+                break
+            best_move, best_score, completed = move, score, current
+            moves.remove(move)
+            moves.insert(0, move)
+            if self.report is not None:
+                self.report(SearchResult(move, score, current, self.nodes, time.perf_counter() - start,
+                                         self.principal_variation(move)))
+            if abs(score) >= MATE_BOUND:
+                break
+        pv = self.principal_variation(best_move) if best_move is not None else ()
+        return SearchResult(best_move, best_score, completed, self.nodes, time.perf_counter() - start, pv)
+
+    def principal_variation(self, move):
+        # Follows table moves from the root while they stay legal and the line doesn't repeat
+        state = self.state
+        line = []
+        while move and len(line) < MAX_DEPTH and move in generate_moves(state):
+            line.append(move)
+            state.make_move(move)
+            if state.repetitions():
+                break
+            entry = self.table.probe(state.key)
+            move = entry[0] if entry is not None else 0
+        for played in reversed(line):
+            state.unmake_move(played)
+        return tuple(line)
+
+    def check_limits(self):
+        # The stop signal interrupts any iteration; the clock spares the first
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+        if self.stop is not None and self.stop.is_set():
+            raise SearchTimeout
+
+    def search_root(self, moves, depth):
+        state = self.state
+        alpha, best_move = -INFINITY, None
+        for move in moves:
+            state.make_move(move)
+            try:
+                score = -self.negamax(depth - 1, -INFINITY, -alpha, 1)
+            except SearchTimeout:
+                # Moves that already beat the previous best are still worth playing
+                raise SearchTimeout(best_move, alpha)
+            finally:
+                state.unmake_move(move)
+            if score > alpha:
+                alpha, best_move = score, move
+        return best_move, alpha
+
+    def in_tables(self, state):
+        # Three pieces or fewer: clearing the lowest bit three times empties the board
+        occ = state.occupancy[WHITE] | state.occupancy[BLACK]
+        occ &= occ - 1
+        occ &= occ - 1
+        return not occ & (occ - 1) and self.tablebases.tables
+
+    def negamax(self, depth, alpha, beta, ply):
+        if self.in_tables(self.state):
+            found = self.tablebases.probe(self.state)
+            if found is not None:
+                result, plies = found
+                return result * (MATE - ply - plies) if result != DRAW else 0
+        if depth <= 0:
+            return self.quiesce(alpha, beta, ply)
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL:
+            self.check_limits()
+        state = self.state
+        if state.halfmove >= 100 or state.repetitions():
+            return 0
+        entry = self.table.probe(state.key)
+        table_move = 0
+        if entry is not None:
+            table_move, entry_depth, entry_score, bound = entry
+            if entry_depth >= depth:
+                entry_score = score_from_table(entry_score, ply)
+                if (bound == EXACT or (bound == LOWER and entry_score >= beta)
+                        or (bound == UPPER and entry_score <= alpha)):
+                    return entry_score
+        moves = generate_moves(state)
+        if not moves:
+            return -MATE + ply if in_check(state) else 0
+        if self.ordering:
+            self.order_moves(moves, table_move, ply)
+        elif table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+        original_alpha = alpha
+        best, best_move = -INFINITY, 0
+        for move in moves:
+            state.make_move(move)
+            try:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                # A timeout unwinds through every ply, so each one takes its move back
+                state.unmake_move(move)
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if self.ordering and not state.board[move >> 6 & 63] and not move >> 12 & 7:
+                            self.record_cutoff(move, depth, ply)
+                        break
+        bound = UPPER if best <= original_alpha else LOWER if best >= beta else EXACT
+        self.table.store(state.key, depth, score_to_table(best, ply), bound, best_move)
+        return best
+
+    def quiesce(self, alpha, beta, ply):
+        # Captures and promotions only, until the position is quiet, so the evaluation is
+        # never taken in the middle of an exchange. In check every evasion is searched.
+        self.nodes += 1
+        if not self.nodes % CHECK_INTERVAL:
+            self.check_limits()
+        state = self.state
+        if ply >= MAX_PLY - 1:
+            return evaluate(state)
+        checked = in_check(state)
+        if checked:
+            moves = generate_moves(state)
+            if not moves:
+                return -MATE + ply
+            best = stand_pat = -INFINITY
+        else:
+            best = stand_pat = evaluate(state)
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            moves = generate_moves(state, quiet=False)
+        self.order_moves(moves, 0, ply)
+        board = state.board
+        for move in moves:
+            if not checked:
+                promotion = move >> 12 & 7
+                if not promotion:
+                    victim = board[move >> 6 & 63] & 7 or PAWN
+                    if stand_pat + SEE_VALUES[victim] + DELTA_MARGIN <= alpha:
+                        continue
+                    if see(state, move) < 0:
+                        continue
+            state.make_move(move)
+            try:
+                score = -self.quiesce(-beta, -alpha, ply + 1)
+            finally:
+                state.unmake_move(move)
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    def order_moves(self, moves, table_move, ply):
+        # Sorts in place: table move, captures by MVV-LVA (most valuable victim, then least
+        # valuable attacker), killers for this ply, then quiet moves by history score
+        board = self.state.board
+        killer_1, killer_2 = self.killers[ply]
+        history = self.history
+
+        def score(move):
+            if move == table_move:
+                return TABLE_MOVE_SCORE
+            from_sq, to_sq = move & 63, move >> 6 & 63
+            victim = board[to_sq] & 7 or (PAWN if move >> 15 == FLAG_EN_PASSANT else 0)
+            promotion = move >> 12 & 7
+            if victim or promotion:
+                return CAPTURE_SCORE + (victim + promotion) * 8 - (board[from_sq] & 7)
+            if move == killer_1:
+                return KILLER_SCORE + 1
+            if move == killer_2:
+                return KILLER_SCORE
+            return history[board[from_sq]][to_sq]
+
+        moves.sort(key=score, reverse=True)
+
+    def record_cutoff(self, move, depth, ply):
+        # A quiet move that refuted this node is tried early at the same ply and, through
+        # history, wherever the same piece can reach the same square
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1], killers[0] = killers[0], move
+        piece_history = self.history[self.state.board[move & 63]]
+        to_sq = move >> 6 & 63
+        piece_history[to_sq] = min(piece_history[to_sq] + depth * depth, HISTORY_LIMIT)
+
+
+def benchmark(depth=4):
+    # Nodes to a fixed depth with and without move ordering, each from an empty table
+    results = []
+    for fen in BENCHMARK_POSITIONS:
+        row = []
+        for ordering in (False, True):
+            result = Engine(ordering=ordering).search(GameState(fen), depth)
+            row.append(result)
+        results.append((fen, row[0], row[1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search a chess position')
+    parser.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    parser.add_argument('--depth', type=int, help='Maximum depth')
+    parser.add_argument('--time', type=float, help=f'Seconds to think (default: {DEFAULT_TIME} when no depth)')
+    parser.add_argument('--hash', type=int, default=DEFAULT_HASH_MB, help='Transposition table size in MB')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare nodes searched to --depth (default 4) with and without move ordering')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        total_plain = total_ordered = 0
+        for fen, plain, ordered in benchmark(args.depth or 4):
+            total_plain += plain.nodes
+            total_ordered += ordered.nodes
+            print(f"{plain.nodes:>10,} -> {ordered.nodes:>9,} nodes  {ordered.seconds:>6.2f} s  {fen}")
+        print(f"Total {total_plain:,} -> {total_ordered:,} nodes ({1 - total_ordered / total_plain:.0%} fewer)")
+        return 0
+
+    result = Engine(args.hash).search(GameState(args.fen), args.depth, args.time)
+    if result.move is None:
+        print('No legal moves')
+        return 1
+    print(f"bestmove {move_name(result.move)}  score {result.score}  depth {result.depth}  "
+          f"{result.nodes:,} nodes  {result.nodes / max(result.seconds, 1e-9):,.0f} nodes/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import argparse
+import sys
+import time
+
+from attacks import piece_attacks
+from bitboard import BLACK, KING_ATTACKS, WHITE, popcount, squares
+from gamestate import BISHOP, KNIGHT, PAWN, QUEEN, ROOK, GameState
+from pst import MAX_PHASE, WEIGHTS, unpack
+
+try:
+    import numpy as np
+except ImportError:
+    # Only the batch evaluator needs it
+    np = None
+
+# Tapered evaluation: material and piece-square values (kept incrementally by GameState),
+# mobility, king attacks and the pawn shield, each with a middlegame and endgame weight,
+# blended by the phase. Every term is a count times a weight, so a position is also a
+# feature vector (features()) and the score is its dot product with the weights, which
+# is how the batch evaluator scores many positions at once.
+MOBILE_PIECES = (KNIGHT, BISHOP, ROOK, QUEEN)
+KING_ZONES = [KING_ATTACKS[sq] | 1 << sq for sq in range(64)]
+
+
+def shield_mask(color, sq):
+    # The king's file and its neighbours, one and two ranks towards the enemy
+    mask = 0
+    forward = 1 if color == WHITE else -1
+    for step in (1, 2):
+        rank = (sq >> 3) + forward * step
+        if 0 <= rank < 8:
+            for file in range((sq & 7) - 1, (sq & 7) + 2):
+                if 0 <= file < 8:
+                    mask |= 1 << (rank * 8 + file)
+    return mask
+
+
+SHIELDS = [[shield_mask(color, sq) for sq in range(64)] for color in (WHITE, BLACK)]
+# Where each weight group sits in a feature vector
+LAYOUT = (('material', 7), ('pst', 7 * 64), ('mobility', 7), ('king_attack', 7), ('pawn_shield', 1))
+OFFSETS = {}
+FEATURE_COUNT = 0
+for name, size in LAYOUT:
+    OFFSETS[name] = FEATURE_COUNT
+    FEATURE_COUNT += size
+
+
+def activity(state):
+    # (mobility, king attacks) per piece type and shield pawns, white minus black
+    bitboards = state.bitboards
+    occ = state.occupancy[WHITE] | state.occupancy[BLACK]
+    mobility = [0] * 7
+    king_attack = [0] * 7
+    shield = 0
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        own = state.occupancy[color]
+        zone = KING_ZONES[state.king_square(color ^ 1)]
+        for piece_type in MOBILE_PIECES:
+            for sq in squares(bitboards[color << 3 | piece_type]):
+                attacked = piece_attacks(piece_type, sq, occ)
+                mobility[piece_type] += sign * popcount(attacked & ~own)
+                king_attack[piece_type] += sign * popcount(attacked & zone)
+        shield += sign * popcount(SHIELDS[color][state.king_square(color)] & bitboards[color << 3 | PAWN])
+    return mobility, king_attack, shield
+
+
+def taper(mg, eg, phase):
+    phase = min(phase, MAX_PHASE)
+    return (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+def evaluate(state):
+    # From the side to move's point of view
+    mg, eg = unpack(state.score)
+    mobility, king_attack, shield = activity(state)
+    mobility_mg, mobility_eg = WEIGHTS['mobility']
+    attack_mg, attack_eg = WEIGHTS['king_attack']
+    for piece_type in MOBILE_PIECES:
+        mg += mobility_mg[piece_type] * mobility[piece_type] + attack_mg[piece_type] * king_attack[piece_type]
+        eg += mobility_eg[piece_type] * mobility[piece_type] + attack_eg[piece_type] * king_attack[piece_type]
+    mg += WEIGHTS['pawn_shield'][0][0] * shield
+    eg += WEIGHTS['pawn_shield'][1][0] * shield
+    score = taper(mg, eg, state.phase)
+    return score if state.side == WHITE else -score
+
+
+def features(state):
+    # Counts for every weight, white minus black, laid out as in LAYOUT
+    counts = [0] * FEATURE_COUNT
+    material, pst = OFFSETS['material'], OFFSETS['pst']
+    for sq, piece in enumerate(state.board):
+        if piece:
+            sign, table_sq = (1, sq) if piece >> 3 == WHITE else (-1, sq ^ 56)
+            counts[material + (piece & 7)] += sign
+            counts[pst + (piece & 7) * 64 + table_sq] += sign
+    mobility, king_attack, shield = activity(state)
+    counts[OFFSETS['mobility']:OFFSETS['mobility'] + 7] = mobility
+    counts[OFFSETS['king_attack']:OFFSETS['king_attack'] + 7] = king_attack
+    counts[OFFSETS['pawn_shield']] = shield
+    return counts
+
+
+def flatten(weights):
+    # (middlegame, endgame) weight vectors matching features()
+    vectors = ([], [])
+    for name, _ in LAYOUT:
+        for phase in (0, 1):
+            values = weights[name][phase]
+            if name == 'pst':
+                values = [value for row in values for value in row]
+            vectors[phase].extend(values)
+    return vectors
+
+
+def unflatten(mg, eg):
+    weights = {}
+    for name, size in LAYOUT:
+        start = OFFSETS[name]
+        halves = [[int(round(value)) for value in vector[start:start + size]] for vector in (mg, eg)]
+        if name == 'pst':
+            halves = [[half[i:i + 64] for i in range(0, size, 64)] for half in halves]
+        weights[name] = tuple(halves)
+    return weights
+
+
+def feature_matrix(states):
+    # (features, phases, sides) as arrays with one row per position
+    if np is None:
+        raise ImportError('The batch evaluator needs numpy')
+    matrix = np.array([features(state) for state in states], dtype=np.int32).reshape(-1, FEATURE_COUNT)
+    phases = np.array([state.phase for state in states], dtype=np.int64)
+    sides = np.array([state.side for state in states], dtype=np.int64)
+    return matrix, phases, sides
+
+
+def score_features(matrix, phases, sides, weights=WEIGHTS):
+    # evaluate() for every row at once: two matrix-vector products and the blend
+    mg_weights, eg_weights = (np.array(vector, dtype=np.int64) for vector in flatten(weights))
+    phases = np.minimum(phases, MAX_PHASE)
+    scores = (matrix @ mg_weights * phases + matrix @ eg_weights * (MAX_PHASE - phases)) // MAX_PHASE
+    return np.where(sides == WHITE, scores, -scores)
+
+
+def evaluate_batch(states, weights=WEIGHTS):
+    return score_features(*feature_matrix(states), weights)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate chess positions')
+    parser.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    parser.add_argument('--batch', help='File of FENs, one per line, to score with the NumPy evaluator')
+    args = parser.parse_args()
+
+    if args.batch:
+        with open(args.batch) as f:
+            states = [GameState(line.strip()) for line in f if line.strip()]
+        start = time.perf_counter()
+        matrix, phases, sides = feature_matrix(states)
+        extracted = time.perf_counter()
+        scores = score_features(matrix, phases, sides)
+        scored = time.perf_counter()
+        print(f"{len(states):,} positions: features in {extracted - start:.2f} s, "
+              f"scored in {(scored - extracted) * 1000:.1f} ms, mean score {scores.mean():+.1f}")
+        return 0
+
+    state = GameState(args.fen)
+    mg, eg = unpack(state.score)
+    mobility, king_attack, shield = activity(state)
+    print(f"Material + PST  mg {mg:+}  eg {eg:+}")
+    print(f"Mobility        {' '.join(f'{mobility[t]:+}' for t in MOBILE_PIECES)} (N B R Q, white - black)")
+    print(f"King attacks    {' '.join(f'{king_attack[t]:+}' for t in MOBILE_PIECES)}")
+    print(f"Pawn shield     {shield:+}")
+    print(f"Phase {min(state.phase, MAX_PHASE)}/{MAX_PHASE}  score {evaluate(state):+} for the side to move")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+from bitboard import BLACK, PAWN_ATTACKS, WHITE, coords, square, squares
+from pst import PHASE_WEIGHTS, PIECE_SQUARE
+from zobrist import CASTLING_KEYS, EN_PASSANT_KEYS, PIECE_KEYS, WHITE_TO_MOVE_KEY
+
+# Piece codes are colour << 3 | type, so a piece fits in four bits and indexes GameState.bitboards
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+PIECE_TYPES = (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)
+# Names used by main.py's piece lists and images
+PIECE_NAMES = {PAWN: 'pawn', KNIGHT: 'knight', BISHOP: 'bishop', ROOK: 'rook', QUEEN: 'queen', KING: 'king'}
+FEN_LETTERS = {PAWN: 'p', KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q', KING: 'k'}
+
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+ALL_CASTLING = 15
+# Rights kept when a move touches the square (king and rook home squares clear theirs)
+CASTLING_MASKS = [ALL_CASTLING] * 64
+CASTLING_MASKS[4] = ALL_CASTLING & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[7] = ALL_CASTLING & ~WHITE_KINGSIDE
+CASTLING_MASKS[0] = ALL_CASTLING & ~WHITE_QUEENSIDE
+CASTLING_MASKS[60] = ALL_CASTLING & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[63] = ALL_CASTLING & ~BLACK_KINGSIDE
+CASTLING_MASKS[56] = ALL_CASTLING & ~BLACK_QUEENSIDE
+# King destination -> (rook from, rook to)
+CASTLING_ROOKS = {6: (7, 5), 2: (0, 3), 62: (63, 61), 58: (56, 59)}
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# A move is one int: from | to << 6 | promotion type << 12 | flag << 15
+FLAG_NONE, FLAG_EN_PASSANT, FLAG_CASTLE, FLAG_DOUBLE_PUSH = 0, 1, 2, 3
+NULL_MOVE = 0
+
+
+def encode_move(from_sq, to_sq, promotion=EMPTY, flag=FLAG_NONE):
+    return from_sq | to_sq << 6 | promotion << 12 | flag << 15
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return move >> 6 & 63
+
+
+def move_promotion(move):
+    return move >> 12 & 7
+
+
+def move_flag(move):
+    return move >> 15
+
+
+def square_name(sq):
+    return 'abcdefgh'[sq & 7] + str((sq >> 3) + 1)
+
+
+def move_name(move):
+    # Long algebraic (UCI) notation, e.g. e2e4 or e7e8q
+    promotion = move_promotion(move)
+    return square_name(move_from(move)) + square_name(move_to(move)) + (FEN_LETTERS[promotion] if promotion else '')
+
+
+class GameState:
+    # Bitboards per piece code plus a 64-entry mailbox. make_move/unmake_move update both in
+    # place and keep what cannot be recomputed (captured piece, castling rights, en passant
+    # square, halfmove clock) packed into one int per ply on undo_stack. The Zobrist key is
+    # updated alongside, and the keys of earlier positions in history serve repetition checks.
+    # The material and piece-square score (see pst.py) and the game phase are kept the same
+    # way, with earlier scores on scores.
+    __slots__ = ('board', 'bitboards', 'occupancy', 'side', 'castling', 'ep_square', 'halfmove', 'ply',
+                 'undo_stack', 'attacks', 'key', 'history', 'score', 'phase', 'scores')
+
+    def __init__(self, fen=START_FEN):
+        # Optional attacks.AttackMaps kept current by make_move/unmake_move
+        self.attacks = None
+        self.set_fen(fen)
+
+    def set_fen(self, fen):
+        fields = fen.split()
+        self.board = [EMPTY] * 64
+        self.bitboards = [0] * 16
+        self.occupancy = [0, 0]
+        rank, file = 7, 0
+        for char in fields[0]:
+            if char == '/':
+                rank, file = rank - 1, 0
+            elif char.isdigit():
+                file += int(char)
+            else:
+                color = WHITE if char.isupper() else BLACK
+                piece_type = 'pnbrqk'.index(char.lower()) + 1
+                self.put(rank * 8 + file, color << 3 | piece_type)
+                file += 1
+        self.side = WHITE if len(fields) < 2 or fields[1] == 'w' else BLACK
+        rights = fields[2] if len(fields) > 2 else '-'
+        self.castling = sum(flag for letter, flag in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                                                      ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+                            if letter in rights)
+        ep = fields[3] if len(fields) > 3 else '-'
+        self.ep_square = -1 if ep == '-' else (int(ep[1]) - 1) * 8 + 'abcdefgh'.index(ep[0])
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.ply = (fullmove - 1) * 2 + self.side
+        self.undo_stack = []
+        self.history = []
+        self.key = self.compute_key()
+        self.scores = []
+        self.score, self.phase = self.compute_score()
+        if self.attacks is not None:
+            self.attacks.refresh()
+
+    def copy(self):
+        # Independent position with the same history, without attack maps
+        state = GameState.__new__(GameState)
+        state.board = self.board[:]
+        state.bitboards = self.bitboards[:]
+        state.occupancy = self.occupancy[:]
+        state.side, state.castling, state.ep_square = self.side, self.castling, self.ep_square
+        state.halfmove, state.ply, state.key = self.halfmove, self.ply, self.key
+        state.undo_stack = self.undo_stack[:]
+        state.history = self.history[:]
+        state.score, state.phase, state.scores = self.score, self.phase, self.scores[:]
+        state.attacks = None
+        return state
+
+    def compute_key(self):
+        key = CASTLING_KEYS[self.castling] ^ self.ep_key()
+        if self.side == WHITE:
+            key ^= WHITE_TO_MOVE_KEY
+        for sq, piece in enumerate(self.board):
+            if piece:
+                key ^= PIECE_KEYS[piece][sq]
+        return key
+
+    def compute_score(self):
+        # (packed material and piece-square score for white, game phase)
+        score = phase = 0
+        for sq, piece in enumerate(self.board):
+            if piece:
+                score += PIECE_SQUARE[piece][sq]
+                phase += PHASE_WEIGHTS[piece & 7]
+        return score, phase
+
+    def ep_key(self):
+        # As in Polyglot, the en passant file only counts when the side to move can capture
+        ep = self.ep_square
+        if ep >= 0 and PAWN_ATTACKS[self.side ^ 1][ep] & self.bitboards[self.side << 3 | PAWN]:
+            return EN_PASSANT_KEYS[ep & 7]
+        return 0
+
+    def repetitions(self):
+        # Earlier occurrences of this position; only positions since the last capture or pawn
+        # move with the same side to move can match
+        history, key = self.history, self.key
+        count = 0
+        for i in range(len(history) - 2, max(len(history) - self.halfmove, 0) - 1, -2):
+            if history[i] == key:
+                count += 1
+        return count
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row, empty = '', 0
+            for file in range(8):
+                piece = self.board[rank * 8 + file]
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row, empty = row + str(empty), 0
+                letter = FEN_LETTERS[piece & 7]
+                row += letter.upper() if piece >> 3 == WHITE else letter
+            rows.append(row + (str(empty) if empty else ''))
+        rights = ''.join(letter for letter, flag in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                                                     ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+                         if self.castling & flag) or '-'
+        ep = square_name(self.ep_square) if self.ep_square >= 0 else '-'
+        return (f"{'/'.join(rows)} {'w' if self.side == WHITE else 'b'} {rights} {ep} "
+                f"{self.halfmove} {self.ply // 2 + 1}")
+
+    def put(self, sq, piece):
+        self.board[sq] = piece
+        self.bitboards[piece] |= 1 << sq
+        self.occupancy[piece >> 3] |= 1 << sq
+
+    def king_square(self, color):
+        return (self.bitboards[color << 3 | KING] & -self.bitboards[color << 3 | KING]).bit_length() - 1
+
+    def occupied(self):
+        return self.occupancy[WHITE] | self.occupancy[BLACK]
+
+    def make_move(self, move):
+        board, bitboards, occupancy = self.board, self.bitboards, self.occupancy
+        from_sq, to_sq, flag = move & 63, move >> 6 & 63, move >> 15
+        piece = board[from_sq]
+        captured = board[to_sq]
+        us = self.side
+        self.undo_stack.append(captured | self.castling << 4 | (self.ep_square + 1) << 8 | self.halfmove << 15)
+        self.history.append(self.key)
+        piece_keys = PIECE_KEYS[piece]
+        key = self.key ^ self.ep_key() ^ CASTLING_KEYS[self.castling] ^ piece_keys[from_sq] ^ piece_keys[to_sq]
+        self.scores.append(self.score)
+        piece_square = PIECE_SQUARE[piece]
+        score = self.score + piece_square[to_sq] - piece_square[from_sq]
+
+        changed = from_to = 1 << from_sq | 1 << to_sq
+        bitboards[piece] ^= from_to
+        occupancy[us] ^= from_to
+        board[from_sq] = EMPTY
+        board[to_sq] = piece
+        if captured:
+            bitboards[captured] ^= 1 << to_sq
+            occupancy[us ^ 1] ^= 1 << to_sq
+            key ^= PIECE_KEYS[captured][to_sq]
+            score -= PIECE_SQUARE[captured][to_sq]
+            self.phase -= PHASE_WEIGHTS[captured & 7]
+        elif flag == FLAG_EN_PASSANT:
+            capture_sq = to_sq - 8 if us == WHITE else to_sq + 8
+            key ^= PIECE_KEYS[board[capture_sq]][capture_sq]
+            score -= PIECE_SQUARE[board[capture_sq]][capture_sq]
+            bitboards[board[capture_sq]] ^= 1 << capture_sq
+            occupancy[us ^ 1] ^= 1 << capture_sq
+            board[capture_sq] = EMPTY
+            changed |= 1 << capture_sq
+        elif flag == FLAG_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            rook = board[rook_from]
+            rook_bits = 1 << rook_from | 1 << rook_to
+            bitboards[rook] ^= rook_bits
+            occupancy[us] ^= rook_bits
+            board[rook_from] = EMPTY
+            board[rook_to] = rook
+            key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+            score += PIECE_SQUARE[rook][rook_to] - PIECE_SQUARE[rook][rook_from]
+            changed |= rook_bits
+        promotion = move >> 12 & 7
+        if promotion:
+            bitboards[piece] ^= 1 << to_sq
+            key ^= piece_keys[to_sq]
+            piece = us << 3 | promotion
+            bitboards[piece] |= 1 << to_sq
+            board[to_sq] = piece
+            key ^= PIECE_KEYS[piece][to_sq]
+            score += PIECE_SQUARE[piece][to_sq] - piece_square[to_sq]
+            self.phase += PHASE_WEIGHTS[promotion]
+        self.score = score
+
+        self.ep_square = (from_sq + to_sq) >> 1 if flag == FLAG_DOUBLE_PUSH else -1
+        self.castling &= CASTLING_MASKS[from_sq] & CASTLING_MASKS[to_sq]
+        self.halfmove = 0 if captured or piece & 7 == PAWN or promotion else self.halfmove + 1
+        self.side = us ^ 1
+        self.ply += 1
+        key ^= WHITE_TO_MOVE_KEY ^ CASTLING_KEYS[self.castling]
+        self.key = key ^ self.ep_key() if flag == FLAG_DOUBLE_PUSH else key
+        if self.attacks is not None:
+            self.attacks.update(changed)
+        return captured
+
+    def unmake_move(self, move):
+        board, bitboards, occupancy = self.board, self.bitboards, self.occupancy
+        from_sq, to_sq, flag = move & 63, move >> 6 & 63, move >> 15
+        undo = self.undo_stack.pop()
+        captured = undo & 15
+        self.castling = undo >> 4 & 15
+        self.ep_square = (undo >> 8 & 127) - 1
+        self.halfmove = undo >> 15
+        self.key = self.history.pop()
+        self.score = self.scores.pop()
+        self.side = us = self.side ^ 1
+        self.ply -= 1
+        if captured:
+            self.phase += PHASE_WEIGHTS[captured & 7]
+
+        piece = board[to_sq]
+        if move >> 12 & 7:
+            self.phase -= PHASE_WEIGHTS[piece & 7]
+            bitboards[piece] ^= 1 << to_sq
+            piece = us << 3 | PAWN
+            bitboards[piece] |= 1 << to_sq
+        changed = from_to = 1 << from_sq | 1 << to_sq
+        bitboards[piece] ^= from_to
+        occupancy[us] ^= from_to
+        board[from_sq] = piece
+        board[to_sq] = captured
+        if captured:
+            bitboards[captured] |= 1 << to_sq
+            occupancy[us ^ 1] |= 1 << to_sq
+        elif flag == FLAG_EN_PASSANT:
+            capture_sq = to_sq - 8 if us == WHITE else to_sq + 8
+            pawn = (us ^ 1) << 3 | PAWN
+            bitboards[pawn] |= 1 << capture_sq
+            occupancy[us ^ 1] |= 1 << capture_sq
+            board[capture_sq] = pawn
+            changed |= 1 << capture_sq
+        elif flag == FLAG_CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            rook = board[rook_to]
+            rook_bits = 1 << rook_from | 1 << rook_to
+            bitboards[rook] ^= rook_bits
+            occupancy[us] ^= rook_bits
+            board[rook_to] = EMPTY
+            board[rook_from] = rook
+            changed |= rook_bits
+        if self.attacks is not None:
+            self.attacks.update(changed)
+
+    def move_for(self, from_sq, to_sq, promotion=QUEEN):
+        # Encodes a from/to pair picked in the UI, working out the special-move flag
+        piece = self.board[from_sq]
+        flag, promote = FLAG_NONE, EMPTY
+        if piece & 7 == PAWN:
+            if abs(to_sq - from_sq) == 16:
+                flag = FLAG_DOUBLE_PUSH
+            elif to_sq == self.ep_square and (to_sq - from_sq) & 7:
+                flag = FLAG_EN_PASSANT
+            if to_sq >> 3 in (0, 7):
+                promote = promotion
+        elif piece & 7 == KING and abs(to_sq - from_sq) == 2:
+            flag = FLAG_CASTLE
+        return encode_move(from_sq, to_sq, promote, flag)
+
+    def piece_lists(self, color):
+        # (names, (x, y) locations) in the shape main.py draws from
+        names, locations = [], []
+        for piece_type in PIECE_TYPES:
+            for sq in squares(self.bitboards[color << 3 | piece_type]):
+                names.append(PIECE_NAMES[piece_type])
+                locations.append(coords(sq))
+        return names, locations
+
+    def piece_at(self, x, y):
+        return self.board[square(x, y)]
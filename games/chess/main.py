@@ -1,25 +1,55 @@
 
+import argparse
+
 import pygame
+from attacks import AttackMaps
+from bitboard import BLACK, WHITE, coords, square
+from background import BackgroundEngine
+from engine import DEFAULT_TIME
+from gamestate import PIECE_NAMES, START_FEN, GameState, move_from, move_name, move_to
+from movegen import CHECKMATE, game_outcome, generate_moves
+from render import Renderer, TextCache
+from tablebase import Tablebases, describe
+from transposition import DEFAULT_HASH_MB
+
+parser = argparse.ArgumentParser(description='Pygame chess')
+parser.add_argument('--engine', choices=['white', 'black'], help='Let the engine play this side')
+parser.add_argument('--think', type=float, default=DEFAULT_TIME, help='Engine seconds per move')
+parser.add_argument('--depth', type=int, help='Engine depth limit per move')
+parser.add_argument('--hash', type=int, default=DEFAULT_HASH_MB, help='Engine transposition table size in MB')
+parser.add_argument('--book', help='Opening book for the engine (built with book.py)')
+args = parser.parse_args()
+engine_color = {'white': WHITE, 'black': BLACK}.get(args.engine)
+# The engine searches in a child process; the loop only polls it, so frames keep coming
+engine = BackgroundEngine(args.hash, args.book) if engine_color is not None else None
+engine_result = None
+engine_status = ''
+ponder_ply = -1
+# Moves played since START_FEN, sent to the engine so it sees the game's history
+game_moves = []
+# Endgame tables for the hint panel; empty until tablebase.py --generate has been run
+tablebases = Tablebases()
+tablebase_hint = []
 
 pygame.init()
 WIDTH = 1000
 HEIGHT = 800
 screen = pygame.display.set_mode([WIDTH, HEIGHT])
-pygame.display.set_caption('Two-Player Pygame Chess!')
+pygame.display.set_caption('Two-Player Pygame Chess!' if engine_color is None else 'Pygame Chess vs Engine')
 font = pygame.font.Font('freesansbold.ttf', 20)
 medium_font = pygame.font.Font('freesansbold.ttf', 40)
 big_font = pygame.font.Font('freesansbold.ttf', 50)
 timer = pygame.time.Clock()
 fps = 60
 
-white_pieces = ['rook', 'knight', 'bishop', 'king', 'queen', 'bishop', 'knight', 'rook',
-                'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn']
-white_locations = [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 0), (7, 0),
-                   (0, 1), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1)]
-black_pieces = ['rook', 'knight', 'bishop', 'king', 'queen', 'bishop', 'knight', 'rook',
-                'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn']
-black_locations = [(0, 7), (1, 7), (2, 7), (3, 7), (4, 7), (5, 7), (6, 7), (7, 7),
-                   (0, 6), (1, 6), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (7, 6)]
+# The position lives in state; the piece and location lists below are views of it that
+# refresh_view() rebuilds after every move, along with the legal moves check_options
+# groups by piece. The attack maps follow make_move, so check_square reads them instead of
+# scanning every piece's options.
+state = GameState()
+state.attacks = AttackMaps(state)
+white_pieces, white_locations = state.piece_lists(WHITE)
+black_pieces, black_locations = state.piece_lists(BLACK)
 captured_pieces_white = []
 captured_pieces_black = []
 
@@ -69,6 +99,11 @@ black_images = [black_pawn, black_queen, black_king, black_knight, black_rook, b
 small_black_images = [black_pawn_small, black_queen_small, black_king_small, black_knight_small,
                       black_rook_small, black_bishop_small]
 piece_list = ['pawn', 'queen', 'king', 'knight', 'rook', 'bishop']
+piece_images = {'white': dict(zip(piece_list, white_images)), 'black': dict(zip(piece_list, black_images))}
+small_white_by_name = dict(zip(piece_list, small_white_images))
+small_black_by_name = dict(zip(piece_list, small_black_images))
+status_text = ['White: Select a Piece to Move!', 'White: Select a Destination!',
+               'Black: Select a Piece to Move!', 'Black: Select a Destination!']
 
 counter = 0
 winner = ''
@@ -76,247 +111,177 @@ game_over = False
 
 
 
-def draw_board():
+def draw_background():
+    # Everything that never changes, drawn once; the renderer restores regions from it
+    surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+    surface.fill('dark gray')
     square_size = 100
     for row in range(8):
         for col in range(8):
             color = 'light gray' if (row + col) % 2 == 0 else 'dark gray'
-            pygame.draw.rect(screen, color, [col * square_size, row * square_size, square_size, square_size])
-    pygame.draw.rect(screen, 'gray', [0, 800, WIDTH, 100])
-    pygame.draw.rect(screen, 'gold', [0, 800, WIDTH, 100], 5)
-    pygame.draw.rect(screen, 'gold', [800, 0, 200, HEIGHT], 5)
-    status_text = ['White: Select a Piece to Move!', 'White: Select a Destination!',
-                   'Black: Select a Piece to Move!', 'Black: Select a Destination!']
-    screen.blit(big_font.render(status_text[turn_step], True, 'black'), (20, 820))
-    pygame.draw.line(screen, 'black', (0, 800), (WIDTH, 800), 2)
-    pygame.draw.line(screen, 'black', (800, 0), (800, HEIGHT), 2)
-    screen.blit(medium_font.render('FORFEIT', True, 'black'), (810, 830))
-
-
-def draw_pieces():
-    for i in range(len(white_pieces)):
-        index = piece_list.index(white_pieces[i])
-        if white_pieces[i] == 'pawn':
-            screen.blit(white_pawn, (white_locations[i][0] * 100 + 22, white_locations[i][1] * 100 + 30))
-        else:
-            screen.blit(white_images[index], (white_locations[i][0] * 100 + 10, white_locations[i][1] * 100 + 10))
-        if turn_step < 2:
-            if selection == i:
-                pygame.draw.rect(screen, 'red', [white_locations[i][0] * 100 + 1, white_locations[i][1] * 100 + 1,
-                                                 100, 100], 2)
-
-    for i in range(len(black_pieces)):
-        index = piece_list.index(black_pieces[i])
-        if black_pieces[i] == 'pawn':
-            screen.blit(black_pawn, (black_locations[i][0] * 100 + 22, black_locations[i][1] * 100 + 30))
-        else:
-            screen.blit(black_images[index], (black_locations[i][0] * 100 + 10, black_locations[i][1] * 100 + 10))
-        if turn_step >= 2:
-            if selection == i:
-                pygame.draw.rect(screen, 'blue', [black_locations[i][0] * 100 + 1, black_locations[i][1] * 100 + 1,
-                                                  100, 100], 2)
-
-
-
-def check_options(pieces, locations, turn):
-    moves_list = []
-    all_moves_list = []
-    for i in range((len(pieces))):
-        location = locations[i]
-        piece = pieces[i]
-        if piece == 'pawn':
-            moves_list = check_pawn(location, turn)
-        elif piece == 'rook':
-            moves_list = check_rook(location, turn)
-        elif piece == 'knight':
-            moves_list = check_knight(location, turn)
-        elif piece == 'bishop':
-            moves_list = check_bishop(location, turn)
-        elif piece == 'queen':
-            moves_list = check_queen(location, turn)
-        elif piece == 'king':
-            moves_list = check_king(location, turn)
-        all_moves_list.append(moves_list)
-    return all_moves_list
-
-
-
-def check_king(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-
-    targets = [(1, 0), (1, 1), (1, -1), (-1, 0), (-1, 1), (-1, -1), (0, 1), (0, -1)]
-    for i in range(8):
-        target = (position[0] + targets[i][0], position[1] + targets[i][1])
-        if target not in friends_list and 0 <= target[0] <= 7 and 0 <= target[1] <= 7:
-            moves_list.append(target)
-    return moves_list
-
-def check_queen(position, color):
-    moves_list = check_bishop(position, color)
-    second_list = check_rook(position, color)
-    for i in range(len(second_list)):
-        moves_list.append(second_list[i])
-    return moves_list
-
-
-
-def check_bishop(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-    for i in range(4):
-        path = True
-        chain = 1
-        if i == 0:
-            x = 1
-            y = -1
-        elif i == 1:
-            x = -1
-            y = -1
-        elif i == 2:
-            x = 1
-            y = 1
-        else:
-            x = -1
-            y = 1
-        while path:
-            if (position[0] + (chain * x), position[1] + (chain * y)) not in friends_list and \
-                    0 <= position[0] + (chain * x) <= 7 and 0 <= position[1] + (chain * y) <= 7:
-                moves_list.append((position[0] + (chain * x), position[1] + (chain * y)))
-                if (position[0] + (chain * x), position[1] + (chain * y)) in enemies_list:
-                    path = False
-                chain += 1
-            else:
-                path = False
-    return moves_list
-
-
-
-def check_rook(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
-    else:
-        friends_list = black_locations
-        enemies_list = white_locations
-    for i in range(4):
-        path = True
-        chain = 1
-        if i == 0:
-            x = 0
-            y = 1
-        elif i == 1:
-            x = 0
-            y = -1
-        elif i == 2:
-            x = 1
-            y = 0
-        else:
-            x = -1
-            y = 0
-        while path:
-            if (position[0] + (chain * x), position[1] + (chain * y)) not in friends_list and \
-                    0 <= position[0] + (chain * x) <= 7 and 0 <= position[1] + (chain * y) <= 7:
-                moves_list.append((position[0] + (chain * x), position[1] + (chain * y)))
-                if (position[0] + (chain * x), position[1] + (chain * y)) in enemies_list:
-                    path = False
-                chain += 1
-            else:
-                path = False
-    return moves_list
-white_king_moved = False
-white_rook_moved = [False, False]
-black_king_moved = False
-black_rook_moved = [False, False]
-def check_castling(color):
-    moves_list = []
-    if color == 'white' and not white_king_moved:
-        if not white_rook_moved[0] and not any(white_locations) and not any(black_locations): # and king and rook path are not in check
-            moves_list.append((2, 0))  # Castle queenside
-        if not white_rook_moved[1] and not any(white_locations) and not any(black_locations): # and king and rook path are not in check
-            moves_list.append((6, 0))  # Castle kingside
-    elif color == 'black' and not black_king_moved:
-        if not black_rook_moved[0] and not any(white_locations) and not any(black_locations): # and king and rook path are not in check
-            moves_list.append((2, 7))  # Castle queenside
-        if not black_rook_moved[1] and not any(white_locations) and not any(black_locations): # and king and rook path are not in check
-            moves_list.append((6, 7))  # Castle kingside
-    return moves_list
-
-
-en_passant_target = None
-def check_pawn(position, color):
-    moves_list = []
-    global en_passant_target
-    if color == 'white':
-        if (position[0], position[1] + 1) not in white_locations and \
-                (position[0], position[1] + 1) not in black_locations and position[1] < 7:
-            moves_list.append((position[0], position[1] + 1))
-        if (position[0], position[1] + 2) not in white_locations and \
-                (position[0], position[1] + 2) not in black_locations and position[1] == 1:
-            moves_list.append((position[0], position[1] + 2))
-        if (position[0] + 1, position[1] + 1) in black_locations:
-            moves_list.append((position[0] + 1, position[1] + 1))
-        if (position[0] - 1, position[1] + 1) in black_locations:
-            moves_list.append((position[0] - 1, position[1] + 1))
-    else:
-        if (position[0], position[1] - 1) not in white_locations and \
-                (position[0], position[1] - 1) not in black_locations and position[1] > 0:
-            moves_list.append((position[0], position[1] - 1))
-        if (position[0], position[1] - 2) not in white_locations and \
-                (position[0], position[1] - 2) not in black_locations and position[1] == 6:
-            moves_list.append((position[0], position[1] - 2))
-        if (position[0] + 1, position[1] - 1) in white_locations:
-            moves_list.append((position[0] + 1, position[1] - 1))
-        if (position[0] - 1, position[1] - 1) in white_locations:
-            moves_list.append((position[0] - 1, position[1] - 1))
-    return moves_list
-    if color == 'white' and en_passant_target and (
-            position[0] - 1 == en_passant_target or position[0] + 1 == en_passant_target):
-        moves_list.append((en_passant_target, position[1] + 1))
-    if color == 'black' and en_passant_target and (
-            position[0] - 1 == en_passant_target or position[0] + 1 == en_passant_target):
-        moves_list.append((en_passant_target, position[1] - 1))
-    return moves_list
-
-def check_promotion():
-    for i, pos in enumerate(white_locations):
-        if pos[1] == 7 and white_pieces[i] == 'pawn':
-
-            white_pieces[i] = 'queen'
-            white_images[i] = white_queen
-
-    for i, pos in enumerate(black_locations):
-        if pos[1] == 0 and black_pieces[i] == 'pawn':
-
-            black_pieces[i] = 'queen'
-            black_images[i] = black_queen
-
-def check_knight(position, color):
-    moves_list = []
-    if color == 'white':
-        enemies_list = black_locations
-        friends_list = white_locations
+            pygame.draw.rect(surface, color, [col * square_size, row * square_size, square_size, square_size])
+    pygame.draw.rect(surface, 'gray', [0, 800, WIDTH, 100])
+    pygame.draw.rect(surface, 'gold', [0, 800, WIDTH, 100], 5)
+    pygame.draw.rect(surface, 'gold', [800, 0, 200, HEIGHT], 5)
+    pygame.draw.line(surface, 'black', (0, 800), (WIDTH, 800), 2)
+    pygame.draw.line(surface, 'black', (800, 0), (800, HEIGHT), 2)
+    surface.blit(medium_font.render('FORFEIT', True, 'black'), (810, 830))
+    return surface
+
+
+text_cache = TextCache()
+renderer = Renderer(screen, draw_background())
+
+
+def paint_square(rect, signature):
+    piece, outline, check, dot = signature
+    if piece is not None:
+        color, name = piece
+        x, y = (rect.x + 22, rect.y + 30) if name == 'pawn' else (rect.x + 10, rect.y + 10)
+        screen.blit(piece_images[color][name], (x, y))
+    if outline:
+        pygame.draw.rect(screen, outline, [rect.x + 1, rect.y + 1, 100, 100], 2)
+    if check:
+        pygame.draw.rect(screen, check, [rect.x + 1, rect.y + 1, 100, 100], 5)
+    if dot:
+        pygame.draw.circle(screen, dot, rect.center, 5)
+
+
+def paint_status(rect, text):
+    screen.blit(text_cache.render(big_font, text, 'black'), (20, 820))
+
+
+def paint_panel(rect, signature):
+    captured_white, captured_black, hint, stats = signature
+    for i, captured_piece in enumerate(captured_white):
+        screen.blit(small_black_by_name[captured_piece], (825, 5 + 50 * i))
+    for i, captured_piece in enumerate(captured_black):
+        screen.blit(small_white_by_name[captured_piece], (925, 5 + 50 * i))
+    for i, line in enumerate(hint):
+        screen.blit(text_cache.render(font, line, 'black'), (810, 568 + 28 * i))
+    for i, line in enumerate(stats):
+        screen.blit(text_cache.render(font, line, 'black'), (810, 624 + 28 * i))
+
+
+def paint_game_over(rect, signature):
+    winner, outcome = signature
+    pygame.draw.rect(screen, 'black', [200, 200, 400, 70])
+    if winner == 'draw':
+        screen.blit(text_cache.render(font, f'Draw by {outcome}!', 'white'), (210, 210))
     else:
-        friends_list = black_locations
-        enemies_list = white_locations
+        screen.blit(text_cache.render(font, f'{winner} won the game!', 'white'), (210, 210))
+    screen.blit(text_cache.render(font, 'Press ENTER to Restart!', 'white'), (210, 240))
+
+
+def draw_frame():
+    # Describes the whole window to the renderer, which repaints only the regions that
+    # changed since the last frame
+    pieces = {}
+    for color, names, locations in (('white', white_pieces, white_locations),
+                                    ('black', black_pieces, black_locations)):
+        for name, location in zip(names, locations):
+            pieces[location] = (color, name)
+    locations, color = (white_locations, 'red') if turn_step < 2 else (black_locations, 'blue')
+    selected = locations[selection] if selection < len(locations) else None
+    checked = check_square()
+    dots = check_valid_moves() if selection != 100 else []
+    for y in range(8):
+        for x in range(8):
+            location = (x, y)
+            signature = (pieces.get(location), color if location == selected else None,
+                         checked[1] if checked is not None and checked[0] == location else None,
+                         color if location in dots else None)
+            renderer.region(location, (x * 100, y * 100, 100, 100), signature, paint_square)
+    renderer.region('status', (0, 800, 800, 100), status_text[turn_step], paint_status)
+    renderer.region('panel', (800, 0, 200, 800), (tuple(captured_pieces_white), tuple(captured_pieces_black),
+                                                   tuple(tablebase_hint), tuple(engine_lines())), paint_panel)
+    if winner != '':
+        renderer.region('game over', (200, 200, 400, 70), (winner, outcome), paint_game_over, base=False)
+    renderer.present()
+
+
+# Only the side to move has options; refresh_view() regenerates its legal moves after each move
+def refresh_view():
+    global white_pieces, white_locations, black_pieces, black_locations, white_options, black_options
+    global legal_moves, outcome, tablebase_hint
+    white_pieces, white_locations = state.piece_lists(WHITE)
+    black_pieces, black_locations = state.piece_lists(BLACK)
+    legal_moves = generate_moves(state)
+    outcome = game_outcome(state, legal_moves)
+    # A table probe is a single lookup, so the hint is refreshed on every move
+    found = tablebases.probe(state) if legal_moves else None
+    best = tablebases.best_move(state, legal_moves) if found is not None else None
+    tablebase_hint = [describe(state, found), f'Best {move_name(best[0])}'] if best is not None else []
+    black_options = check_options(black_locations, BLACK)
+    white_options = check_options(white_locations, WHITE)
+
+
+def play_move(from_coords, to_coords):
+    # Applies a UI move to the state and returns the captured piece's name, if any
+    return apply_move(state.move_for(square(*from_coords), square(*to_coords)))
+
+
+def apply_move(move):
+    captured = state.make_move(move)
+    game_moves.append(move_name(move))
+    refresh_view()
+    return PIECE_NAMES[captured & 7] if captured else None
+
+
+def play_engine_move(name):
+    global turn_step, winner
+    move = next(move for move in legal_moves if move_name(move) == name)
+    captured = apply_move(move)
+    mover = 'white' if engine_color == WHITE else 'black'
+    if captured:
+        (captured_pieces_white if engine_color == WHITE else captured_pieces_black).append(captured)
+    if outcome:
+        winner = mover if outcome == CHECKMATE else 'draw'
+    turn_step = 2 if engine_color == WHITE else 0
+
+
+def update_engine():
+    # Called once per frame: takes whatever the engine has sent, then starts the next
+    # search if one is due. Never waits on the engine process.
+    global engine_result, engine_status, ponder_ply
+    for event, kind, data in engine.poll():
+        if event == 'info':
+            # Pondering scores are from the human's side; show everything from the engine's
+            engine_result = data if kind == 'think' else data._replace(score=-data.score)
+            engine_status = 'Thinking' if kind == 'think' else 'Pondering'
+        elif kind == 'think' and state.side == engine_color:
+            play_engine_move(data)
+    if game_over or winner != '':
+        engine.stop()
+    elif state.side == engine_color and not engine.thinking:
+        engine.think(START_FEN, game_moves, args.depth, args.think)
+    elif state.side != engine_color and ponder_ply != state.ply:
+        ponder_ply = state.ply
+        engine.ponder(START_FEN, game_moves)
+
+
+def engine_lines():
+    if engine_result is None:
+        return []
+    seconds = max(engine_result.seconds, 1e-9)
+    return [engine_status, f'Depth {engine_result.depth}', f'{engine_result.nodes:,} nodes',
+            f'{engine_result.nodes / seconds:,.0f} n/s', f'Score {engine_result.score / 100:+.2f}',
+            ' '.join(engine_result.pv[:3])]
+
+
+def check_options(locations, color):
+    # Destinations per piece, in the same order as locations. The four promotions share a
+    # destination; move_for promotes to a queen.
+    if color != state.side:
+        return [[] for _ in locations]
+    destinations = {}
+    for move in legal_moves:
+        options = destinations.setdefault(coords(move_from(move)), [])
+        to_coords = coords(move_to(move))
+        if to_coords not in options:
+            options.append(to_coords)
+    return [destinations.get(location, []) for location in locations]
 
-    targets = [(1, 2), (1, -2), (2, 1), (2, -1), (-1, 2), (-1, -2), (-2, 1), (-2, -1)]
-    for i in range(8):
-        target = (position[0] + targets[i][0], position[1] + targets[i][1])
-        if target not in friends_list and 0 <= target[0] <= 7 and 0 <= target[1] <= 7:
-            moves_list.append(target)
-    return moves_list
 
 def check_valid_moves():
     if turn_step < 2:
@@ -326,52 +291,19 @@ def check_valid_moves():
     valid_options = options_list[selection]
     return valid_options
 
-def draw_valid(moves):
-    if turn_step < 2:
-        color = 'red'
-    else:
-        color = 'blue'
-    for i in range(len(moves)):
-        pygame.draw.circle(screen, color, (moves[i][0] * 100 + 50, moves[i][1] * 100 + 50), 5)
-
-def draw_captured():
-    for i in range(len(captured_pieces_white)):
-        captured_piece = captured_pieces_white[i]
-        index = piece_list.index(captured_piece)
-        screen.blit(small_black_images[index], (825, 5 + 50 * i))
-    for i in range(len(captured_pieces_black)):
-        captured_piece = captured_pieces_black[i]
-        index = piece_list.index(captured_piece)
-        screen.blit(small_white_images[index], (925, 5 + 50 * i))
-
-def draw_check():
+
+def check_square():
+    # ((x, y), outline colour) of the king in check, blinking with counter; None otherwise
     if turn_step < 2:
-        if 'king' in white_pieces:
-            king_index = white_pieces.index('king')
-            king_location = white_locations[king_index]
-            for i in range(len(black_options)):
-                if king_location in black_options[i]:
-                    if counter < 15:
-                        pygame.draw.rect(screen, 'dark red', [white_locations[king_index][0] * 100 + 1,
-                                                              white_locations[king_index][1] * 100 + 1, 100, 100], 5)
+        color, outline = WHITE, 'dark red'
     else:
-        if 'king' in black_pieces:
-            king_index = black_pieces.index('king')
-            king_location = black_locations[king_index]
-            for i in range(len(white_options)):
-                if king_location in white_options[i]:
-                    if counter < 15:
-                        pygame.draw.rect(screen, 'dark blue', [black_locations[king_index][0] * 100 + 1,
-                                                               black_locations[king_index][1] * 100 + 1, 100, 100], 5)
-
-
-def draw_game_over():
-    pygame.draw.rect(screen, 'black', [200, 200, 400, 70])
-    screen.blit(font.render(f'{winner} won the game!', True, 'white'), (210, 210))
-    screen.blit(font.render(f'Press ENTER to Restart!', True, 'white'), (210, 240))
+        color, outline = BLACK, 'dark blue'
+    # One AND against the opponent's attacked squares instead of searching every option list
+    if counter < 15 and state.attacks.in_check(color):
+        return coords(state.king_square(color)), outline
+    return None
 
-black_options = check_options(black_pieces, black_locations, 'black')
-white_options = check_options(white_pieces, white_locations, 'white')
+refresh_view()
 run = True
 while run:
     timer.tick(fps)
@@ -379,19 +311,15 @@ while run:
         counter += 1
     else:
         counter = 0
-    screen.fill('dark gray')
-    draw_board()
-    draw_pieces()
-    draw_captured()
-    draw_check()
     if selection != 100:
         valid_moves = check_valid_moves()
-        draw_valid(valid_moves)
     # event handling
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             run = False
-        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not game_over:
+        if event.type == pygame.VIDEOEXPOSE:
+            renderer.invalidate()
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not game_over and state.side != engine_color:
             x_coord = event.pos[0] // 100
             y_coord = event.pos[1] // 100
             click_coords = (x_coord, y_coord)
@@ -403,16 +331,11 @@ while run:
                     if turn_step == 0:
                         turn_step = 1
                 if click_coords in valid_moves and selection != 100:
-                    white_locations[selection] = click_coords
-                    if click_coords in black_locations:
-                        black_piece = black_locations.index(click_coords)
-                        captured_pieces_white.append(black_pieces[black_piece])
-                        if black_pieces[black_piece] == 'king':
-                            winner = 'white'
-                        black_pieces.pop(black_piece)
-                        black_locations.pop(black_piece)
-                    black_options = check_options(black_pieces, black_locations, 'black')
-                    white_options = check_options(white_pieces, white_locations, 'white')
+                    captured = play_move(white_locations[selection], click_coords)
+                    if captured:
+                        captured_pieces_white.append(captured)
+                    if outcome:
+                        winner = 'white' if outcome == CHECKMATE else 'draw'
                     turn_step = 2
                     selection = 100
                     valid_moves = []
@@ -424,16 +347,11 @@ while run:
                     if turn_step == 2:
                         turn_step = 3
                 if click_coords in valid_moves and selection != 100:
-                    black_locations[selection] = click_coords
-                    if click_coords in white_locations:
-                        white_piece = white_locations.index(click_coords)
-                        captured_pieces_black.append(white_pieces[white_piece])
-                        if white_pieces[white_piece] == 'king':
-                            winner = 'black'
-                        white_pieces.pop(white_piece)
-                        white_locations.pop(white_piece)
-                    black_options = check_options(black_pieces, black_locations, 'black')
-                    white_options = check_options(white_pieces, white_locations, 'white')
+                    captured = play_move(black_locations[selection], click_coords)
+                    if captured:
+                        captured_pieces_black.append(captured)
+                    if outcome:
+                        winner = 'black' if outcome == CHECKMATE else 'draw'
                     turn_step = 0
                     selection = 100
                     valid_moves = []
@@ -441,25 +359,25 @@ while run:
             if event.key == pygame.K_RETURN:
                 game_over = False
                 winner = ''
-                white_pieces = ['rook', 'knight', 'bishop', 'king', 'queen', 'bishop', 'knight', 'rook',
-                                'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn']
-                white_locations = [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0), (6, 0), (7, 0),
-                                   (0, 1), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1)]
-                black_pieces = ['rook', 'knight', 'bishop', 'king', 'queen', 'bishop', 'knight', 'rook',
-                                'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn', 'pawn']
-                black_locations = [(0, 7), (1, 7), (2, 7), (3, 7), (4, 7), (5, 7), (6, 7), (7, 7),
-                                   (0, 6), (1, 6), (2, 6), (3, 6), (4, 6), (5, 6), (6, 6), (7, 6)]
+                state.set_fen(START_FEN)
                 captured_pieces_white = []
                 captured_pieces_black = []
                 turn_step = 0
                 selection = 100
                 valid_moves = []
-                black_options = check_options(black_pieces, black_locations, 'black')
-                white_options = check_options(white_pieces, white_locations, 'white')
+                engine_result = None
+                game_moves = []
+                ponder_ply = -1
+                if engine is not None:
+                    engine.new_game()
+                refresh_view()
 
     if winner != '':
         game_over = True
-        draw_game_over()
 
-    pygame.display.flip()
+    draw_frame()
+    if engine is not None:
+        update_engine()
+if engine is not None:
+    engine.close()
 pygame.quit()
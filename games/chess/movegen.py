@@ -0,0 +1,140 @@
+from attacks import attackers_to
+from bitboard import (BETWEEN, FULL, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, RANK_1, RANK_8, WHITE,
+                      bishop_attacks, lsb, rook_attacks, squares)
+from gamestate import (BISHOP, BLACK_KINGSIDE, BLACK_QUEENSIDE, CASTLING_ROOKS, FLAG_CASTLE, FLAG_DOUBLE_PUSH,
+                       FLAG_EN_PASSANT, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE_KINGSIDE, WHITE_QUEENSIDE)
+
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+# (right, king from, king to, squares that must be empty, squares the king crosses)
+CASTLES = ((WHITE_KINGSIDE, 4, 6, 1 << 5 | 1 << 6, (5, 6)),
+           (WHITE_QUEENSIDE, 4, 2, 1 << 1 | 1 << 2 | 1 << 3, (3, 2)),
+           (BLACK_KINGSIDE, 60, 62, 1 << 61 | 1 << 62, (61, 62)),
+           (BLACK_QUEENSIDE, 60, 58, 1 << 57 | 1 << 58 | 1 << 59, (59, 58)))
+
+CHECKMATE, STALEMATE = 'checkmate', 'stalemate'
+REPETITION, FIFTY_MOVES = 'threefold repetition', 'fifty-move rule'
+
+
+def pinned_pieces(state, king_sq, us):
+    # Our pieces alone between the king and an enemy slider on the same line, mapped to the
+    # squares each may still move to (the line up to and including the pinner)
+    bitboards = state.bitboards
+    them = us ^ 1
+    own, enemy = state.occupancy[us], state.occupancy[them]
+    queens = bitboards[them << 3 | QUEEN]
+    # Rays from the king that stop only at enemy pieces reach every potential pinner
+    pinners = ((rook_attacks(king_sq, enemy) & (bitboards[them << 3 | ROOK] | queens))
+               | (bishop_attacks(king_sq, enemy) & (bitboards[them << 3 | BISHOP] | queens)))
+    pins = {}
+    for pinner in squares(pinners):
+        between = BETWEEN[king_sq][pinner]
+        blockers = between & own
+        if blockers and not blockers & (blockers - 1):
+            pins[lsb(blockers)] = between | 1 << pinner
+    return pins
+
+
+def add_pawn_moves(moves, from_sq, targets, flag=0):
+    for to_sq in squares(targets):
+        if (1 << to_sq) & (RANK_1 | RANK_8):
+            for promotion in PROMOTIONS:
+                moves.append(from_sq | to_sq << 6 | promotion << 12)
+        else:
+            moves.append(from_sq | to_sq << 6 | flag << 15)
+
+
+def generate_moves(state, quiet=True):
+    # Legal moves for the side to move. Pins and checks are worked out once up front, so each
+    # piece's targets are masked rather than played and tested; only king steps and en
+    # passant, which change the king's exposure in other ways, query attacks directly.
+    # quiet=False leaves out moves that neither capture nor promote.
+    us = state.side
+    them = us ^ 1
+    bitboards, board = state.bitboards, state.board
+    own, enemy = state.occupancy[us], state.occupancy[them]
+    occ = own | enemy
+    king_sq = lsb(bitboards[us << 3 | KING])
+    moves = []
+    destinations = ~own if quiet else enemy
+
+    king_bit = 1 << king_sq
+    for to_sq in squares(KING_ATTACKS[king_sq] & destinations):
+        if not attackers_to(state, to_sq, them, occ ^ king_bit):
+            moves.append(king_sq | to_sq << 6)
+
+    checkers = attackers_to(state, king_sq, them, occ)
+    if checkers & (checkers - 1):
+        return moves
+    if checkers:
+        target_mask = checkers | BETWEEN[king_sq][lsb(checkers)]
+    else:
+        target_mask = FULL
+        for right, king_from, king_to, empty, crossed in CASTLES if quiet else ():
+            if (state.castling & right and king_from == king_sq and not occ & empty
+                    and board[CASTLING_ROOKS[king_to][0]] == us << 3 | ROOK
+                    and not any(attackers_to(state, sq, them, occ) for sq in crossed)):
+                moves.append(king_sq | king_to << 6 | FLAG_CASTLE << 15)
+    pins = pinned_pieces(state, king_sq, us)
+    allowed = destinations & target_mask
+
+    base = us << 3
+    for sq in squares(bitboards[base | KNIGHT]):
+        if sq not in pins:
+            for to_sq in squares(KNIGHT_ATTACKS[sq] & allowed):
+                moves.append(sq | to_sq << 6)
+    queens = bitboards[base | QUEEN]
+    for sq in squares(bitboards[base | BISHOP] | queens):
+        targets = bishop_attacks(sq, occ) & allowed
+        if sq in pins:
+            targets &= pins[sq]
+        for to_sq in squares(targets):
+            moves.append(sq | to_sq << 6)
+    for sq in squares(bitboards[base | ROOK] | queens):
+        targets = rook_attacks(sq, occ) & allowed
+        if sq in pins:
+            targets &= pins[sq]
+        for to_sq in squares(targets):
+            moves.append(sq | to_sq << 6)
+
+    forward = 8 if us == WHITE else -8
+    start_rank = 1 if us == WHITE else 6
+    ep_square = state.ep_square
+    for sq in squares(bitboards[base | PAWN]):
+        pin_mask = pins.get(sq, FULL)
+        one = sq + forward
+        if not occ >> one & 1 and (quiet or (1 << one) & (RANK_1 | RANK_8)):
+            if (1 << one) & target_mask & pin_mask:
+                add_pawn_moves(moves, sq, 1 << one)
+            two = one + forward
+            if (quiet and sq >> 3 == start_rank and not occ >> two & 1
+                    and (1 << two) & target_mask & pin_mask):
+                moves.append(sq | two << 6 | FLAG_DOUBLE_PUSH << 15)
+        add_pawn_moves(moves, sq, PAWN_ATTACKS[us][sq] & enemy & target_mask & pin_mask)
+        if ep_square >= 0 and PAWN_ATTACKS[us][sq] >> ep_square & 1:
+            # Removing two pawns from one rank can expose the king sideways, so test the
+            # resulting occupancy outright rather than relying on the pin and check masks
+            captured_bit = 1 << (ep_square - forward)
+            after = occ ^ (1 << sq) ^ captured_bit | 1 << ep_square
+            if not attackers_to(state, king_sq, them, after) & ~captured_bit:
+                moves.append(sq | ep_square << 6 | FLAG_EN_PASSANT << 15)
+    return moves
+
+
+def in_check(state, color=None):
+    color = state.side if color is None else color
+    king = state.bitboards[color << 3 | KING]
+    return bool(king) and bool(attackers_to(state, lsb(king), color ^ 1))
+
+
+def game_outcome(state, moves=None):
+    # CHECKMATE or STALEMATE when the side to move has no legal move, REPETITION or
+    # FIFTY_MOVES when the game is drawn by rule, otherwise None
+    if moves is None:
+        moves = generate_moves(state)
+    if not moves:
+        return CHECKMATE if in_check(state) else STALEMATE
+    if state.repetitions() >= 2:
+        return REPETITION
+    if state.halfmove >= 100:
+        return FIFTY_MOVES
+    return None
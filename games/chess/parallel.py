@@ -0,0 +1,139 @@
+import argparse
+import multiprocessing
+import sys
+import time
+from multiprocessing import shared_memory
+
+from engine import BENCHMARK_POSITIONS, DEFAULT_TIME, Engine, SearchResult
+from gamestate import GameState, move_name
+from transposition import DEFAULT_HASH_MB, TranspositionTable, table_bytes
+
+WORKER_COUNTS = (1, 2, 4, 8, 16)
+
+
+def search_worker(index, table_name, commands, results, stop):
+    # Runs in its own process: attaches to the shared table and searches each position it is
+    # sent until told to quit (None)
+    memory = shared_memory.SharedMemory(name=table_name)
+    engine = Engine(table=TranspositionTable(buffer=memory.buf))
+    engine.stop = None if index == 0 else stop
+    try:
+        while True:
+            command = commands.get()
+            if command is None:
+                break
+            state, depth, time_limit = command
+            # Odd helpers run one ply ahead so the workers spread over different depths
+            result = engine.search(state, depth, time_limit, depth_offset=index % 2)
+            if index == 0:
+                stop.set()
+            results.put((index, result))
+    finally:
+        engine.table = None
+        memory.close()
+
+
+class ParallelSearch:
+    # Lazy SMP: every worker process searches the same root with its own Engine, and all of
+    # them read and write one transposition table in shared memory. Helpers fill the table
+    # with results the main worker (index 0) then finds on its own path; the search is over
+    # when the main worker finishes.
+    def __init__(self, workers, hash_mb=DEFAULT_HASH_MB):
+        self.memory = shared_memory.SharedMemory(create=True, size=table_bytes(hash_mb))
+        self.stop = multiprocessing.Event()
+        self.results = multiprocessing.Queue()
+        self.commands = []
+        self.processes = []
+        for index in range(workers):
+            commands = multiprocessing.Queue()
+            process = multiprocessing.Process(target=search_worker, daemon=True,
+                                              args=(index, self.memory.name, commands, self.results, self.stop))
+            process.start()
+            self.commands.append(commands)
+            self.processes.append(process)
+
+    def search(self, state, depth=None, time_limit=None):
+        # Returns the deepest completed result (the main worker's on a tie) with every
+        # worker's nodes added up
+        if depth is None and time_limit is None:
+            time_limit = DEFAULT_TIME
+        self.stop.clear()
+        start = time.perf_counter()
+        snapshot = state.copy()
+        for commands in self.commands:
+            commands.put((snapshot, depth, time_limit))
+        results = dict(self.results.get() for _ in self.processes)
+        best = max(results.items(), key=lambda item: (item[1].depth, item[0] == 0))[1]
+        nodes = sum(result.nodes for result in results.values())
+        return SearchResult(best.move, best.score, best.depth, nodes, time.perf_counter() - start)
+
+    def clear_table(self):
+        self.memory.buf[:] = bytes(len(self.memory.buf))
+
+    def close(self):
+        for commands in self.commands:
+            commands.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def benchmark(worker_counts=WORKER_COUNTS, seconds=2.0, depth=5, hash_mb=DEFAULT_HASH_MB):
+    # Per worker count: nodes/s at a fixed time and the time to reach a fixed depth,
+    # summed over the benchmark positions, each search starting from an empty table
+    rows = []
+    for workers in worker_counts:
+        with ParallelSearch(workers, hash_mb) as search:
+            timed_nodes = timed_seconds = to_depth = 0
+            for fen in BENCHMARK_POSITIONS:
+                search.clear_table()
+                result = search.search(GameState(fen), time_limit=seconds)
+                timed_nodes += result.nodes
+                timed_seconds += result.seconds
+                search.clear_table()
+                to_depth += search.search(GameState(fen), depth=depth).seconds
+        rows.append((workers, timed_nodes / timed_seconds, to_depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel (Lazy SMP) chess search')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    parser.add_argument('--depth', type=int, help='Maximum depth (the fixed depth with --benchmark, default 5)')
+    parser.add_argument('--time', type=float, help=f'Seconds to think (default: {DEFAULT_TIME} when no depth)')
+    parser.add_argument('--hash', type=int, default=DEFAULT_HASH_MB, help='Shared transposition table size in MB')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Report nodes/s and time to --depth for 1, 2, 4, 8 and 16 workers')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(f"{multiprocessing.cpu_count()} CPU(s) available")
+        rows = benchmark(seconds=args.time or 2.0, depth=args.depth or 5, hash_mb=args.hash)
+        base_rate, base_time = rows[0][1], rows[0][2]
+        for workers, rate, to_depth in rows:
+            print(f"{workers:>3} workers  {rate:>10,.0f} nodes/s ({rate / base_rate:.2f}x)  "
+                  f"depth {args.depth or 5} in {to_depth:.2f} s ({base_time / to_depth:.2f}x)")
+        return 0
+
+    with ParallelSearch(args.workers, args.hash) as search:
+        result = search.search(GameState(args.fen), args.depth, args.time)
+    if result.move is None:
+        print('No legal moves')
+        return 1
+    print(f"bestmove {move_name(result.move)}  score {result.score}  depth {result.depth}  "
+          f"{result.nodes:,} nodes  {result.nodes / max(result.seconds, 1e-9):,.0f} nodes/s  {args.workers} workers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
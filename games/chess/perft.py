@@ -0,0 +1,88 @@
+import argparse
+import sys
+import time
+
+from gamestate import START_FEN, GameState, move_name
+from movegen import generate_moves
+
+# Reference leaf counts by depth (from 1) and the depth the default suite runs to
+POSITIONS = {
+    'start': (START_FEN, (20, 400, 8902, 197281, 4865609, 119060324), 4),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+                 (48, 2039, 97862, 4085603, 193690690), 3),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', (14, 191, 2812, 43238, 674624, 11030083), 5),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+                  (6, 264, 9467, 422333, 15833292), 3),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', (44, 1486, 62379, 2103487, 89941194), 3),
+    'position6': ('r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+                  (46, 2079, 89890, 3894594, 164075551), 3),
+}
+
+
+def perft(state, depth):
+    # Leaf nodes at depth; the last ply is counted from the move list without playing it
+    moves = generate_moves(state)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        state.make_move(move)
+        nodes += perft(state, depth - 1)
+        state.unmake_move(move)
+    return nodes
+
+
+def divide(state, depth):
+    # Leaf counts below each root move, for finding the move a generator bug hides under
+    results = {}
+    for move in generate_moves(state):
+        state.make_move(move)
+        results[move_name(move)] = perft(state, depth - 1)
+        state.unmake_move(move)
+    return results
+
+
+def run(name, fen, depth, expected=None):
+    state = GameState(fen)
+    start = time.perf_counter()
+    nodes = perft(state, depth)
+    seconds = time.perf_counter() - start
+    status = '' if expected is None else ('ok' if nodes == expected else f"FAIL (expected {expected:,})")
+    print(f"{name:<12}depth {depth}  {nodes:>12,} nodes  {seconds:>8.2f} s  "
+          f"{nodes / max(seconds, 1e-9):>10,.0f} nodes/s  {status}")
+    return expected is None or nodes == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count and time move generation with perft')
+    parser.add_argument('--position', choices=sorted(POSITIONS), action='append',
+                        help='Reference position to run; repeat for several (default: all)')
+    parser.add_argument('--fen', help='Run a custom position instead of the reference suite')
+    parser.add_argument('--depth', type=int, help='Search depth (default: each position\'s suite depth)')
+    parser.add_argument('--divide', action='store_true', help='Print the leaf count under each root move')
+    args = parser.parse_args()
+
+    if args.fen:
+        targets = [('custom', args.fen, None, args.depth or 3)]
+    else:
+        targets = []
+        for name in args.position or POSITIONS:
+            fen, counts, suite_depth = POSITIONS[name]
+            depth = args.depth or suite_depth
+            targets.append((name, fen, counts[depth - 1] if depth <= len(counts) else None, depth))
+
+    if args.divide:
+        for name, fen, expected, depth in targets:
+            results = divide(GameState(fen), depth)
+            print(f"{name} depth {depth}")
+            for move, nodes in sorted(results.items()):
+                print(f"  {move}: {nodes}")
+            print(f"  {len(results)} moves, {sum(results.values()):,} nodes")
+        return 0
+
+    passed = all([run(name, fen, depth, expected) for name, fen, expected, depth in targets])
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
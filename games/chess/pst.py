@@ -0,0 +1,152 @@
+import json
+import os
+
+# Evaluation weights and the piece-square tables GameState keeps up to date. Like zobrist.py
+# this only knows piece codes as numbers (colour << 3 | type, pawn = 1 ... king = 6).
+#
+# Every weight has a middlegame and an endgame value; evaluation.py blends the two by the
+# game phase. Piece-square tables are written as seen from white, rank 8 first, and include
+# no material (that is added when the tables are built).
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+# Written by tune.py; the defaults below are used for anything it doesn't list
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weights.json')
+# Phase counts down from 24 (all minor and major pieces on) to 0 (pawns and kings only)
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+PAWN_MG = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0)
+PAWN_EG = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    15, 15, 15, 15, 15, 15, 15, 15,
+    5, 5, 5, 5, 5, 5, 5, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0)
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20)
+# The king hides behind its pawns in the middlegame and heads for the centre in the endgame
+KING_MG = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20)
+KING_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+
+def from_white(table):
+    # Rank-8-first layout -> indexed by square (a1 = 0)
+    return [table[sq ^ 56] for sq in range(64)]
+
+
+# name -> (middlegame, endgame) weights. Lists indexed by piece type have an unused slot 0;
+# 'pst' holds one 64-square table per type.
+DEFAULT_WEIGHTS = {
+    'material': ([0, 100, 320, 330, 500, 900, 0], [0, 120, 290, 320, 530, 950, 0]),
+    'pst': ([[0] * 64, from_white(PAWN_MG), from_white(KNIGHT_TABLE), from_white(BISHOP_TABLE),
+             from_white(ROOK_TABLE), from_white(QUEEN_TABLE), from_white(KING_MG)],
+            [[0] * 64, from_white(PAWN_EG), from_white(KNIGHT_TABLE), from_white(BISHOP_TABLE),
+             from_white(ROOK_TABLE), from_white(QUEEN_TABLE), from_white(KING_EG)]),
+    # Per square a knight, bishop, rook or queen attacks that its own side doesn't occupy
+    'mobility': ([0, 0, 4, 5, 2, 1, 0], [0, 0, 4, 5, 4, 2, 0]),
+    # Per square next to the enemy king that a piece attacks
+    'king_attack': ([0, 0, 6, 6, 8, 12, 0], [0, 0, 0, 0, 0, 0, 0]),
+    # Per own pawn on the two ranks in front of the king
+    'pawn_shield': ([12], [0]),
+}
+
+
+def pack(mg, eg):
+    # Both halves of a score in one int, so make_move updates them with a single add
+    return (mg << 16) + eg
+
+
+def unpack(score):
+    eg = ((score + 0x8000) & 0xFFFF) - 0x8000
+    return (score - eg) >> 16, eg
+
+
+def piece_square(weights):
+    # Material plus piece-square value, packed, indexed by piece code then square and
+    # signed for white; black pieces read the table rank-mirrored
+    material_mg, material_eg = weights['material']
+    pst_mg, pst_eg = weights['pst']
+    table = [[0] * 64 for _ in range(16)]
+    for piece_type in range(PAWN, KING + 1):
+        for sq in range(64):
+            value = pack(material_mg[piece_type] + pst_mg[piece_type][sq],
+                         material_eg[piece_type] + pst_eg[piece_type][sq])
+            table[piece_type][sq] = value
+            table[8 | piece_type][sq ^ 56] = -value
+    return table
+
+
+def load_weights(path=WEIGHTS_FILE):
+    if not os.path.exists(path):
+        return DEFAULT_WEIGHTS
+    with open(path) as f:
+        return {**DEFAULT_WEIGHTS, **json.load(f)}
+
+
+def save_weights(weights, path=WEIGHTS_FILE):
+    with open(path, 'w') as f:
+        json.dump(weights, f, indent=1)
+
+
+WEIGHTS = load_weights()
+PIECE_SQUARE = piece_square(WEIGHTS)
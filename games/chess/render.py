@@ -0,0 +1,68 @@
+import pygame
+
+# Dirty-rectangle drawing for main.py. Each frame the window is described as regions (a
+# rect, a hashable signature of what it shows and a paint function); only regions whose
+# signature changed are repainted and only their rects are sent to display.update, so a
+# frame where nothing changed costs a few comparisons and no drawing at all.
+TEXT_CACHE_LIMIT = 512
+
+
+class TextCache:
+    # Rendered text surfaces by (font, text, colour); the oldest entries go first once the
+    # cache is full, since counters in the engine panel change all the time
+    def __init__(self, limit=TEXT_CACHE_LIMIT):
+        self.surfaces = {}
+        self.limit = limit
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            if len(self.surfaces) >= self.limit:
+                del self.surfaces[next(iter(self.surfaces))]
+            surface = self.surfaces[key] = font.render(text, True, color)
+        return surface
+
+
+class Renderer:
+    # Base regions tile the window and are repainted over the pre-rendered background;
+    # overlays (base=False) are painted on top of them. Anything sharing pixels with a
+    # changed region is repainted with it, so an overlay stays on top of a square that
+    # changes under it and the squares come back when the overlay goes.
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self.regions = []
+        # name -> (rect, signature) as last painted
+        self.shown = {}
+
+    def region(self, name, rect, signature, paint, base=True):
+        # paint(rect, signature) draws the region's content onto the screen
+        self.regions.append((name, pygame.Rect(rect), signature, paint, base))
+
+    def invalidate(self):
+        # Repaint everything next frame (after the window was covered, for instance)
+        self.shown = {}
+        self.screen.blit(self.background, (0, 0))
+        pygame.display.flip()
+
+    def present(self):
+        regions, self.regions = self.regions, []
+        names = {region[0] for region in regions}
+        changed = [rect for name, rect, signature, _, _ in regions if self.shown.get(name) != (rect, signature)]
+        for name in [name for name in self.shown if name not in names]:
+            changed.append(self.shown.pop(name)[0])
+        if not changed:
+            return
+        painted = []
+        for name, rect, signature, paint, base in regions:
+            if self.shown.get(name) == (rect, signature) and rect.collidelist(changed) == -1:
+                continue
+            self.screen.set_clip(rect)
+            if base:
+                self.screen.blit(self.background, rect, rect)
+            paint(rect, signature)
+            self.shown[name] = (rect, signature)
+            painted.append(rect)
+        self.screen.set_clip(None)
+        pygame.display.update(painted)
@@ -0,0 +1,252 @@
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+
+from attacks import piece_attacks
+from bitboard import BLACK, KING_ATTACKS, WHITE, popcount
+from gamestate import BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK, GameState, move_name
+from movegen import generate_moves
+
+# Distance-to-mate tables for king and queen, rook or pawn against a lone king, solved
+# backwards from the mates. One byte per position: plies to mate + 1, or 0 for a draw
+# (or an impossible position). The side with the extra piece is always the one mating, so
+# the side to move wins when it is the strong side and loses otherwise.
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases')
+ENDGAMES = {'KQK': QUEEN, 'KRK': ROOK, 'KPK': PAWN}
+WIN, DRAW, LOSS = 1, 0, -1
+RAW_SIZE = 64 * 64 * 64 * 2
+# Piece endgames put the strong king on a1-d1-d4 (10 squares) by flipping files, ranks and
+# the diagonal; the pawn keeps its direction, so KPK only flips files to put it on a-d
+TRIANGLE = {sq: index for index, sq in enumerate(
+    sq for sq in range(64) if (sq & 7) < 4 and (sq >> 3) <= (sq & 7))}
+KING_SQUARES = [[to for to in range(64) if KING_ATTACKS[sq] >> to & 1] for sq in range(64)]
+
+
+def raw_index(wk, wx, bk, side):
+    return ((wk * 64 + wx) * 64 + bk) * 2 + side
+
+
+def table_index(piece, wk, wx, bk, side):
+    # Squares with the strong side as white; equal positions under symmetry share an index
+    if piece == PAWN:
+        if wx & 7 > 3:
+            wk, wx, bk = wk ^ 7, wx ^ 7, bk ^ 7
+        return ((((wx >> 3) - 1) * 4 + (wx & 7)) * 4096 + wk * 64 + bk) * 2 + side
+    if wk & 7 > 3:
+        wk, wx, bk = wk ^ 7, wx ^ 7, bk ^ 7
+    if wk >> 3 > 3:
+        wk, wx, bk = wk ^ 56, wx ^ 56, bk ^ 56
+    if wk >> 3 > wk & 7:
+        wk, wx, bk = transpose(wk), transpose(wx), transpose(bk)
+    return ((TRIANGLE[wk] * 64 + wx) * 64 + bk) * 2 + side
+
+
+def transpose(sq):
+    # Reflection in the a1-h8 diagonal
+    return (sq & 7) << 3 | sq >> 3
+
+
+def table_size(piece):
+    return 24 * 4096 * 2 if piece == PAWN else len(TRIANGLE) * 4096 * 2
+
+
+def black_moves(piece, wk, wx, bk):
+    # Legal moves of the lone king; taking an undefended piece counts (it leads to a draw)
+    count = 0
+    for to in KING_SQUARES[bk]:
+        if to == wk or KING_ATTACKS[wk] >> to & 1:
+            continue
+        if to != wx and piece_attacks(piece, wx, 1 << wk | 1 << wx | 1 << to) >> to & 1:
+            continue
+        count += 1
+    return count
+
+
+def solve(piece, promotions=()):
+    # Retrograde analysis over every placement (raw indices, no symmetry): mates are
+    # ply 0, and each level adds the white positions one move before a lost black
+    # position, then the black positions whose every move reaches a won white one.
+    # promotions: (piece, solved raw table) pairs a pawn on the seventh can promote into.
+    values = bytearray(RAW_SIZE)
+    counts = bytearray(RAW_SIZE)
+    levels = defaultdict(list)
+    for wk in range(64):
+        for wx in range(64):
+            if wx == wk or (piece == PAWN and not 8 <= wx < 56):
+                continue
+            for bk in range(64):
+                if bk == wk or bk == wx or KING_ATTACKS[wk] >> bk & 1:
+                    continue
+                checked = piece_attacks(piece, wx, 1 << wk | 1 << wx | 1 << bk) >> bk & 1
+                index = raw_index(wk, wx, bk, BLACK)
+                counts[index] = black_moves(piece, wk, wx, bk)
+                if not counts[index] and checked:
+                    levels[0].append(index)
+                if piece == PAWN and wx >= 48 and not checked and wx + 8 not in (wk, bk):
+                    # A promotion wins in one more ply than the promoted position takes
+                    for promoted, table in promotions:
+                        value = table[raw_index(wk, wx + 8, bk, BLACK)]
+                        if value:
+                            levels[value].append(raw_index(wk, wx, bk, WHITE))
+    ply = 0
+    while levels:
+        for index in levels.pop(ply, ()):
+            if values[index]:
+                continue
+            values[index] = ply + 1
+            side = index & 1
+            bk = index >> 1 & 63
+            wx = index >> 7 & 63
+            wk = index >> 13
+            if side == BLACK:
+                for previous in white_predecessors(piece, wk, wx, bk):
+                    if not values[previous]:
+                        levels[ply + 1].append(previous)
+            else:
+                for previous in KING_SQUARES[bk]:
+                    if previous in (wk, wx) or KING_ATTACKS[wk] >> previous & 1:
+                        continue
+                    previous = raw_index(wk, wx, previous, BLACK)
+                    if not values[previous]:
+                        counts[previous] -= 1
+                        if not counts[previous]:
+                            levels[ply + 1].append(previous)
+        ply += 1
+    return values
+
+
+def white_predecessors(piece, wk, wx, bk):
+    # White-to-move positions one white move before (wk, wx, bk) with black to move
+    occ = 1 << wk | 1 << wx | 1 << bk
+    for previous in KING_SQUARES[wk]:
+        if (previous not in (wx, bk) and not KING_ATTACKS[bk] >> previous & 1
+                and not piece_attacks(piece, wx, occ ^ 1 << wk | 1 << previous) >> bk & 1):
+            yield raw_index(previous, wx, bk, WHITE)
+    if piece == PAWN:
+        origins = []
+        if wx >= 16 and not occ >> (wx - 8) & 1:
+            origins.append(wx - 8)
+            if 24 <= wx < 32 and not occ >> (wx - 16) & 1:
+                origins.append(wx - 16)
+    else:
+        reach = piece_attacks(piece, wx, occ) & ~occ
+        origins = [sq for sq in range(64) if reach >> sq & 1]
+    for previous in origins:
+        if not piece_attacks(piece, previous, occ ^ 1 << wx | 1 << previous) >> bk & 1:
+            yield raw_index(wk, previous, bk, WHITE)
+
+
+def compress(piece, values):
+    table = bytearray(table_size(piece))
+    for index, value in enumerate(values):
+        if value:
+            side, bk, wx, wk = index & 1, index >> 1 & 63, index >> 7 & 63, index >> 13
+            table[table_index(piece, wk, wx, bk, side)] = value
+    return table
+
+
+def generate(directory=TABLE_DIR):
+    # KPK needs the solved KQK and KRK tables for its promotions
+    os.makedirs(directory, exist_ok=True)
+    solved = {}
+    for name, piece in ENDGAMES.items():
+        start = time.perf_counter()
+        promotions = ((QUEEN, solved['KQK']), (ROOK, solved['KRK'])) if piece == PAWN else ()
+        solved[name] = values = solve(piece, promotions)
+        table = compress(piece, values)
+        with open(os.path.join(directory, name.lower() + '.tb'), 'wb') as f:
+            f.write(table)
+        yield name, table, time.perf_counter() - start
+
+
+class Tablebases:
+    # Loads whichever tables have been generated; probe() answers for positions with a
+    # king and at most one other piece, None otherwise
+    def __init__(self, directory=TABLE_DIR):
+        self.tables = {}
+        for name, piece in ENDGAMES.items():
+            path = os.path.join(directory, name.lower() + '.tb')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    self.tables[piece] = f.read()
+
+    def probe(self, state):
+        # (WIN, LOSS or DRAW for the side to move, plies to mate)
+        occ = state.occupancy[WHITE] | state.occupancy[BLACK]
+        pieces = popcount(occ)
+        if pieces > 3 or state.castling:
+            return None
+        if pieces == 2:
+            return DRAW, 0
+        board = state.board
+        strong = 0 if popcount(state.occupancy[WHITE]) == 2 else 1
+        extra = next(sq for sq in range(64) if board[sq] and board[sq] & 7 != KING)
+        piece = board[extra] & 7
+        if piece in (KNIGHT, BISHOP):
+            return DRAW, 0
+        table = self.tables.get(piece)
+        if table is None:
+            return None
+        wk = state.king_square(strong)
+        bk = state.king_square(strong ^ 1)
+        side = state.side
+        if strong == BLACK:
+            wk, extra, bk, side = wk ^ 56, extra ^ 56, bk ^ 56, side ^ 1
+        value = table[table_index(piece, wk, extra, bk, side)]
+        if not value:
+            return DRAW, 0
+        return (WIN if side == WHITE else LOSS), value - 1
+
+    def best_move(self, state, moves=None):
+        # (move, result, plies) for the quickest win, the longest loss or a drawing move;
+        # None unless every move leads to a position the tables cover
+        best = None
+        for move in generate_moves(state) if moves is None else moves:
+            state.make_move(move)
+            found = self.probe(state)
+            state.unmake_move(move)
+            if found is None:
+                return None
+            result, plies = -found[0], found[1] + 1
+            rank = (result, -plies if result == WIN else plies)
+            if best is None or rank > best[0]:
+                best = rank, (move, result, plies if result else 0)
+        return best[1] if best is not None else None
+
+
+def describe(state, found):
+    result, plies = found
+    if result == DRAW:
+        return 'Tablebase draw'
+    winner = ('White', 'Black')[state.side if result == WIN else state.side ^ 1]
+    return f'{winner} mates in {(plies + 1) // 2}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate or probe the KQK, KRK and KPK tablebases')
+    parser.add_argument('--generate', action='store_true', help=f'Solve the tables into {TABLE_DIR}')
+    parser.add_argument('--fen', help='Position to probe')
+    args = parser.parse_args()
+
+    if args.generate:
+        for name, table, seconds in generate():
+            won = sum(1 for value in table if value)
+            longest = max(table) // 2
+            print(f"{name}: {len(table):,} bytes, {won:,} decisive positions, "
+                  f"longest mate {longest} moves, {seconds:.1f} s")
+    if args.fen:
+        state = GameState(args.fen)
+        tables = Tablebases()
+        found = tables.probe(state)
+        if found is None:
+            print('Position not covered by the tables')
+            return 1
+        best = tables.best_move(state)
+        print(describe(state, found) + (f", best move {move_name(best[0])}" if best else ''))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+DEFAULT_HASH_MB = 16
+ENTRY_BYTES = 16
+EXACT, LOWER, UPPER = 1, 2, 3
+# Scores are stored offset so they pack as unsigned; mate scores fit comfortably
+SCORE_OFFSET = 1 << 17
+MAX_STORED_DEPTH = 127
+
+
+def pack(move, depth, score, bound, generation):
+    # move: 17 bits, depth: 7, bound: 2, generation: 6, score: 18
+    return (move | depth << 17 | bound << 24 | generation << 26 | (score + SCORE_OFFSET) << 32)
+
+
+def table_bytes(size_mb):
+    # Largest power-of-two number of two-slot buckets that fits in size_mb
+    entries = max(2, size_mb * (1 << 20) // ENTRY_BYTES)
+    return (1 << (entries // 2).bit_length() - 1) * 2 * ENTRY_BYTES
+
+
+class TranspositionTable:
+    # Fixed-size two-tier table of 64-bit words: every key slot in the first half of the
+    # buffer, the matching data words in the second. Each bucket holds a depth-preferred slot
+    # and an always-replace slot. The key is stored XORed with the data word, so a torn or
+    # mismatched pair (several processes can share the buffer without locks) fails the key
+    # check instead of returning bad data.
+    def __init__(self, size_mb=DEFAULT_HASH_MB, buffer=None):
+        # buffer: a writable bytes-like object such as SharedMemory.buf; sized from size_mb if None
+        self.buffer = bytearray(table_bytes(size_mb)) if buffer is None else buffer
+        words = memoryview(self.buffer).cast('Q')
+        slots = len(words) // 2
+        self.mask = slots // 2 - 1
+        self.keys = words[:slots]
+        self.data = words[slots:]
+        self.generation = 0
+
+    def clear(self):
+        self.buffer[:] = bytes(len(self.buffer))
+        self.generation = 0
+
+    def new_search(self):
+        # Entries from earlier searches become replaceable regardless of depth
+        self.generation = (self.generation + 1) & 63
+
+    def probe(self, key):
+        # (move, depth, score, bound) or None
+        keys, data = self.keys, self.data
+        index = (key & self.mask) << 1
+        for slot in (index, index + 1):
+            word = data[slot]
+            if keys[slot] ^ word == key and word:
+                return (word & 0x1FFFF, word >> 17 & 127, (word >> 32) - SCORE_OFFSET, word >> 24 & 3)
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        keys, data = self.keys, self.data
+        index = (key & self.mask) << 1
+        word = pack(move, min(depth, MAX_STORED_DEPTH), score, bound, self.generation)
+        current = data[index]
+        if (keys[index] ^ current == key or depth >= (current >> 17 & 127)
+                or (current >> 26 & 63) != self.generation):
+            if keys[index] ^ current != key and current:
+                # Demote the old deep entry rather than lose it outright
+                keys[index + 1], data[index + 1] = keys[index], current
+            keys[index], data[index] = key ^ word, word
+        else:
+            keys[index + 1], data[index + 1] = key ^ word, word
+
+    def usage(self):
+        # Permille of slots written during the current search, sampled like UCI hashfull
+        sample = min(1000, len(self.data))
+        return sum(1 for word in self.data[:sample] if word and (word >> 26 & 63) == self.generation) * 1000 // sample
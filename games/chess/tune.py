@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import math
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from evaluation import FEATURE_COUNT, LAYOUT, OFFSETS, activity, flatten, unflatten
+from gamestate import WHITE, GameState
+from pst import MAX_PHASE, WEIGHTS, WEIGHTS_FILE, save_weights
+
+# Texel tuning: fit the evaluation weights so that sigmoid(K * eval / 400) predicts game
+# results over a set of labelled positions. Features are extracted once; each epoch is then
+# a handful of array operations over the whole set.
+#
+# Positions are stored compactly: the few dense features (material, mobility, king attacks,
+# pawn shield) as a small matrix, and the piece-square features as up to 32 feature indices
+# per position with a +1/-1 sign, padded with PADDING (a feature whose weight stays 0).
+DENSE_FEATURES = np.array([OFFSETS[name] + i for name, size in LAYOUT if name != 'pst' for i in range(size)])
+PADDING = FEATURE_COUNT
+RESULTS = {'1-0': 1.0, '1.0': 1.0, '0-1': 0.0, '0.0': 0.0, '1/2-1/2': 0.5, '0.5': 0.5}
+# 'FEN [1.0]', 'FEN "1/2-1/2";', 'FEN c9 "0-1";' and similar, result from white's side
+LINE = re.compile(r'^(?P<fen>[^\[";]+?)\s*(?:c9\s*)?[\["]?(?P<result>1-0|0-1|1/2-1/2|1\.0|0\.5|0\.0)[\]"]?;?\s*$')
+
+
+def read_positions(path, limit=None):
+    with open(path) as f:
+        matches = (LINE.match(line.strip()) for line in f)
+        labelled = (match for match in matches if match)
+        for match in itertools.islice(labelled, limit):
+            yield GameState(match.group('fen')), RESULTS[match.group('result')]
+
+
+def extract(positions):
+    # (dense features, piece-square indices, signs, phases, results) arrays
+    dense, indices, signs, phases, results = [], [], [], [], []
+    pst = OFFSETS['pst']
+    for state, result in positions:
+        material = [0] * 7
+        row_indices, row_signs = [], []
+        for sq, piece in enumerate(state.board):
+            if piece:
+                sign, table_sq = (1, sq) if piece >> 3 == WHITE else (-1, sq ^ 56)
+                material[piece & 7] += sign
+                row_indices.append(pst + (piece & 7) * 64 + table_sq)
+                row_signs.append(sign)
+        padding = 32 - len(row_indices)
+        mobility, king_attack, shield = activity(state)
+        dense.append(material + mobility + king_attack + [shield])
+        indices.append(row_indices + [PADDING] * padding)
+        signs.append(row_signs + [0] * padding)
+        phases.append(min(state.phase, MAX_PHASE))
+        results.append(result)
+    return (np.array(dense, dtype=np.int16), np.array(indices, dtype=np.int16), np.array(signs, dtype=np.int8),
+            np.array(phases, dtype=np.float64) / MAX_PHASE, np.array(results, dtype=np.float64))
+
+
+def load_dataset(path, limit=None, cache=None):
+    if cache and os.path.exists(cache):
+        data = np.load(cache)
+        return tuple(data[name] for name in ('dense', 'indices', 'signs', 'phases', 'results'))
+    arrays = extract(read_positions(path, limit))
+    if cache:
+        np.savez(cache, **dict(zip(('dense', 'indices', 'signs', 'phases', 'results'), arrays)))
+    return arrays
+
+
+def linear_eval(weights, dense, indices, signs):
+    # Feature vectors dotted with one weight vector (length FEATURE_COUNT + 1)
+    return dense @ weights[DENSE_FEATURES] + (weights[indices] * signs).sum(axis=1)
+
+
+def evaluate_all(mg, eg, data):
+    # White's score for every position, tapered as in evaluation.taper (without rounding)
+    dense, indices, signs, phases, _ = data
+    return linear_eval(mg, dense, indices, signs) * phases + linear_eval(eg, dense, indices, signs) * (1 - phases)
+
+
+def sigmoid(scores, k):
+    return 1 / (1 + np.power(10.0, -k * scores / 400))
+
+
+def loss(mg, eg, data, k):
+    return float(np.mean((data[4] - sigmoid(evaluate_all(mg, eg, data), k)) ** 2))
+
+
+def fit_k(mg, eg, data, low=0.1, high=3.0):
+    # Golden-section search for the scaling that best fits the starting weights
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(40):
+        a, b = high - ratio * (high - low), low + ratio * (high - low)
+        if loss(mg, eg, data, a) < loss(mg, eg, data, b):
+            high = b
+        else:
+            low = a
+    return (low + high) / 2
+
+
+def gradient(terms, dense, indices, signs):
+    # Gradient of sum(terms * linear_eval(weights)) over the weights
+    grad = np.zeros(FEATURE_COUNT + 1)
+    grad[DENSE_FEATURES] = dense.T @ terms
+    grad += np.bincount(indices.ravel().astype(np.int64), weights=(signs * terms[:, None]).ravel(),
+                        minlength=FEATURE_COUNT + 1)
+    grad[PADDING] = 0
+    return grad
+
+
+def tune(data, k, weights=WEIGHTS, epochs=1000, rate=1.0, report=None):
+    # Full-batch Adam on the mean squared error; returns (middlegame, endgame) vectors
+    dense, indices, signs, phases, results = data
+    mg, eg = (np.array(vector + [0], dtype=np.float64) for vector in flatten(weights))
+    moments = [np.zeros_like(mg) for _ in range(4)]
+    for epoch in range(1, epochs + 1):
+        predicted = sigmoid(evaluate_all(mg, eg, data), k)
+        # d(loss)/d(score) per position
+        slope = -2 * (results - predicted) * predicted * (1 - predicted) * k * math.log(10) / 400 / len(results)
+        for vector, first, second, share in ((mg, moments[0], moments[1], phases),
+                                             (eg, moments[2], moments[3], 1 - phases)):
+            grad = gradient(slope * share, dense, indices, signs)
+            first[:] = 0.9 * first + 0.1 * grad
+            second[:] = 0.999 * second + 0.001 * grad * grad
+            vector -= rate * (first / (1 - 0.9 ** epoch)) / (np.sqrt(second / (1 - 0.999 ** epoch)) + 1e-12)
+        if report is not None and (epoch % 50 == 0 or epoch == epochs):
+            report(epoch, float(np.mean((results - predicted) ** 2)))
+    return mg, eg
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the evaluation weights on labelled positions')
+    parser.add_argument('dataset', help='Positions, one per line: a FEN followed by the result (1-0, 0-1, 1/2-1/2 '
+                                        'or 1.0, 0.0, 0.5, optionally in [] or quotes)')
+    parser.add_argument('--output', default=WEIGHTS_FILE, help='Weights file to write (the evaluator loads '
+                                                               f'{os.path.basename(WEIGHTS_FILE)} by default)')
+    parser.add_argument('--epochs', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=1.0, help='Step size in centipawns')
+    parser.add_argument('--k', type=float, help='Sigmoid scaling (fitted to the starting weights by default)')
+    parser.add_argument('--limit', type=int, help='Use only the first LIMIT positions')
+    parser.add_argument('--cache', help='.npz file to keep the extracted features in between runs')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = load_dataset(args.dataset, args.limit, args.cache)
+    print(f"{len(data[4]):,} positions loaded in {time.perf_counter() - start:.1f} s")
+    mg, eg = (np.array(vector + [0], dtype=np.float64) for vector in flatten(WEIGHTS))
+    k = args.k or fit_k(mg, eg, data)
+    print(f"K = {k:.3f}, starting loss {loss(mg, eg, data, k):.6f}")
+
+    start = time.perf_counter()
+    mg, eg = tune(data, k, epochs=args.epochs, rate=args.rate,
+                  report=lambda epoch, error: print(f"epoch {epoch:>5}  loss {error:.6f}"))
+    weights = unflatten(mg[:FEATURE_COUNT], eg[:FEATURE_COUNT])
+    rounded = [np.array(vector + [0], dtype=np.float64) for vector in flatten(weights)]
+    print(f"Tuned in {time.perf_counter() - start:.1f} s, final loss {loss(*rounded, data, k):.6f} (rounded weights)")
+    save_weights(weights, args.output)
+    print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
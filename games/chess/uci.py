@@ -0,0 +1,141 @@
+import sys
+import threading
+
+from book import OpeningBook
+from engine import Engine
+from gamestate import START_FEN, GameState, move_name
+from movegen import generate_moves
+from transposition import DEFAULT_HASH_MB
+
+# A small UCI engine on stdin/stdout, so the search can run in its own process (and any
+# UCI front end can use it). Supported: uci, isready, ucinewgame,
+# setoption name Hash value MB, setoption name Book value PATH, position [startpos | fen ...] [moves ...],
+# go [depth N] [movetime MS] [infinite], stop, quit.
+
+
+def parse_move(state, text):
+    for move in generate_moves(state):
+        if move_name(move) == text:
+            return move
+    raise ValueError(f"Illegal move {text} in {state.fen()}")
+
+
+def parse_position(tokens):
+    if tokens and tokens[0] == 'fen':
+        end = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        state = GameState(' '.join(tokens[1:end]))
+        tokens = tokens[end:]
+    else:
+        state = GameState(START_FEN)
+        tokens = tokens[1:]
+    for text in tokens[1:] if tokens and tokens[0] == 'moves' else ():
+        state.make_move(parse_move(state, text))
+    return state
+
+
+def info_line(result):
+    seconds = max(result.seconds, 1e-9)
+    return (f"info depth {result.depth} score cp {result.score} nodes {result.nodes} "
+            f"nps {int(result.nodes / seconds)} time {int(result.seconds * 1000)} "
+            f"pv {' '.join(move_name(move) for move in result.pv)}")
+
+
+class UciEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.lock = threading.Lock()
+        self.engine = Engine()
+        self.engine.stop = self.stop_event = threading.Event()
+        self.engine.report = lambda result: self.send(info_line(result))
+        self.state = GameState(START_FEN)
+        self.thread = None
+        self.book = None
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def wait(self):
+        # A new command never overlaps a running search; callers stop it first if they mean to
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def go(self, tokens):
+        self.wait()
+        depth = time_limit = None
+        if 'depth' in tokens:
+            depth = int(tokens[tokens.index('depth') + 1])
+        if 'movetime' in tokens:
+            time_limit = int(tokens[tokens.index('movetime') + 1]) / 1000
+        if 'infinite' in tokens:
+            # Runs until stop; the iteration cap is the engine's own
+            depth, time_limit = None, float('inf')
+        self.stop_event.clear()
+        state = self.state
+        # Timed searches answer from the book without thinking; infinite ones are ponders,
+        # which gain nothing from it
+        book_move = self.book.choose(state) if self.book is not None and 'infinite' not in tokens else None
+        if book_move is not None:
+            self.send(f"bestmove {move_name(book_move)}")
+            return
+        self.thread = threading.Thread(target=self.think, args=(state, depth, time_limit), daemon=True)
+        self.thread.start()
+
+    def think(self, state, depth, time_limit):
+        result = self.engine.search(state, depth, time_limit)
+        self.send(f"bestmove {move_name(result.move) if result.move is not None else '0000'}")
+
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, tokens = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send('id name Pygame Chess')
+            self.send(f'option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 4096')
+            self.send('option name Book type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.wait()
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.wait()
+            self.engine.table.clear()
+        elif command == 'setoption' and len(tokens) >= 4 and tokens[1].lower() == 'hash':
+            self.wait()
+            stop, report = self.engine.stop, self.engine.report
+            self.engine = Engine(int(tokens[3]))
+            self.engine.stop, self.engine.report = stop, report
+        elif command == 'setoption' and len(tokens) >= 4 and tokens[1].lower() == 'book':
+            self.wait()
+            if self.book is not None:
+                self.book.close()
+            path = ' '.join(tokens[3:])
+            self.book = OpeningBook(path) if path != '<empty>' else None
+        elif command == 'position':
+            self.wait()
+            self.state = parse_position(tokens)
+        elif command == 'go':
+            self.go(tokens)
+        elif command == 'stop':
+            self.stop_event.set()
+            self.wait()
+        elif command == 'quit':
+            self.stop_event.set()
+            self.wait()
+            return False
+        return True
+
+
+def main():
+    uci = UciEngine()
+    for line in sys.stdin:
+        if not uci.handle(line):
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,18 +2,39 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import pyodbc
 import argparse
+import getpass
 import logging
+import sqlite3
+import threading
 from datetime import datetime
 from pathlib import Path
 from tkcalendar import DateEntry
+from audit import AuditLog, output_images, output_into
+from customer_history import HISTORY, CustomerHistory
+from db import SqlServerBackend, sql_server_connection_string
+from migrations import MigrationRunner
+from scanner import MedicationCache, ScanValidator
+from search_index import FuzzyIndex, stream_rows
+from snapshot import SnapshotReader
+from row_mapping import (ADDRESSES, CUSTOMERS, EMPLOYEES, MEDICATIONS, ORDER_STATEMENTS, PRESCRIPTIONS,
+                         SALES, SALES_STATEMENTS, STOCK, SUPPLIERS)
+from tree_sort import TreeSorter
+
+
+SEARCH_LIMIT = 50
+# Largest value of the INT med_id column
+MAX_MED_ID = 2 ** 31 - 1
 
 
 class PharmacyConfig:
-    def __init__(self, server='LAPTOP-VIO2PNI9', database='project2', trusted_connection='yes', log_file='logs/pharmacy.log'):
+    def __init__(self, server='LAPTOP-VIO2PNI9', database='project2', trusted_connection='yes', log_file='logs/pharmacy.log',
+                 snapshot=None):
         self.server = server
         self.database = database
         self.trusted_connection = trusted_connection
         self.log_file = log_file
+        # Path of a snapshot.py file that the report tabs read instead of the live database
+        self.snapshot = snapshot
 
 
 class PharmacyManagementSystem:
@@ -29,12 +50,8 @@ class PharmacyManagementSystem:
         self.setup_logging()
 
         # Database connection string
-        self.conn_str = (
-            'DRIVER={SQL Server};'
-            f'SERVER={self.config.server};'
-            f'DATABASE={self.config.database};'
-            f'Trusted_Connection={self.config.trusted_connection};'
-        )
+        self.conn_str = sql_server_connection_string(
+            self.config.server, self.config.database, self.config.trusted_connection)
 
         # Test database connection
         try:
@@ -43,6 +60,28 @@ class PharmacyManagementSystem:
             messagebox.showerror("Database Error", f"Failed to connect to database: {str(e)}")
             raise
 
+        # Report tables and indexes the application relies on but the database lacks
+        missing_tables = self.check_schema()
+
+        # Reports can read a local snapshot so they do not compete with checkout traffic
+        self.snapshot = None
+        self.report_fetch = self.execute_db_operation
+        self.report_dialect = 'mssql'
+        if self.config.snapshot:
+            self.open_snapshot(self.config.snapshot)
+
+        # Data changes are buffered and written to Audit_Log in the background
+        self.audit_log = AuditLog(SqlServerBackend(self.conn_str), getpass.getuser(),
+                                  enabled='Audit_Log' not in missing_tables)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Typo-tolerant search indexes are built from a streaming scan in the background;
+        # edits made before the build finishes are queued and replayed onto it.
+        self.search_lock = threading.Lock()
+        self.search_indexes = None
+        self.search_backlog = []
+        threading.Thread(target=self.build_search_indexes, daemon=True).start()
+
         # Create main notebook for tabs
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=5)
@@ -78,6 +117,112 @@ class PharmacyManagementSystem:
             logging.error(f"Database connection failed: {e}")
             raise
 
+    def on_close(self):
+        self.audit_log.close()
+        logging.info("Application closed.")
+        self.root.destroy()
+
+    def open_snapshot(self, path):
+        try:
+            reader = SnapshotReader(path)
+            refreshed_at = reader.refreshed_at()
+        except sqlite3.Error as e:
+            messagebox.showerror("Snapshot Error", f"Cannot open snapshot {path}: {str(e)}")
+            logging.error(f"Opening snapshot {path} failed: {e}")
+            return
+        self.snapshot = reader
+        self.report_fetch = self.execute_snapshot_query
+        self.report_dialect = reader.dialect
+        self.root.title(f"Pharmacy Management System - reports from snapshot of {refreshed_at}")
+        logging.info(f"Report tabs reading snapshot {path} taken {refreshed_at}")
+
+    def check_schema(self):
+        # Returns the names of missing tables (none if the check itself failed)
+        try:
+            runner = MigrationRunner(SqlServerBackend(self.conn_str))
+            pending = runner.pending_migrations()
+            missing_tables = [table.name for table in runner.missing_tables()]
+            missing = runner.missing_indexes()
+        except Exception as e:
+            logging.error(f"Schema check failed: {e}")
+            return []
+        for migration in pending:
+            logging.warning(f"Pending schema migration {migration.version}: {migration.description}")
+        for table in missing_tables:
+            logging.warning(f"Missing table {table}")
+        for index in missing:
+            logging.warning(f"Missing index {index.name} on {index!r}")
+        if missing_tables or missing:
+            names = '\n'.join(missing_tables + [f"{index.name} on {index!r}" for index in missing])
+            messagebox.showwarning("Schema Warning",
+                                   f"The database is missing tables or indexes used by this application:\n{names}\n\n"
+                                   "Run 'python migrations.py upgrade' to create them.")
+        return missing_tables
+
+    # -----------------------------
+    # Fuzzy Search
+    # -----------------------------
+    def build_search_indexes(self):
+        try:
+            with pyodbc.connect(self.conn_str) as conn:
+                cursor = conn.cursor()
+                indexes = {
+                    'cust_name': FuzzyIndex().build(self.search_rows(cursor, "SELECT cust_id, cust_name FROM Customer")),
+                    'cust_phone': FuzzyIndex(pad=False).build(self.search_rows(cursor, "SELECT cust_id, cust_phone FROM Customer")),
+                    'med_name': FuzzyIndex().build(self.search_rows(cursor, "SELECT med_id, med_name FROM Medication")),
+                }
+        except Exception as e:
+            logging.error(f"Building search indexes failed: {e}")
+            with self.search_lock:
+                self.search_backlog = None
+            return
+        with self.search_lock:
+            for field, key, text in self.search_backlog:
+                indexes[field].update(key, text)
+            self.search_indexes = indexes
+            self.search_backlog = None
+        logging.info(f"Search indexes ready: {len(indexes['cust_name'])} customers, {len(indexes['med_name'])} medications")
+
+    def search_rows(self, cursor, query):
+        return ((str(key).strip(), text) for key, text in stream_rows(cursor, query))
+
+    def index_search_text(self, field, key, text):
+        with self.search_lock:
+            if self.search_indexes is None:
+                if self.search_backlog is not None:
+                    self.search_backlog.append((field, str(key).strip(), text))
+            else:
+                self.search_indexes[field].update(str(key).strip(), text)
+
+    def search_keys(self, fields, text):
+        # Keys ranked by their best score across the given fields, or None while the indexes load
+        with self.search_lock:
+            if self.search_indexes is None:
+                return None
+            ranked = {}
+            for field in fields:
+                for key, _, score in self.search_indexes[field].search(text, SEARCH_LIMIT):
+                    ranked[key] = max(score, ranked.get(key, 0))
+        return sorted(ranked, key=ranked.get, reverse=True)[:SEARCH_LIMIT]
+
+    def show_search_results(self, sorter, key_column, fields, text):
+        if not text.strip():
+            sorter.reload()
+            return
+        keys = self.search_keys(fields, text)
+        if keys is None:
+            messagebox.showinfo("Search", "The search index is not available yet; see the log if this persists.")
+            return
+        rows = []
+        if keys:
+            placeholders = ', '.join('?' for _ in keys)
+            query, _ = sorter.query.select(f"{key_column} IN ({placeholders})", limit=len(keys))
+            rows = self.execute_db_operation(query, keys) or []
+        rank = {key: position for position, key in enumerate(keys)}
+        rows.sort(key=lambda row: rank.get(str(getattr(row, key_column)).strip(), len(rank)))
+        sorter.show(rows)
+        logging.info(f"Search for '{text}' matched {len(rows)} rows in {sorter.query.table}")
+
     # -----------------------------
     # Customer Operations
     # -----------------------------
@@ -129,15 +274,22 @@ class PharmacyManagementSystem:
         ttk.Button(btn_frame, text="Update Customer",
                    command=self.update_customer).pack(side='left', padx=5)
 
+        # Search by name or phone, tolerant of misspellings
+        ttk.Button(btn_frame, text="Clear",
+                   command=self.clear_customer_search).pack(side='right', padx=5)
+        ttk.Button(btn_frame, text="Search",
+                   command=self.search_customers).pack(side='right', padx=5)
+        self.customer_search = ttk.Entry(btn_frame, width=30)
+        self.customer_search.pack(side='right', padx=5)
+        self.customer_search.bind('<Return>', lambda event: self.search_customers())
+        ttk.Label(btn_frame, text="Search name/phone:").pack(side='right', padx=5)
+
         # Treeview for displaying customers
         tree_frame = ttk.Frame(customers_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('ID', 'Name', 'Phone', 'DOB', 'Gender', 'Insurance', 'Address ID')
-        self.customer_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.customer_tree.heading(col, text=col)
-            self.customer_tree.column(col, width=100, anchor='center')
+        self.customer_tree = ttk.Treeview(tree_frame, columns=CUSTOMERS.headings, show='headings')
+        CUSTOMERS.configure(self.customer_tree)
 
         self.customer_tree.pack(fill='both', expand=True)
         self.customer_tree.bind('<<TreeviewSelect>>', self.on_customer_select)
@@ -146,7 +298,30 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.customer_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.customer_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.customer_sorter = TreeSorter(self.customer_tree, self.execute_db_operation, CUSTOMERS.query(), CUSTOMERS.format_rows)
+        self.customer_sorter.attach_scrollbar(scrollbar)
+
+        # Purchase history of the selected customer: sale line items and prescriptions, newest first
+        history_frame = ttk.LabelFrame(customers_frame, text="Purchase History", padding=10)
+        history_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        history_btn_frame = ttk.Frame(history_frame)
+        history_btn_frame.pack(fill='x')
+        self.history_status = ttk.Label(history_btn_frame, text="Select a customer to see their history.")
+        self.history_status.pack(side='left', padx=5)
+        self.history_more_btn = ttk.Button(history_btn_frame, text="Load More",
+                                           command=self.load_more_history, state='disabled')
+        self.history_more_btn.pack(side='right', padx=5)
+
+        self.history_tree = ttk.Treeview(history_frame, columns=HISTORY.headings, show='headings', height=8)
+        HISTORY.configure(self.history_tree)
+        self.history_tree.pack(side='left', fill='both', expand=True)
+        history_scrollbar = ttk.Scrollbar(history_frame, orient='vertical', command=self.history_tree.yview)
+        history_scrollbar.pack(side='right', fill='y')
+        self.history_tree.configure(yscrollcommand=history_scrollbar.set)
+        self.customer_history = CustomerHistory(self.execute_db_operation)
+        self.history_cust_id = None
 
         # Load initial data
         self.load_customers()
@@ -166,19 +341,39 @@ class PharmacyManagementSystem:
             self.insurance.set(values[5])
             self.address_id.delete(0, tk.END)
             self.address_id.insert(0, values[6])
+            self.show_customer_history(values[0])
 
     def load_customers(self):
-        query = """
-        SELECT cust_id, cust_name, cust_phone, date_birth, 
-               gender, insurance, address_id
-        FROM Customer
-        """
-        customers = self.execute_db_operation(query)
-        self.customer_tree.delete(*self.customer_tree.get_children())
-        if customers:
-            for customer in customers:
-                cust_date = customer.date_birth.strftime('%Y-%m-%d') if isinstance(customer.date_birth, datetime) else customer.date_birth
-                self.customer_tree.insert('', 'end', values=(customer.cust_id, customer.cust_name, customer.cust_phone, cust_date, customer.gender, customer.insurance, customer.address_id))
+        self.customer_sorter.reload()
+
+    def show_customer_history(self, cust_id):
+        self.history_cust_id = cust_id
+        self.history_tree.delete(*self.history_tree.get_children())
+        rows = self.customer_history.rows(cust_id)
+        for values in HISTORY.format_rows(rows):
+            self.history_tree.insert('', 'end', values=values)
+        self.update_history_status()
+
+    def load_more_history(self):
+        if self.history_cust_id is None:
+            return
+        for values in HISTORY.format_rows(self.customer_history.load_more(self.history_cust_id)):
+            self.history_tree.insert('', 'end', values=values)
+        self.update_history_status()
+
+    def update_history_status(self):
+        shown = len(self.history_tree.get_children())
+        more = self.customer_history.has_more(self.history_cust_id)
+        self.history_status.config(text=f"Customer {self.history_cust_id}: {shown} entries" + (" (more available)" if more else ""))
+        self.history_more_btn.config(state='normal' if more else 'disabled')
+
+    def search_customers(self):
+        self.show_search_results(self.customer_sorter, 'cust_id', ('cust_name', 'cust_phone'),
+                                 self.customer_search.get())
+
+    def clear_customer_search(self):
+        self.customer_search.delete(0, tk.END)
+        self.load_customers()
 
     def add_customer(self):
         try:
@@ -197,6 +392,7 @@ class PharmacyManagementSystem:
             query = """
             INSERT INTO Customer (cust_id, cust_name, cust_phone, date_birth, 
                                   gender, insurance, address_id)
+            {output}
             VALUES (?, ?, ?, ?, ?, ?, ?)
             """
             params = (
@@ -208,7 +404,10 @@ class PharmacyManagementSystem:
                 insurance,
                 address_id
             )
-            self.execute_db_operation(query, params)
+            if not self.execute_db_operation(query, params, audit=('INSERT', 'Customer', cust_id)):
+                return
+            self.index_search_text('cust_name', cust_id, cust_name)
+            self.index_search_text('cust_phone', cust_id, cust_phone)
             self.load_customers()
             messagebox.showinfo("Success", "Customer added successfully!")
             self.clear_customer_form()
@@ -242,6 +441,7 @@ class PharmacyManagementSystem:
             UPDATE Customer
             SET cust_name = ?, cust_phone = ?, date_birth = ?, 
                 gender = ?, insurance = ?, address_id = ?
+            {output}
             WHERE cust_id = ?
             """
             params = (
@@ -253,7 +453,14 @@ class PharmacyManagementSystem:
                 address_id,
                 cust_id
             )
-            self.execute_db_operation(query, params)
+            changed = self.execute_db_operation(query, params, audit=('UPDATE', 'Customer', cust_id))
+            if changed is None:
+                return
+            if not changed:
+                messagebox.showerror("Error", "Customer ID not found.")
+                return
+            self.index_search_text('cust_name', cust_id, cust_name)
+            self.index_search_text('cust_phone', cust_id, cust_phone)
             self.load_customers()
             messagebox.showinfo("Success", "Customer updated successfully!")
             self.clear_customer_form()
@@ -329,11 +536,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(employees_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('ID', 'Title', 'Name', 'Phone', 'DOB', 'Gender', 'Hire Date', 'Salary', 'Address ID')
-        self.employee_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.employee_tree.heading(col, text=col)
-            self.employee_tree.column(col, width=100, anchor='center')
+        self.employee_tree = ttk.Treeview(tree_frame, columns=EMPLOYEES.headings, show='headings')
+        EMPLOYEES.configure(self.employee_tree)
 
         self.employee_tree.pack(fill='both', expand=True)
         self.employee_tree.bind('<<TreeviewSelect>>', self.on_employee_select)
@@ -342,7 +546,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.employee_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.employee_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.employee_sorter = TreeSorter(self.employee_tree, self.execute_db_operation, EMPLOYEES.query(), EMPLOYEES.format_rows)
+        self.employee_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_employees()
@@ -368,18 +574,7 @@ class PharmacyManagementSystem:
             self.emp_address_id.insert(0, values[8])
 
     def load_employees(self):
-        query = """
-        SELECT emp_id, title, emp_name, emp_phone, date_birth, 
-               gender, hire_date, salary, address_id
-        FROM Employee
-        """
-        employees = self.execute_db_operation(query)
-        self.employee_tree.delete(*self.employee_tree.get_children())
-        if employees:
-            for employee in employees:
-                emp_dob = employee.date_birth.strftime('%Y-%m-%d') if isinstance(employee.date_birth, datetime) else employee.date_birth
-                hire_date = employee.hire_date.strftime('%Y-%m-%d') if isinstance(employee.hire_date, datetime) else employee.hire_date
-                self.employee_tree.insert('', 'end', values=(employee.emp_id, employee.title, employee.emp_name, employee.emp_phone, emp_dob, employee.gender, hire_date, f"{employee.salary:.2f}", employee.address_id))
+        self.employee_sorter.reload()
 
     def add_employee(self):
         try:
@@ -404,6 +599,7 @@ class PharmacyManagementSystem:
             query = """
             INSERT INTO Employee (emp_id, title, emp_name, emp_phone, date_birth,
                                   gender, hire_date, salary, address_id)
+            {output}
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
             params = (
@@ -417,7 +613,7 @@ class PharmacyManagementSystem:
                 float(salary),
                 address_id
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('INSERT', 'Employee', emp_id))
             self.load_employees()
             messagebox.showinfo("Success", "Employee added successfully!")
             self.clear_employee_form()
@@ -457,6 +653,7 @@ class PharmacyManagementSystem:
             UPDATE Employee
             SET title = ?, emp_name = ?, emp_phone = ?, date_birth = ?, 
                 gender = ?, hire_date = ?, salary = ?, address_id = ?
+            {output}
             WHERE emp_id = ?
             """
             params = (
@@ -470,7 +667,7 @@ class PharmacyManagementSystem:
                 address_id,
                 emp_id
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('UPDATE', 'Employee', emp_id))
             self.load_employees()
             messagebox.showinfo("Success", "Employee updated successfully!")
             self.clear_employee_form()
@@ -531,15 +728,22 @@ class PharmacyManagementSystem:
         ttk.Button(btn_frame, text="Update Medication",
                    command=self.update_medication).pack(side='left', padx=5)
 
+        # Search by name, tolerant of misspellings
+        ttk.Button(btn_frame, text="Clear",
+                   command=self.clear_medication_search).pack(side='right', padx=5)
+        ttk.Button(btn_frame, text="Search",
+                   command=self.search_medications).pack(side='right', padx=5)
+        self.medication_search = ttk.Entry(btn_frame, width=30)
+        self.medication_search.pack(side='right', padx=5)
+        self.medication_search.bind('<Return>', lambda event: self.search_medications())
+        ttk.Label(btn_frame, text="Search name:").pack(side='right', padx=5)
+
         # Treeview
         tree_frame = ttk.Frame(medications_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('ID', 'Name', 'Manufacturer', 'Price', 'Quantity')
-        self.medication_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.medication_tree.heading(col, text=col)
-            self.medication_tree.column(col, width=100, anchor='center')
+        self.medication_tree = ttk.Treeview(tree_frame, columns=MEDICATIONS.headings, show='headings')
+        MEDICATIONS.configure(self.medication_tree)
 
         self.medication_tree.pack(fill='both', expand=True)
         self.medication_tree.bind('<<TreeviewSelect>>', self.on_medication_select)
@@ -548,7 +752,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.medication_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.medication_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.medication_sorter = TreeSorter(self.medication_tree, self.execute_db_operation, MEDICATIONS.query(), MEDICATIONS.format_rows)
+        self.medication_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_medications()
@@ -569,15 +775,14 @@ class PharmacyManagementSystem:
             self.med_quantity.insert(0, values[4])
 
     def load_medications(self):
-        query = """
-        SELECT med_id, med_name, manufacture, price, med_quantity
-        FROM Medication
-        """
-        medications = self.execute_db_operation(query)
-        self.medication_tree.delete(*self.medication_tree.get_children())
-        if medications:
-            for med in medications:
-                self.medication_tree.insert('', 'end', values=(med.med_id, med.med_name, med.manufacture, f"{med.price:.2f}", med.med_quantity))
+        self.medication_sorter.reload()
+
+    def search_medications(self):
+        self.show_search_results(self.medication_sorter, 'med_id', ('med_name',), self.medication_search.get())
+
+    def clear_medication_search(self):
+        self.medication_search.delete(0, tk.END)
+        self.load_medications()
 
     def add_medication(self):
         try:
@@ -597,6 +802,7 @@ class PharmacyManagementSystem:
 
             query = """
             INSERT INTO Medication (med_id, med_name, manufacture, price, med_quantity)
+            {output}
             VALUES (?, ?, ?, ?, ?)
             """
             params = (
@@ -606,7 +812,9 @@ class PharmacyManagementSystem:
                 float(price),
                 int(quantity)
             )
-            self.execute_db_operation(query, params)
+            if not self.execute_db_operation(query, params, audit=('INSERT', 'Medication', med_id)):
+                return
+            self.index_search_text('med_name', med_id, med_name)
             self.load_medications()
             messagebox.showinfo("Success", "Medication added successfully!")
             self.clear_medication_form()
@@ -637,6 +845,7 @@ class PharmacyManagementSystem:
             query = """
             UPDATE Medication
             SET med_name = ?, manufacture = ?, price = ?, med_quantity = ?
+            {output}
             WHERE med_id = ?
             """
             params = (
@@ -646,8 +855,15 @@ class PharmacyManagementSystem:
                 int(quantity),
                 med_id
             )
-            self.execute_db_operation(query, params)
+            changed = self.execute_db_operation(query, params, audit=('UPDATE', 'Medication', med_id))
+            if changed is None:
+                return
+            if not changed:
+                messagebox.showerror("Error", "Medication ID not found.")
+                return
+            self.index_search_text('med_name', med_id, med_name)
             self.load_medications()
+            self.medication_cache.invalidate(med_id)
             messagebox.showinfo("Success", "Medication updated successfully!")
             self.clear_medication_form()
             logging.info(f"Updated medication: {med_id}")
@@ -736,6 +952,20 @@ class PharmacyManagementSystem:
                                           command=self.sales_details_tree.yview)
         scrollbar_details.grid(row=1, column=5, sticky='ns')
         self.sales_details_tree.configure(yscrollcommand=scrollbar_details.set)
+        self.sales_details_sorter = TreeSorter(self.sales_details_tree)
+
+        # Scanner mode: each scanned code arrives as keystrokes followed by Enter
+        ttk.Label(details_frame, text="Scan:").grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        self.scan_entry = ttk.Entry(details_frame, state='disabled')
+        self.scan_entry.grid(row=2, column=1, padx=5, pady=5, sticky='w')
+        self.scan_entry.bind('<Return>', self.on_scan)
+        self.scanner_mode = tk.BooleanVar(value=False)
+        ttk.Checkbutton(details_frame, text="Scanner Mode", variable=self.scanner_mode,
+                        command=self.toggle_scanner_mode).grid(row=2, column=2, padx=5, pady=5, sticky='w')
+        self.scan_status = ttk.Label(details_frame, text="")
+        self.scan_status.grid(row=2, column=3, columnspan=2, padx=5, pady=5, sticky='w')
+        self.medication_cache = MedicationCache(self.fetch_medications)
+        self.scan_validator = None
 
         # Sale Total Label
         self.sale_total_label = ttk.Label(sales_frame, text="Total: $0.00", font=('Arial', 12))
@@ -756,12 +986,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(sales_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns_sales = ('ID', 'Customer', 'Employee', 'Type',
-                         'Payment', 'Date', 'Total')
-        self.sales_tree = ttk.Treeview(tree_frame, columns=columns_sales, show='headings')
-        for col in columns_sales:
-            self.sales_tree.heading(col, text=col)
-            self.sales_tree.column(col, width=100, anchor='center')
+        self.sales_tree = ttk.Treeview(tree_frame, columns=SALES.headings, show='headings')
+        SALES.configure(self.sales_tree)
 
         self.sales_tree.pack(fill='both', expand=True)
         self.sales_tree.bind('<<TreeviewSelect>>', self.on_sale_select)
@@ -770,7 +996,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.sales_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.sales_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.sales_sorter = TreeSorter(self.sales_tree, self.execute_db_operation, SALES.query(), SALES.format_rows)
+        self.sales_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_sales()
@@ -805,11 +1033,88 @@ class PharmacyManagementSystem:
             return
         total_price = float(unit_price) * quantity
         self.sales_details_tree.insert('', 'end', values=(med_id, med_name, f"{unit_price:.2f}", quantity, f"{total_price:.2f}"))
+        self.sales_details_sorter.invalidate()
         self.current_sale_total += total_price
         self.sale_total_label.config(text=f"Total: ${self.current_sale_total:.2f}")
         self.sale_med_id.delete(0, tk.END)
         self.sale_quantity.delete(0, tk.END)
 
+    def toggle_scanner_mode(self):
+        if self.scanner_mode.get():
+            self.scan_validator = ScanValidator(self.medication_cache)
+            self.scan_entry.config(state='normal')
+            self.scan_entry.focus_set()
+            self.scan_status.config(text="Ready to scan")
+            self.scan_after_id = self.root.after(50, self.apply_scans)
+            logging.info("Scanner mode enabled.")
+        else:
+            self.root.after_cancel(self.scan_after_id)
+            self.scan_validator.stop()
+            self.scan_validator = None
+            self.scan_entry.delete(0, tk.END)
+            self.scan_entry.config(state='disabled')
+            self.scan_status.config(text="")
+            logging.info("Scanner mode disabled.")
+
+    def on_scan(self, event):
+        code = self.scan_entry.get().strip()
+        self.scan_entry.delete(0, tk.END)
+        if code and self.scan_validator:
+            self.scan_validator.submit(code)
+
+    def apply_scans(self):
+        for med_id, count, entry, error in self.scan_validator.drain():
+            if error:
+                self.scan_status.config(text=f"Lookup failed for {med_id}")
+                continue
+            if entry is None:
+                self.scan_status.config(text=f"Unknown code {med_id}")
+                logging.warning(f"Scanned unknown medication ID: {med_id}")
+                continue
+            med_name, unit_price, available_qty = entry
+            item = self.find_cart_item(med_id)
+            quantity = count + (int(self.sales_details_tree.item(item, 'values')[3]) if item else 0)
+            if quantity > available_qty:
+                self.scan_status.config(text=f"Only {available_qty} units of {med_name} available")
+                continue
+            total_price = unit_price * quantity
+            values = (med_id, med_name, f"{unit_price:.2f}", quantity, f"{total_price:.2f}")
+            if item:
+                self.sales_details_tree.item(item, values=values)
+            else:
+                self.sales_details_tree.insert('', 'end', values=values)
+                self.sales_details_sorter.invalidate()
+            self.current_sale_total += unit_price * count
+            self.sale_total_label.config(text=f"Total: ${self.current_sale_total:.2f}")
+            self.scan_status.config(text=f"{med_name} x{quantity}")
+        self.scan_after_id = self.root.after(50, self.apply_scans)
+
+    def find_cart_item(self, med_id):
+        for child in self.sales_details_tree.get_children():
+            if self.sales_details_tree.item(child, 'values')[0] == med_id:
+                return child
+        return None
+
+    def fetch_medications(self, med_ids):
+        # Runs on the scanner thread, so it reports errors by raising instead of via messagebox.
+        # med_id is an INT column: a code that can't convert would fail the whole IN (...)
+        # with a conversion error, so such codes are left out and come back as unknown.
+        med_ids = [med_id for med_id in med_ids if med_id.isdigit() and int(med_id) <= MAX_MED_ID]
+        if not med_ids:
+            return []
+        placeholders = ', '.join('?' for _ in med_ids)
+        query = f"SELECT med_id, med_name, price, med_quantity FROM Medication WHERE med_id IN ({placeholders})"
+        with pyodbc.connect(self.conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, med_ids)
+            return cursor.fetchall()
+
+    def execute_audited(self, cursor, query, params, audit):
+        # One audited statement inside the caller's transaction; returns (audit, before, after)
+        # images to record once the transaction commits
+        cursor.execute(output_into(audit[0], audit[1], query), params)
+        return [(audit, before, after) for before, after in output_images(audit[0], cursor)]
+
     def complete_sale(self):
         sale_id = self.sale_id.get().strip()
         cust_id = self.sale_cust_id.get().strip()
@@ -825,60 +1130,108 @@ class PharmacyManagementSystem:
             messagebox.showerror("Error", "No sale items added.")
             return
 
+        # The whole sale is one transaction. Stock was checked when items were added, but
+        # other tills sell from the same stock, so each line's decrement only applies while
+        # enough stock is left; if any line comes up short nothing is written.
+        images = []
+        short = []
         try:
-            # Insert into Sales table
-            query_sales = """
-            INSERT INTO Sales (sale_id, cust_id, emp_id, sale_type, payment_method, sale_date, sale_total)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """
-            params_sales = (
-                sale_id,
-                cust_id,
-                emp_id,
-                sale_type,
-                payment_method,
-                sale_date,
-                self.current_sale_total
-            )
-            self.execute_db_operation(query_sales, params_sales)
-
-            # Insert into Sales_Details table and update Medication quantity
-            for child in self.sales_details_tree.get_children():
-                med_id, _, unit_price, quantity, total = self.sales_details_tree.item(child, 'values')
-                query_details = """
-                INSERT INTO Sales_Details (sale_id, med_id, unit_price, sell_quantity, total)
-                VALUES (?, ?, ?, ?, ?)
-                """
-                params_details = (
-                    sale_id,
-                    med_id,
-                    float(unit_price),
-                    int(quantity),
-                    float(total)
-                )
-                self.execute_db_operation(query_details, params_details)
-
-                # Update Medication quantity
-                query_update = """
-                UPDATE Medication
-                SET med_quantity = med_quantity - ?
-                WHERE med_id = ?
-                """
-                self.execute_db_operation(query_update, (int(quantity), med_id))
-
-            self.load_sales()
-            self.sales_details_tree.delete(*self.sales_details_tree.get_children())
-            self.sale_total_label.config(text="Total: $0.00")
-            self.current_sale_total = 0.0
-            messagebox.showinfo("Success", "Sale completed successfully!")
-            self.clear_sale_form()
-            logging.info(f"Completed sale: {sale_id}")
+            with pyodbc.connect(self.conn_str) as conn:
+                cursor = conn.cursor()
+                try:
+                    # Insert into Sales table
+                    query_sales = """
+                    INSERT INTO Sales (sale_id, cust_id, emp_id, sale_type, payment_method, sale_date, sale_total)
+                    {output}
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """
+                    params_sales = (
+                        sale_id,
+                        cust_id,
+                        emp_id,
+                        sale_type,
+                        payment_method,
+                        sale_date,
+                        self.current_sale_total
+                    )
+                    images += self.execute_audited(cursor, query_sales, params_sales, ('INSERT', 'Sales', sale_id))
+
+                    # Insert into Sales_Details table and update Medication quantity
+                    for child in self.sales_details_tree.get_children():
+                        med_id, med_name, unit_price, quantity, total = self.sales_details_tree.item(child, 'values')
+                        query_details = """
+                        INSERT INTO Sales_Details (sale_id, med_id, unit_price, sell_quantity, total)
+                        {output}
+                        VALUES (?, ?, ?, ?, ?)
+                        """
+                        params_details = (
+                            sale_id,
+                            med_id,
+                            float(unit_price),
+                            int(quantity),
+                            float(total)
+                        )
+                        images += self.execute_audited(cursor, query_details, params_details,
+                                                       ('INSERT', 'Sales_Details', f"{sale_id}/{med_id}"))
+
+                        # Update Medication quantity, unless another sale took the stock first
+                        query_update = """
+                        UPDATE Medication
+                        SET med_quantity = med_quantity - ?
+                        {output}
+                        WHERE med_id = ? AND med_quantity >= ?
+                        """
+                        updated = self.execute_audited(cursor, query_update, (int(quantity), med_id, int(quantity)),
+                                                       ('UPDATE', 'Medication', med_id))
+                        if not updated:
+                            short.append((med_id, med_name, int(quantity)))
+                        images += updated
+                    if short:
+                        conn.rollback()
+                    else:
+                        conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
         except pyodbc.IntegrityError as e:
             messagebox.showerror("Error", f"Database Integrity Error: {str(e)}")
             logging.error(f"IntegrityError while completing sale: {e}")
+            return
         except Exception as e:
             messagebox.showerror("Error", f"Error completing sale: {str(e)}")
             logging.error(f"Error completing sale: {e}")
+            return
+
+        if short:
+            self.report_short_stock(short)
+            return
+        for (action, entity, entity_id), before, after in images:
+            self.audit_log.record(action, entity, entity_id, before, after)
+        for child in self.sales_details_tree.get_children():
+            self.medication_cache.invalidate(self.sales_details_tree.item(child, 'values')[0])
+        self.load_sales()
+        self.customer_history.invalidate(cust_id)
+        self.sales_details_tree.delete(*self.sales_details_tree.get_children())
+        self.sale_total_label.config(text="Total: $0.00")
+        self.current_sale_total = 0.0
+        messagebox.showinfo("Success", "Sale completed successfully!")
+        self.clear_sale_form()
+        logging.info(f"Completed sale: {sale_id}")
+
+    def report_short_stock(self, short):
+        # short: (med_id, med_name, quantity) cart lines whose stock ran out before the sale
+        try:
+            available = {str(med_id).strip(): int(quantity)
+                         for med_id, _, _, quantity in self.fetch_medications([line[0] for line in short])}
+        except pyodbc.Error as e:
+            logging.error(f"Reading stock after a short sale failed: {e}")
+            available = {}
+        lines = []
+        for med_id, med_name, quantity in short:
+            self.medication_cache.invalidate(med_id)
+            lines.append(f"{med_name}: {available.get(med_id, 0)} available, {quantity} in cart")
+        messagebox.showerror("Error", "Sale not completed, not enough stock:\n" + "\n".join(lines))
+        logging.warning(f"Sale not completed, insufficient stock: {'; '.join(lines)}")
 
     def cancel_sale(self):
         if messagebox.askyesno("Confirm", "Are you sure you want to cancel this sale?"):
@@ -908,19 +1261,22 @@ class PharmacyManagementSystem:
                         query_restore = """
                         UPDATE Medication
                         SET med_quantity = med_quantity + ?
+                        {output}
                         WHERE med_id = ?
                         """
-                        self.execute_db_operation(query_restore, (int(quantity), med_id))
+                        self.execute_db_operation(query_restore, (int(quantity), med_id), audit=('UPDATE', 'Medication', med_id))
+                        self.medication_cache.invalidate(med_id)
 
                 # Delete from Sales_Details
-                query_details = "DELETE FROM Sales_Details WHERE sale_id = ?"
-                self.execute_db_operation(query_details, (sale_id,))
+                query_details = "DELETE FROM Sales_Details {output} WHERE sale_id = ?"
+                self.execute_db_operation(query_details, (sale_id,), audit=('DELETE', 'Sales_Details', sale_id))
 
                 # Delete from Sales
-                query_sales = "DELETE FROM Sales WHERE sale_id = ?"
-                self.execute_db_operation(query_sales, (sale_id,))
+                query_sales = "DELETE FROM Sales {output} WHERE sale_id = ?"
+                self.execute_db_operation(query_sales, (sale_id,), audit=('DELETE', 'Sales', sale_id))
 
                 self.load_sales()
+                self.customer_history.invalidate()
                 messagebox.showinfo("Success", "Sale deleted successfully!")
                 self.clear_sale_form()
                 logging.info(f"Deleted sale: {sale_id}")
@@ -937,16 +1293,7 @@ class PharmacyManagementSystem:
         self.sale_date.set_date(datetime.today())
 
     def load_sales(self):
-        query = """
-        SELECT sale_id, cust_id, emp_id, sale_type, payment_method, sale_date, sale_total
-        FROM Sales
-        """
-        sales = self.execute_db_operation(query)
-        self.sales_tree.delete(*self.sales_tree.get_children())
-        if sales:
-            for sale in sales:
-                sale_date = sale.sale_date.strftime('%Y-%m-%d') if isinstance(sale.sale_date, datetime) else sale.sale_date
-                self.sales_tree.insert('', 'end', values=(sale.sale_id, sale.cust_id, sale.emp_id, sale.sale_type, sale.payment_method, sale_date, f"{sale.sale_total:.2f}"))
+        self.sales_sorter.reload()
 
     def on_sale_select(self, event):
         selected_item = self.sales_tree.focus()
@@ -1009,11 +1356,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(prescriptions_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('ID', 'Customer', 'Doctor', 'Issue Date')
-        self.prescription_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.prescription_tree.heading(col, text=col)
-            self.prescription_tree.column(col, width=150, anchor='center')
+        self.prescription_tree = ttk.Treeview(tree_frame, columns=PRESCRIPTIONS.headings, show='headings')
+        PRESCRIPTIONS.configure(self.prescription_tree)
 
         self.prescription_tree.pack(fill='both', expand=True)
         self.prescription_tree.bind('<<TreeviewSelect>>', self.on_prescription_select)
@@ -1022,7 +1366,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.prescription_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.prescription_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.prescription_sorter = TreeSorter(self.prescription_tree, self.execute_db_operation, PRESCRIPTIONS.query(), PRESCRIPTIONS.format_rows)
+        self.prescription_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_prescriptions()
@@ -1040,16 +1386,7 @@ class PharmacyManagementSystem:
             self.presc_issue_date.set_date(values[3])
 
     def load_prescriptions(self):
-        query = """
-        SELECT p_id, cust_id, doctor, p_issue_date
-        FROM Prescription
-        """
-        prescriptions = self.execute_db_operation(query)
-        self.prescription_tree.delete(*self.prescription_tree.get_children())
-        if prescriptions:
-            for presc in prescriptions:
-                issue_date = presc.p_issue_date.strftime('%Y-%m-%d') if isinstance(presc.p_issue_date, datetime) else presc.p_issue_date
-                self.prescription_tree.insert('', 'end', values=(presc.p_id, presc.cust_id, presc.doctor, issue_date))
+        self.prescription_sorter.reload()
 
     def add_prescription(self):
         try:
@@ -1064,6 +1401,7 @@ class PharmacyManagementSystem:
 
             query = """
             INSERT INTO Prescription (p_id, cust_id, doctor, p_issue_date)
+            {output}
             VALUES (?, ?, ?, ?)
             """
             params = (
@@ -1072,8 +1410,9 @@ class PharmacyManagementSystem:
                 doctor,
                 issue_date
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('INSERT', 'Prescription', presc_id))
             self.load_prescriptions()
+            self.customer_history.invalidate(cust_id)
             messagebox.showinfo("Success", "Prescription added successfully!")
             self.clear_prescription_form()
             logging.info(f"Added prescription: {presc_id}")
@@ -1098,6 +1437,7 @@ class PharmacyManagementSystem:
             query = """
             UPDATE Prescription
             SET cust_id = ?, doctor = ?, p_issue_date = ?
+            {output}
             WHERE p_id = ?
             """
             params = (
@@ -1106,8 +1446,9 @@ class PharmacyManagementSystem:
                 issue_date,
                 presc_id
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('UPDATE', 'Prescription', presc_id))
             self.load_prescriptions()
+            self.customer_history.invalidate()
             messagebox.showinfo("Success", "Prescription updated successfully!")
             self.clear_prescription_form()
             logging.info(f"Updated prescription: {presc_id}")
@@ -1168,11 +1509,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(stock_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('Medication ID', 'Order ID', 'Quantity', 'Production Date', 'Expire Date', 'Total Price')
-        self.stock_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.stock_tree.heading(col, text=col)
-            self.stock_tree.column(col, width=120, anchor='center')
+        self.stock_tree = ttk.Treeview(tree_frame, columns=STOCK.headings, show='headings')
+        STOCK.configure(self.stock_tree)
 
         self.stock_tree.pack(fill='both', expand=True)
         self.stock_tree.bind('<<TreeviewSelect>>', self.on_stock_select)
@@ -1181,7 +1519,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.stock_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.stock_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.stock_sorter = TreeSorter(self.stock_tree, self.execute_db_operation, STOCK.query(), STOCK.format_rows)
+        self.stock_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_stock()
@@ -1202,17 +1542,7 @@ class PharmacyManagementSystem:
             self.total_price.insert(0, values[5])
 
     def load_stock(self):
-        query = """
-        SELECT med_id, order_id, s_quantity, production_date, expire_date, total_price
-        FROM Stock
-        """
-        stock = self.execute_db_operation(query)
-        self.stock_tree.delete(*self.stock_tree.get_children())
-        if stock:
-            for item in stock:
-                prod_date = item.production_date.strftime('%Y-%m-%d') if isinstance(item.production_date, datetime) else item.production_date
-                exp_date = item.expire_date.strftime('%Y-%m-%d') if isinstance(item.expire_date, datetime) else item.expire_date
-                self.stock_tree.insert('', 'end', values=(item.med_id, item.order_id, item.s_quantity, prod_date, exp_date, f"{item.total_price:.2f}"))
+        self.stock_sorter.reload()
 
     def add_stock(self):
         try:
@@ -1233,6 +1563,7 @@ class PharmacyManagementSystem:
 
             query = """
             INSERT INTO Stock (med_id, order_id, s_quantity, production_date, expire_date, total_price)
+            {output}
             VALUES (?, ?, ?, ?, ?, ?)
             """
             params = (
@@ -1243,7 +1574,7 @@ class PharmacyManagementSystem:
                 expire_date,
                 float(total_price)
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('INSERT', 'Stock', f"{med_id}/{order_id}"))
             self.load_stock()
             messagebox.showinfo("Success", "Stock added successfully!")
             self.clear_stock_form()
@@ -1275,6 +1606,7 @@ class PharmacyManagementSystem:
             query = """
             UPDATE Stock
             SET s_quantity = ?, production_date = ?, expire_date = ?, total_price = ?
+            {output}
             WHERE med_id = ? AND order_id = ?
             """
             params = (
@@ -1285,7 +1617,7 @@ class PharmacyManagementSystem:
                 med_id,
                 order_id
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('UPDATE', 'Stock', f"{med_id}/{order_id}"))
             self.load_stock()
             messagebox.showinfo("Success", "Stock updated successfully!")
             self.clear_stock_form()
@@ -1340,11 +1672,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(suppliers_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('ID', 'Name', 'Contact', 'Address', 'Company Name')
-        self.suppliers_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.suppliers_tree.heading(col, text=col)
-            self.suppliers_tree.column(col, width=120, anchor='center')
+        self.suppliers_tree = ttk.Treeview(tree_frame, columns=SUPPLIERS.headings, show='headings')
+        SUPPLIERS.configure(self.suppliers_tree)
 
         self.suppliers_tree.pack(fill='both', expand=True)
         self.suppliers_tree.bind('<<TreeviewSelect>>', self.on_supplier_select)
@@ -1353,7 +1682,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.suppliers_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.suppliers_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.supplier_sorter = TreeSorter(self.suppliers_tree, self.execute_db_operation, SUPPLIERS.query(), SUPPLIERS.format_rows)
+        self.supplier_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_suppliers()
@@ -1374,15 +1705,7 @@ class PharmacyManagementSystem:
             self.sup_company.insert(0, values[4])
 
     def load_suppliers(self):
-        query = """
-        SELECT supplier_id, contact_name, address_id, contact_phone, company_name
-        FROM Supplier
-        """
-        suppliers = self.execute_db_operation(query)
-        self.suppliers_tree.delete(*self.suppliers_tree.get_children())
-        if suppliers:
-            for sup in suppliers:
-                self.suppliers_tree.insert('', 'end', values=(sup.supplier_id, sup.contact_name, sup.address_id, sup.contact_phone, sup.company_name))
+        self.supplier_sorter.reload()
 
     def add_supplier(self):
         try:
@@ -1398,6 +1721,7 @@ class PharmacyManagementSystem:
 
             query = """
             INSERT INTO Supplier (supplier_id, contact_name, address_id, contact_phone, company_name)
+            {output}
             VALUES (?, ?, ?, ?, ?)
             """
             params = (
@@ -1407,7 +1731,7 @@ class PharmacyManagementSystem:
                 sup_contact,
                 sup_company
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('INSERT', 'Supplier', sup_id))
             self.load_suppliers()
             messagebox.showinfo("Success", "Supplier added successfully!")
             self.clear_supplier_form()
@@ -1434,6 +1758,7 @@ class PharmacyManagementSystem:
             query = """
             UPDATE Supplier
             SET contact_name = ?, contact_phone = ?, address_id = ?, company_name = ?
+            {output}
             WHERE supplier_id = ?
             """
             params = (
@@ -1443,7 +1768,7 @@ class PharmacyManagementSystem:
                 sup_company,
                 sup_id
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('UPDATE', 'Supplier', sup_id))
             self.load_suppliers()
             messagebox.showinfo("Success", "Supplier updated successfully!")
             self.clear_supplier_form()
@@ -1497,11 +1822,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(address_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('ID', 'Street Name', 'City', 'Area', 'Building Name')
-        self.address_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.address_tree.heading(col, text=col)
-            self.address_tree.column(col, width=120, anchor='center')
+        self.address_tree = ttk.Treeview(tree_frame, columns=ADDRESSES.headings, show='headings')
+        ADDRESSES.configure(self.address_tree)
 
         self.address_tree.pack(fill='both', expand=True)
         self.address_tree.bind('<<TreeviewSelect>>', self.on_address_select)
@@ -1510,7 +1832,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.address_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.address_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.address_sorter = TreeSorter(self.address_tree, self.execute_db_operation, ADDRESSES.query(), ADDRESSES.format_rows)
+        self.address_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_addresses()
@@ -1531,15 +1855,7 @@ class PharmacyManagementSystem:
             self.building_name.insert(0, values[4])
 
     def load_addresses(self):
-        query = """
-        SELECT address_id, Street_name, City, Area, Building_name
-        FROM Address
-        """
-        addresses = self.execute_db_operation(query)
-        self.address_tree.delete(*self.address_tree.get_children())
-        if addresses:
-            for addr in addresses:
-                self.address_tree.insert('', 'end', values=(addr.address_id, addr.Street_name, addr.City, addr.Area, addr.Building_name))
+        self.address_sorter.reload()
 
     def add_address(self):
         try:
@@ -1555,6 +1871,7 @@ class PharmacyManagementSystem:
 
             query = """
             INSERT INTO Address (address_id, Street_name, City, Area, Building_name)
+            {output}
             VALUES (?, ?, ?, ?, ?)
             """
             params = (
@@ -1564,7 +1881,7 @@ class PharmacyManagementSystem:
                 area,
                 building_name
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('INSERT', 'Address', addr_id))
             self.load_addresses()
             messagebox.showinfo("Success", "Address added successfully!")
             self.clear_address_form()
@@ -1591,6 +1908,7 @@ class PharmacyManagementSystem:
             query = """
             UPDATE Address
             SET Street_name = ?, City = ?, Area = ?, Building_name = ?
+            {output}
             WHERE address_id = ?
             """
             params = (
@@ -1600,7 +1918,7 @@ class PharmacyManagementSystem:
                 building_name,
                 addr_id
             )
-            self.execute_db_operation(query, params)
+            self.execute_db_operation(query, params, audit=('UPDATE', 'Address', addr_id))
             self.load_addresses()
             messagebox.showinfo("Success", "Address updated successfully!")
             self.clear_address_form()
@@ -1646,12 +1964,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(orders_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('Statement ID', 'Supplier ID', 'Year', 'Month',
-                   'Status', 'Issue Date', 'Total')
-        self.orders_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.orders_tree.heading(col, text=col)
-            self.orders_tree.column(col, width=120, anchor='center')
+        self.orders_tree = ttk.Treeview(tree_frame, columns=ORDER_STATEMENTS.headings, show='headings')
+        ORDER_STATEMENTS.configure(self.orders_tree)
 
         self.orders_tree.pack(fill='both', expand=True)
         self.orders_tree.bind('<<TreeviewSelect>>', self.on_order_select)
@@ -1660,7 +1974,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.orders_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.orders_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.orders_sorter = TreeSorter(self.orders_tree, self.report_fetch, ORDER_STATEMENTS.query(self.report_dialect), ORDER_STATEMENTS.format_rows)
+        self.orders_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_monthly_orders()
@@ -1679,31 +1995,11 @@ class PharmacyManagementSystem:
             messagebox.showerror("Error", "Invalid month or year.")
             return
 
-        query = """
-        SELECT O_statement_id, supplier_id, O_year, O_month, O_status, O_issue_date, O_statement_total
-        FROM Order_monthly_statement
-        WHERE O_month = ? AND O_year = ?
-        """
-        orders = self.execute_db_operation(query, (month_number, year))
-        self.orders_tree.delete(*self.orders_tree.get_children())
-        if orders:
-            for order in orders:
-                issue_date = order.O_issue_date.strftime('%Y-%m-%d') if isinstance(order.O_issue_date, datetime) else order.O_issue_date
-                self.orders_tree.insert('', 'end', values=(order.O_statement_id, order.supplier_id, order.O_year, order.O_month, order.O_status, issue_date, f"{order.O_statement_total:.2f}"))
-        else:
+        if not self.orders_sorter.reload("O_month = ? AND O_year = ?", (month_number, year)):
             messagebox.showinfo("Info", "No orders found for the selected month and year.")
 
     def load_monthly_orders(self):
-        query = """
-        SELECT O_statement_id, supplier_id, O_year, O_month, O_status, O_issue_date, O_statement_total
-        FROM Order_monthly_statement
-        """
-        orders = self.execute_db_operation(query)
-        self.orders_tree.delete(*self.orders_tree.get_children())
-        if orders:
-            for order in orders:
-                issue_date = order.O_issue_date.strftime('%Y-%m-%d') if isinstance(order.O_issue_date, datetime) else order.O_issue_date
-                self.orders_tree.insert('', 'end', values=(order.O_statement_id, order.supplier_id, order.O_year, order.O_month, order.O_status, issue_date, f"{order.O_statement_total:.2f}"))
+        self.orders_sorter.reload()
 
     def on_order_select(self, event):
         selected_item = self.orders_tree.focus()
@@ -1741,11 +2037,8 @@ class PharmacyManagementSystem:
         tree_frame = ttk.Frame(sales_statement_frame)
         tree_frame.pack(fill='both', expand=True, padx=10, pady=5)
 
-        columns = ('Sale ID', 'Year', 'Month', 'Issue Date', 'Total')
-        self.sales_statement_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
-        for col in columns:
-            self.sales_statement_tree.heading(col, text=col)
-            self.sales_statement_tree.column(col, width=120, anchor='center')
+        self.sales_statement_tree = ttk.Treeview(tree_frame, columns=SALES_STATEMENTS.headings, show='headings')
+        SALES_STATEMENTS.configure(self.sales_statement_tree)
 
         self.sales_statement_tree.pack(fill='both', expand=True)
         self.sales_statement_tree.bind('<<TreeviewSelect>>', self.on_sales_statement_select)
@@ -1754,7 +2047,9 @@ class PharmacyManagementSystem:
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical',
                                    command=self.sales_statement_tree.yview)
         scrollbar.pack(side='right', fill='y')
-        self.sales_statement_tree.configure(yscrollcommand=scrollbar.set)
+        # Sortable headings; rows are fetched a page at a time in the selected order
+        self.sales_statement_sorter = TreeSorter(self.sales_statement_tree, self.report_fetch, SALES_STATEMENTS.query(self.report_dialect), SALES_STATEMENTS.format_rows)
+        self.sales_statement_sorter.attach_scrollbar(scrollbar)
 
         # Load initial data
         self.load_monthly_sales()
@@ -1773,31 +2068,11 @@ class PharmacyManagementSystem:
             messagebox.showerror("Error", "Invalid month or year.")
             return
 
-        query = """
-        SELECT s_id, year, month, issue_date, S_Statement_total
-        FROM sales_monthly_statement
-        WHERE month = ? AND year = ?
-        """
-        sales = self.execute_db_operation(query, (month_number, year))
-        self.sales_statement_tree.delete(*self.sales_statement_tree.get_children())
-        if sales:
-            for sale in sales:
-                issue_date = sale.issue_date.strftime('%Y-%m-%d') if isinstance(sale.issue_date, datetime) else sale.issue_date
-                self.sales_statement_tree.insert('', 'end', values=(sale.s_id, sale.year, sale.month, issue_date, f"{sale.S_Statement_total:.2f}"))
-        else:
+        if not self.sales_statement_sorter.reload("month = ? AND year = ?", (month_number, year)):
             messagebox.showinfo("Info", "No sales found for the selected month and year.")
 
     def load_monthly_sales(self):
-        query = """
-        SELECT s_id, year, month, issue_date, S_Statement_total
-        FROM sales_monthly_statement
-        """
-        sales = self.execute_db_operation(query)
-        self.sales_statement_tree.delete(*self.sales_statement_tree.get_children())
-        if sales:
-            for sale in sales:
-                issue_date = sale.issue_date.strftime('%Y-%m-%d') if isinstance(sale.issue_date, datetime) else sale.issue_date
-                self.sales_statement_tree.insert('', 'end', values=(sale.s_id, sale.year, sale.month, issue_date, f"{sale.S_Statement_total:.2f}"))
+        self.sales_statement_sorter.reload()
 
     def on_sales_statement_select(self, event):
         selected_item = self.sales_statement_tree.focus()
@@ -1808,7 +2083,14 @@ class PharmacyManagementSystem:
     # -----------------------------
     # Database Operations
     # -----------------------------
-    def execute_db_operation(self, query, params=None):
+    def execute_db_operation(self, query, params=None, audit=None):
+        # audit=(action, entity, entity_id) for statements with an {output} placeholder where
+        # the OUTPUT clause goes (entity is the table changed); the before/after images come
+        # back with the statement and are queued for Audit_Log.
+        # Returns a SELECT's rows, the number of rows a committed change affected, or None
+        # if the statement failed (after reporting the error).
+        if audit:
+            query = output_into(audit[0], audit[1], query)
         try:
             with pyodbc.connect(self.conn_str) as conn:
                 cursor = conn.cursor()
@@ -1816,18 +2098,34 @@ class PharmacyManagementSystem:
                     cursor.execute(query, params)
                 else:
                     cursor.execute(query)
+                images = []
                 if query.strip().upper().startswith('SELECT'):
                     result = cursor.fetchall()
                 else:
+                    if audit:
+                        # SET NOCOUNT ON hides the rowcount; the images are one per row
+                        images = output_images(audit[0], cursor)
+                        result = len(images)
+                    else:
+                        result = cursor.rowcount
                     conn.commit()
-                    result = None
                 cursor.close()
+                for before, after in images:
+                    self.audit_log.record(audit[0], audit[1], audit[2], before, after)
                 return result
         except pyodbc.Error as e:
             messagebox.showerror("Database Error", f"An error occurred: {str(e)}")
             logging.error(f"Database operation error: {e}")
             return None
 
+    def execute_snapshot_query(self, query, params=None):
+        try:
+            return self.snapshot.fetch(query, params)
+        except sqlite3.Error as e:
+            messagebox.showerror("Snapshot Error", f"An error occurred: {str(e)}")
+            logging.error(f"Snapshot query error: {e}")
+            return None
+
     # -----------------------------
     # Application Entry Point
     # -----------------------------
@@ -1837,6 +2135,8 @@ def main():
     parser.add_argument('--server', help='SQL Server instance name')
     parser.add_argument('--database', help='Database name')
     parser.add_argument('--log-file', help='Log file path')
+    parser.add_argument('--read-only-snapshot', metavar='PATH',
+                        help='Run the report tabs against a snapshot file made by snapshot.py')
     args = parser.parse_args()
 
     # Create config
@@ -1849,6 +2149,8 @@ def main():
         config.database = args.database
     if args.log_file:
         config.log_file = args.log_file
+    if args.read_only_snapshot:
+        config.snapshot = args.read_only_snapshot
 
     try:
         # Initialize GUI
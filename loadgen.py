@@ -0,0 +1,324 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import closing
+from datetime import date
+
+from db import SqlServerBackend, SqliteBackend, sql_server_connection_string
+from migrations import MigrationRunner
+from schema import create_sqlite_schema
+
+
+OPERATIONS = ('add_sale_item', 'complete_sale', 'delete_sale')
+# Terminal n numbers its sales n * SALE_ID_BLOCK + 1, + 2, ...
+SALE_ID_BLOCK = 10_000_000
+# gui.py's database; the load generator never writes synthetic sales into it
+LIVE_DATABASE = 'project2'
+
+
+class TerminalStats:
+    def __init__(self, terminal_id):
+        self.terminal_id = terminal_id
+        self.latencies = {op: [] for op in OPERATIONS}
+        self.sales_completed = 0
+        self.sales_deleted = 0
+        self.items_rejected = 0
+        self.deadlocks = 0
+        self.lock_timeouts = 0
+        self.errors = 0
+
+    def merge(self, other):
+        for op in OPERATIONS:
+            self.latencies[op].extend(other.latencies[op])
+        for name in ('sales_completed', 'sales_deleted', 'items_rejected', 'deadlocks', 'lock_timeouts', 'errors'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+class LoadConfig:
+    def __init__(self, duration=10.0, medications=200, items_per_sale=(1, 5), max_quantity=3,
+                 delete_ratio=0.05, think_time=0.0, transactional=False, seed=None):
+        self.duration = duration
+        self.medications = medications
+        self.items_per_sale = items_per_sale
+        self.max_quantity = max_quantity
+        self.delete_ratio = delete_ratio
+        self.think_time = think_time
+        self.transactional = transactional
+        self.seed = seed
+
+
+def classify_error(error):
+    # SQL Server reports deadlock victims as SQLSTATE 40001 / native error 1205;
+    # SQLite surfaces writer contention as "database is locked".
+    message = str(error)
+    if '40001' in message or '1205' in message or 'deadlock' in message.lower():
+        return 'deadlocks'
+    if 'locked' in message or 'busy' in message:
+        return 'lock_timeouts'
+    return 'errors'
+
+
+class Terminal:
+    def __init__(self, terminal_id, backend, config):
+        self.terminal_id = terminal_id
+        self.backend = backend
+        self.config = config
+        self.stats = TerminalStats(terminal_id)
+        self.random = random.Random(None if config.seed is None else config.seed + terminal_id)
+        self.next_sale = 0
+        self.completed_sales = []
+
+    # Each step below issues the same statements as the matching PharmacyManagementSystem method;
+    # like execute_db_operation, every statement commits on its own unless --transactional is set.
+    def add_sale_item(self, conn, cart):
+        med_id = self.random.randint(1, self.config.medications)
+        if med_id in cart:
+            return
+        quantity = self.random.randint(1, self.config.max_quantity)
+        cursor = conn.cursor()
+        cursor.execute("SELECT med_name, price, med_quantity FROM Medication WHERE med_id = ?", (med_id,))
+        row = cursor.fetchone()
+        conn.commit()
+        if not row or quantity > row[2]:
+            self.stats.items_rejected += 1
+            return
+        cart[med_id] = (float(row[1]), quantity)
+
+    def complete_sale(self, conn, cart):
+        self.next_sale += 1
+        sale_id = self.terminal_id * SALE_ID_BLOCK + self.next_sale
+        total = sum(price * qty for price, qty in cart.values())
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO Sales (sale_id, cust_id, emp_id, sale_type, payment_method, sale_date, sale_total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sale_id, 1, 1, 'pickup', 'CASH', date.today().strftime('%Y-%m-%d'), total))
+        self.commit_step(conn)
+        for med_id, (price, qty) in cart.items():
+            cursor.execute(
+                "INSERT INTO Sales_Details (sale_id, med_id, unit_price, sell_quantity, total) VALUES (?, ?, ?, ?, ?)",
+                (sale_id, med_id, price, qty, price * qty))
+            self.commit_step(conn)
+            cursor.execute("UPDATE Medication SET med_quantity = med_quantity - ? WHERE med_id = ?", (qty, med_id))
+            self.commit_step(conn)
+        conn.commit()
+        self.completed_sales.append(sale_id)
+        self.stats.sales_completed += 1
+
+    def delete_sale(self, conn):
+        sale_id = self.completed_sales.pop(self.random.randrange(len(self.completed_sales)))
+        cursor = conn.cursor()
+        cursor.execute("SELECT med_id, sell_quantity FROM Sales_Details WHERE sale_id = ?", (sale_id,))
+        items = cursor.fetchall()
+        self.commit_step(conn)
+        for med_id, quantity in items:
+            cursor.execute("UPDATE Medication SET med_quantity = med_quantity + ? WHERE med_id = ?", (quantity, med_id))
+            self.commit_step(conn)
+        cursor.execute("DELETE FROM Sales_Details WHERE sale_id = ?", (sale_id,))
+        self.commit_step(conn)
+        cursor.execute("DELETE FROM Sales WHERE sale_id = ?", (sale_id,))
+        conn.commit()
+        self.stats.sales_deleted += 1
+
+    def commit_step(self, conn):
+        if not self.config.transactional:
+            conn.commit()
+
+    def timed(self, op, func, *args):
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except Exception as e:
+            args[0].rollback()
+            kind = classify_error(e)
+            setattr(self.stats, kind, getattr(self.stats, kind) + 1)
+            return False
+        self.stats.latencies[op].append(time.perf_counter() - start)
+        return True
+
+    def run(self, deadline):
+        with closing(self.backend.connect()) as conn:
+            while time.monotonic() < deadline:
+                if self.completed_sales and self.random.random() < self.config.delete_ratio:
+                    self.timed('delete_sale', self.delete_sale, conn)
+                    continue
+                cart = {}
+                for _ in range(self.random.randint(*self.config.items_per_sale)):
+                    self.timed('add_sale_item', self.add_sale_item, conn, cart)
+                    if self.config.think_time:
+                        time.sleep(self.config.think_time)
+                if cart:
+                    self.timed('complete_sale', self.complete_sale, conn, cart)
+        return self.stats
+
+
+def run_terminal(args):
+    terminal_id, backend, config, deadline = args
+    return Terminal(terminal_id, backend, config).run(deadline)
+
+
+def prepare_sqlite(path, config):
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        create_sqlite_schema(conn)
+        conn.execute("DELETE FROM Sales_Details")
+        conn.execute("DELETE FROM Sales")
+        conn.execute("DELETE FROM Medication")
+        rng = random.Random(config.seed)
+        conn.executemany(
+            "INSERT INTO Medication (med_id, med_name, manufacture, price, med_quantity) VALUES (?, ?, ?, ?, ?)",
+            [(med_id, f"Medication {med_id}", 'Generic', round(rng.uniform(1, 100), 2), rng.randint(20, 200))
+             for med_id in range(1, config.medications + 1)])
+        conn.commit()
+    MigrationRunner(SqliteBackend(path)).upgrade()
+
+
+def generated_sale_ids(terminals):
+    return SALE_ID_BLOCK, (terminals + 1) * SALE_ID_BLOCK - 1
+
+
+def snapshot_server(backend, config, terminals):
+    # Against SQL Server the run writes into an existing database, so note the stock it
+    # may touch and make sure no sales already use the ids the terminals will generate
+    low, high = generated_sale_ids(terminals)
+    with closing(backend.connect()) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Sales WHERE sale_id BETWEEN ? AND ?", (low, high))
+        if cursor.fetchone()[0]:
+            raise RuntimeError(f"Sales already has rows with sale_id {low}-{high}; "
+                               f"point --database at a scratch copy")
+        cursor.execute("SELECT med_id, med_quantity FROM Medication WHERE med_id BETWEEN 1 AND ?",
+                       (config.medications,))
+        stock = [tuple(row) for row in cursor.fetchall()]
+        if not stock:
+            raise RuntimeError(f"Medication has no rows with med_id 1-{config.medications} to sell")
+        return stock
+
+
+def restore_server(backend, stock, terminals):
+    # Delete every generated sale (including ones a failed checkout left half written)
+    # and put the medication stock back as it was before the run
+    low, high = generated_sale_ids(terminals)
+    with closing(backend.connect()) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM Sales_Details WHERE sale_id BETWEEN ? AND ?", (low, high))
+        cursor.execute("DELETE FROM Sales WHERE sale_id BETWEEN ? AND ?", (low, high))
+        removed = cursor.rowcount
+        cursor.executemany("UPDATE Medication SET med_quantity = ? WHERE med_id = ?",
+                           [(quantity, med_id) for med_id, quantity in stock])
+        conn.commit()
+    return removed
+
+
+def count_oversold(backend):
+    with closing(backend.connect()) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Medication WHERE med_quantity < 0")
+        return cursor.fetchone()[0]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(stats, elapsed, terminals, oversold):
+    print(f"Terminals: {terminals}   Duration: {elapsed:.1f}s")
+    print(f"{'operation':<15}{'count':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for op in OPERATIONS:
+        values = sorted(stats.latencies[op])
+        print(f"{op:<15}{len(values):>8}{len(values) / elapsed:>10.1f}"
+              f"{percentile(values, 50) * 1000:>10.2f}{percentile(values, 95) * 1000:>10.2f}"
+              f"{percentile(values, 99) * 1000:>10.2f}{(values[-1] if values else 0) * 1000:>10.2f}")
+    print(f"Sales completed: {stats.sales_completed} ({stats.sales_completed / elapsed:.1f}/s), deleted: {stats.sales_deleted}")
+    print(f"Items rejected for insufficient stock: {stats.items_rejected}")
+    print(f"Deadlocks: {stats.deadlocks}   Lock timeouts: {stats.lock_timeouts}   Other errors: {stats.errors}")
+    print(f"Oversell violations (medications below zero stock): {oversold}")
+    if stats.latencies['complete_sale']:
+        print(f"Mean checkout latency: {statistics.mean(stats.latencies['complete_sale']) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-terminal checkout load generator')
+    parser.add_argument('--terminals', type=int, default=4, help='Number of concurrent tills')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--processes', action='store_true', help='Run terminals as processes instead of threads')
+    parser.add_argument('--medications', type=int, default=200, help='Medications to seed (fewer means more contention)')
+    parser.add_argument('--delete-ratio', type=float, default=0.05, help='Share of iterations that delete a sale')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Seconds between scanned items')
+    parser.add_argument('--transactional', action='store_true', help='Commit each checkout as one transaction')
+    parser.add_argument('--seed', type=int, help='Random seed for repeatable runs')
+    parser.add_argument('--sqlite', help='SQLite stand-in path (default: a fresh temporary file)')
+    parser.add_argument('--server', help='Run against this SQL Server instance instead of SQLite')
+    parser.add_argument('--database', help='SQL Server database to run in (required with --server; use a '
+                                           'scratch copy, generated sales are removed and stock restored '
+                                           'afterwards)')
+    args = parser.parse_args()
+    if args.server and not args.database:
+        parser.error('--server needs an explicit --database (a scratch copy, not the live database)')
+    if args.server and args.database.lower() == LIVE_DATABASE:
+        parser.error(f'refusing to write synthetic sales into the live {LIVE_DATABASE} database')
+
+    config = LoadConfig(duration=args.duration, medications=args.medications, delete_ratio=args.delete_ratio,
+                        think_time=args.think_time, transactional=args.transactional, seed=args.seed)
+    temp_dir = None
+    stock = None
+    if args.server:
+        backend = SqlServerBackend(sql_server_connection_string(args.server, args.database))
+        try:
+            stock = snapshot_server(backend, config, args.terminals)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            return 1
+    else:
+        path = args.sqlite
+        if not path:
+            temp_dir = tempfile.TemporaryDirectory()
+            path = os.path.join(temp_dir.name, 'loadgen.db')
+        prepare_sqlite(path, config)
+        backend = SqliteBackend(path)
+
+    try:
+        start = time.monotonic()
+        deadline = start + config.duration
+        jobs = [(terminal_id, backend, config, deadline) for terminal_id in range(1, args.terminals + 1)]
+        if args.processes:
+            with multiprocessing.Pool(args.terminals) as pool:
+                results = pool.map(run_terminal, jobs)
+        else:
+            results = [None] * len(jobs)
+
+            def worker(index):
+                results[index] = run_terminal(jobs[index])
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(jobs))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.monotonic() - start
+
+        total = TerminalStats(0)
+        for stats in results:
+            total.merge(stats)
+        report(total, elapsed, args.terminals, count_oversold(backend))
+    finally:
+        if stock is not None:
+            removed = restore_server(backend, stock, args.terminals)
+            print(f"Removed {removed} generated sales and restored stock for {len(stock)} medications")
+        if temp_dir:
+            temp_dir.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
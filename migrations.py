@@ -0,0 +1,308 @@
+import argparse
+import logging
+import sys
+from contextlib import closing
+from datetime import datetime
+
+from db import SqlServerBackend, SqliteBackend, sql_server_connection_string
+
+
+class IndexSpec:
+    def __init__(self, name, table, columns, unique=False):
+        self.name = name
+        self.table = table
+        self.columns = tuple(columns)
+        self.unique = unique
+
+    def create_sql(self):
+        unique = 'UNIQUE ' if self.unique else ''
+        return f"CREATE {unique}INDEX {self.name} ON {self.table} ({', '.join(self.columns)})"
+
+    def is_covered_by(self, index_columns):
+        # An existing index serves the predicate when its leading key columns match ours
+        leading = [col.lower() for col in index_columns[:len(self.columns)]]
+        return leading == [col.lower() for col in self.columns]
+
+    def __repr__(self):
+        return f"{self.table}({', '.join(self.columns)})"
+
+
+class TableSpec:
+    def __init__(self, name, columns):
+        # columns: (name, type) pairs using the portable types in each dialect's COLUMN_TYPES
+        self.name = name
+        self.columns = list(columns)
+
+
+class Migration:
+    def __init__(self, version, description, indexes=(), tables=(), append_only=()):
+        # append_only: names of tables whose rows may be inserted but never updated or deleted
+        self.version = version
+        self.description = description
+        self.indexes = list(indexes)
+        self.tables = list(tables)
+        self.append_only = list(append_only)
+
+
+# Append new migrations to the end with the next version number; never edit applied ones.
+MIGRATIONS = [
+    Migration(1, "Index hot lookup predicates used by gui.py", [
+        IndexSpec('IX_Sales_Details_sale_id', 'Sales_Details', ['sale_id']),
+        IndexSpec('IX_Medication_med_id', 'Medication', ['med_id']),
+        IndexSpec('IX_Stock_med_id_order_id', 'Stock', ['med_id', 'order_id']),
+        IndexSpec('IX_Order_monthly_statement_month_year', 'Order_monthly_statement', ['O_month', 'O_year']),
+        IndexSpec('IX_sales_monthly_statement_month_year', 'sales_monthly_statement', ['month', 'year']),
+    ]),
+    Migration(2, "Create Audit_Log for the data-change audit trail", tables=[
+        TableSpec('Audit_Log', [
+            ('audit_id', 'id'),
+            ('changed_at', 'timestamp'),
+            ('changed_by', 'name'),
+            ('action', 'name'),
+            ('entity', 'name'),
+            ('entity_id', 'name'),
+            ('before_values', 'text'),
+            ('after_values', 'text'),
+        ]),
+    ], indexes=[
+        IndexSpec('IX_Audit_Log_changed_at', 'Audit_Log', ['changed_at']),
+        IndexSpec('IX_Audit_Log_entity', 'Audit_Log', ['entity', 'entity_id', 'changed_at']),
+    ]),
+    Migration(3, "Index customer history lookups", [
+        IndexSpec('IX_Sales_cust_id_sale_date', 'Sales', ['cust_id', 'sale_date']),
+        IndexSpec('IX_Prescription_cust_id_issue_date', 'Prescription', ['cust_id', 'p_issue_date']),
+    ]),
+    Migration(4, "Reject updates and deletes on Audit_Log", append_only=['Audit_Log']),
+]
+
+
+class SqlServerDialect:
+    COLUMN_TYPES = {
+        'id': 'BIGINT IDENTITY(1,1) PRIMARY KEY',
+        'timestamp': 'DATETIME2 NOT NULL',
+        'name': 'NVARCHAR(100)',
+        'text': 'NVARCHAR(MAX)',
+    }
+
+    def table_exists(self, cursor, table):
+        cursor.execute("SELECT OBJECT_ID(?, 'U')", (table,))
+        return cursor.fetchone()[0] is not None
+
+    def create_table_sql(self, table):
+        columns = ', '.join(f"{name} {self.COLUMN_TYPES[col_type]}" for name, col_type in table.columns)
+        return f"CREATE TABLE {table.name} ({columns})"
+
+    def create_version_table(self, cursor):
+        cursor.execute("""
+        IF OBJECT_ID('schema_migrations', 'U') IS NULL
+        CREATE TABLE schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at VARCHAR(19) NOT NULL
+        )
+        """)
+
+    def create_append_only_guard(self, cursor, table):
+        # CREATE TRIGGER has to be alone in its batch, hence the separate existence check
+        trigger = f"TR_{table}_append_only"
+        cursor.execute("SELECT OBJECT_ID(?, 'TR')", (trigger,))
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(f"""
+        CREATE TRIGGER {trigger} ON {table} INSTEAD OF UPDATE, DELETE AS
+        BEGIN
+            THROW 51000, '{table} is append-only', 1;
+        END
+        """)
+        return True
+
+    def index_columns(self, cursor, table):
+        cursor.execute("""
+        SELECT i.name, c.name
+        FROM sys.indexes i
+        JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+        JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        WHERE i.object_id = OBJECT_ID(?) AND ic.key_ordinal > 0
+        ORDER BY i.name, ic.key_ordinal
+        """, (table,))
+        indexes = {}
+        for index_name, column_name in cursor.fetchall():
+            indexes.setdefault(index_name, []).append(column_name)
+        return indexes
+
+
+class SqliteDialect:
+    COLUMN_TYPES = {
+        'id': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'timestamp': 'TEXT NOT NULL',
+        'name': 'TEXT',
+        'text': 'TEXT',
+    }
+
+    def table_exists(self, cursor, table):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+    def create_table_sql(self, table):
+        columns = ', '.join(f"{name} {self.COLUMN_TYPES[col_type]}" for name, col_type in table.columns)
+        return f"CREATE TABLE {table.name} ({columns})"
+
+    def create_version_table(self, cursor):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+        """)
+
+    def create_append_only_guard(self, cursor, table):
+        created = False
+        for event in ('UPDATE', 'DELETE'):
+            trigger = f"TR_{table}_no_{event.lower()}"
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,))
+            if cursor.fetchone() is not None:
+                continue
+            cursor.execute(f"""
+            CREATE TRIGGER {trigger} BEFORE {event} ON {table}
+            BEGIN
+                SELECT RAISE(ABORT, '{table} is append-only');
+            END
+            """)
+            created = True
+        return created
+
+    def index_columns(self, cursor, table):
+        indexes = {}
+        for row in cursor.execute(f"PRAGMA index_list('{table}')").fetchall():
+            index_name = row[1]
+            info = cursor.execute(f"PRAGMA index_info('{index_name}')").fetchall()
+            indexes[index_name] = [col[2] for col in sorted(info)]
+        # An INTEGER PRIMARY KEY is the rowid itself and gets no entry in index_list
+        pk_columns = [(col[5], col[1], col[2]) for col in cursor.execute(f"PRAGMA table_info('{table}')").fetchall() if col[5]]
+        if len(pk_columns) == 1 and pk_columns[0][2].upper() == 'INTEGER':
+            indexes['rowid'] = [pk_columns[0][1]]
+        return indexes
+
+
+DIALECTS = {
+    'mssql': SqlServerDialect(),
+    'sqlite': SqliteDialect(),
+}
+
+
+class MigrationRunner:
+    def __init__(self, backend, migrations=None):
+        self.backend = backend
+        self.dialect = DIALECTS[backend.dialect]
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+
+    def applied_versions(self):
+        with closing(self.backend.connect()) as conn:
+            cursor = conn.cursor()
+            if not self.dialect.table_exists(cursor, 'schema_migrations'):
+                return set()
+            cursor.execute("SELECT version FROM schema_migrations")
+            return {row[0] for row in cursor.fetchall()}
+
+    def pending_migrations(self):
+        applied = self.applied_versions()
+        return [m for m in self.migrations if m.version not in applied]
+
+    def missing_tables(self):
+        with closing(self.backend.connect()) as conn:
+            cursor = conn.cursor()
+            return [table for migration in self.migrations for table in migration.tables
+                    if not self.dialect.table_exists(cursor, table.name)]
+
+    def missing_indexes(self):
+        missing = []
+        with closing(self.backend.connect()) as conn:
+            cursor = conn.cursor()
+            existing = {}
+            for migration in self.migrations:
+                for index in migration.indexes:
+                    if index.table not in existing:
+                        existing[index.table] = self.dialect.index_columns(cursor, index.table)
+                    if not any(index.is_covered_by(cols) for cols in existing[index.table].values()):
+                        missing.append(index)
+        return missing
+
+    def upgrade(self):
+        with closing(self.backend.connect()) as conn:
+            self.dialect.create_version_table(conn.cursor())
+            conn.commit()
+        applied = []
+        for migration in self.pending_migrations():
+            with closing(self.backend.connect()) as conn:
+                cursor = conn.cursor()
+                for table in migration.tables:
+                    if self.dialect.table_exists(cursor, table.name):
+                        logging.info(f"Migration {migration.version}: table {table.name} already exists")
+                        continue
+                    cursor.execute(self.dialect.create_table_sql(table))
+                    logging.info(f"Migration {migration.version}: created table {table.name}")
+                for index in migration.indexes:
+                    existing = self.dialect.index_columns(cursor, index.table)
+                    if any(index.is_covered_by(cols) for cols in existing.values()):
+                        logging.info(f"Migration {migration.version}: {index!r} already indexed, skipping {index.name}")
+                        continue
+                    cursor.execute(index.create_sql())
+                    logging.info(f"Migration {migration.version}: created {index.name} on {index!r}")
+                for table in migration.append_only:
+                    if self.dialect.create_append_only_guard(cursor, table):
+                        logging.info(f"Migration {migration.version}: {table} is now append-only")
+                    else:
+                        logging.info(f"Migration {migration.version}: {table} already append-only")
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                    (migration.version, migration.description, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                )
+                conn.commit()
+            applied.append(migration)
+        return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pharmacy schema migrations')
+    parser.add_argument('command', choices=['status', 'upgrade', 'verify'])
+    parser.add_argument('--server', default='LAPTOP-VIO2PNI9', help='SQL Server instance name')
+    parser.add_argument('--database', default='project2', help='Database name')
+    parser.add_argument('--sqlite', help='Path to an embedded SQLite database instead of SQL Server')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.sqlite:
+        backend = SqliteBackend(args.sqlite)
+    else:
+        backend = SqlServerBackend(sql_server_connection_string(args.server, args.database))
+    runner = MigrationRunner(backend)
+
+    if args.command == 'upgrade':
+        applied = runner.upgrade()
+        print(f"Applied {len(applied)} migration(s) to {backend.describe()}")
+        for migration in applied:
+            print(f"  {migration.version:04d} {migration.description}")
+
+    pending = runner.pending_migrations()
+    missing_tables = runner.missing_tables()
+    missing = runner.missing_indexes()
+    if args.command == 'status':
+        for migration in runner.migrations:
+            state = 'pending' if migration in pending else 'applied'
+            print(f"{migration.version:04d} [{state}] {migration.description}")
+    for table in missing_tables:
+        print(f"MISSING table {table.name}")
+    for index in missing:
+        print(f"MISSING {index.name} on {index!r}")
+    if args.command == 'verify' or args.command == 'upgrade':
+        if missing_tables or missing:
+            print(f"{len(missing_tables)} table(s), {len(missing)} index(es) missing")
+        else:
+            print("OK")
+    return 1 if missing_tables or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
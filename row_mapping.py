@@ -0,0 +1,190 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+from tree_sort import TableQuery
+
+
+# Kinds whose values go to the Treeview unchanged
+PASSTHROUGH_KINDS = ('text', 'int')
+
+
+def date_text(value):
+    # YYYY-MM-DD, several times faster than strftime('%Y-%m-%d')
+    return value.date().isoformat()
+
+
+@lru_cache(maxsize=None)
+def converter(kind, value_type):
+    # Resolved once per (kind, Python type) instead of an isinstance test on every cell;
+    # None means the value is shown as fetched.
+    if kind == 'money' and value_type is not type(None):
+        return '{:.2f}'.format
+    if kind == 'date' and issubclass(value_type, datetime):
+        return date_text
+    return None
+
+
+def convert_column(kind, values):
+    if kind in PASSTHROUGH_KINDS:
+        return values
+    # Dates and prices repeat a lot within a page, so each distinct value is formatted once
+    distinct = set(values)
+    types = set(map(type, distinct))
+    if len(types) == 1:
+        convert = converter(kind, types.pop())
+        if convert is None:
+            return values
+        formatted = {value: convert(value) for value in distinct}
+    else:
+        formatted = {}
+        for value in distinct:
+            convert = converter(kind, type(value))
+            formatted[value] = value if convert is None else convert(value)
+    return list(map(formatted.__getitem__, values))
+
+
+class ColumnSpec:
+    def __init__(self, heading, column, kind='text', width=100):
+        # kind: 'text' and 'int' pass through, 'money' shows two decimals, 'date' shows YYYY-MM-DD
+        self.heading = heading
+        self.column = column
+        self.kind = kind
+        self.width = width
+
+
+class RowMapper:
+    # Declares how one table appears in a Treeview: the headings, the SQL columns behind
+    # them and how each is formatted. Fetched batches are converted a column at a time.
+    def __init__(self, table, columns, key_columns):
+        self.table = table
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+
+    @property
+    def headings(self):
+        return tuple(spec.heading for spec in self.columns)
+
+    def configure(self, tree):
+        for spec in self.columns:
+            tree.heading(spec.heading, text=spec.heading)
+            tree.column(spec.heading, width=spec.width, anchor='center')
+
+    def query(self, dialect='mssql'):
+        return TableQuery(self.table, [(spec.heading, spec.column) for spec in self.columns],
+                          self.key_columns, dialect)
+
+    def format_rows(self, rows):
+        # rows hold the columns in declaration order, as TableQuery.select returns them
+        if not rows:
+            return []
+        converted = [convert_column(spec.kind, values) for spec, values in zip(self.columns, zip(*rows))]
+        return list(zip(*converted))
+
+
+CUSTOMERS = RowMapper('Customer', [
+    ColumnSpec('ID', 'cust_id', 'int'), ColumnSpec('Name', 'cust_name'), ColumnSpec('Phone', 'cust_phone'),
+    ColumnSpec('DOB', 'date_birth', 'date'), ColumnSpec('Gender', 'gender'), ColumnSpec('Insurance', 'insurance'),
+    ColumnSpec('Address ID', 'address_id', 'int'),
+], ['cust_id'])
+
+EMPLOYEES = RowMapper('Employee', [
+    ColumnSpec('ID', 'emp_id', 'int'), ColumnSpec('Title', 'title'), ColumnSpec('Name', 'emp_name'),
+    ColumnSpec('Phone', 'emp_phone'), ColumnSpec('DOB', 'date_birth', 'date'), ColumnSpec('Gender', 'gender'),
+    ColumnSpec('Hire Date', 'hire_date', 'date'), ColumnSpec('Salary', 'salary', 'money'),
+    ColumnSpec('Address ID', 'address_id', 'int'),
+], ['emp_id'])
+
+MEDICATIONS = RowMapper('Medication', [
+    ColumnSpec('ID', 'med_id', 'int'), ColumnSpec('Name', 'med_name'), ColumnSpec('Manufacturer', 'manufacture'),
+    ColumnSpec('Price', 'price', 'money'), ColumnSpec('Quantity', 'med_quantity', 'int'),
+], ['med_id'])
+
+SALES = RowMapper('Sales', [
+    ColumnSpec('ID', 'sale_id', 'int'), ColumnSpec('Customer', 'cust_id', 'int'), ColumnSpec('Employee', 'emp_id', 'int'),
+    ColumnSpec('Type', 'sale_type'), ColumnSpec('Payment', 'payment_method'), ColumnSpec('Date', 'sale_date', 'date'),
+    ColumnSpec('Total', 'sale_total', 'money'),
+], ['sale_id'])
+
+PRESCRIPTIONS = RowMapper('Prescription', [
+    ColumnSpec('ID', 'p_id', 'int', 150), ColumnSpec('Customer', 'cust_id', 'int', 150),
+    ColumnSpec('Doctor', 'doctor', width=150), ColumnSpec('Issue Date', 'p_issue_date', 'date', 150),
+], ['p_id'])
+
+STOCK = RowMapper('Stock', [
+    ColumnSpec('Medication ID', 'med_id', 'int', 120), ColumnSpec('Order ID', 'order_id', 'int', 120),
+    ColumnSpec('Quantity', 's_quantity', 'int', 120), ColumnSpec('Production Date', 'production_date', 'date', 120),
+    ColumnSpec('Expire Date', 'expire_date', 'date', 120), ColumnSpec('Total Price', 'total_price', 'money', 120),
+], ['med_id', 'order_id'])
+
+SUPPLIERS = RowMapper('Supplier', [
+    ColumnSpec('ID', 'supplier_id', 'int', 120), ColumnSpec('Name', 'contact_name', width=120),
+    ColumnSpec('Contact', 'address_id', 'int', 120), ColumnSpec('Address', 'contact_phone', width=120),
+    ColumnSpec('Company Name', 'company_name', width=120),
+], ['supplier_id'])
+
+ADDRESSES = RowMapper('Address', [
+    ColumnSpec('ID', 'address_id', 'int', 120), ColumnSpec('Street Name', 'Street_name', width=120),
+    ColumnSpec('City', 'City', width=120), ColumnSpec('Area', 'Area', width=120),
+    ColumnSpec('Building Name', 'Building_name', width=120),
+], ['address_id'])
+
+ORDER_STATEMENTS = RowMapper('Order_monthly_statement', [
+    ColumnSpec('Statement ID', 'O_statement_id', 'int', 120), ColumnSpec('Supplier ID', 'supplier_id', 'int', 120),
+    ColumnSpec('Year', 'O_year', 'int', 120), ColumnSpec('Month', 'O_month', 'int', 120),
+    ColumnSpec('Status', 'O_status', width=120), ColumnSpec('Issue Date', 'O_issue_date', 'date', 120),
+    ColumnSpec('Total', 'O_statement_total', 'money', 120),
+], ['O_statement_id'])
+
+SALES_STATEMENTS = RowMapper('sales_monthly_statement', [
+    ColumnSpec('Sale ID', 's_id', 'int', 120), ColumnSpec('Year', 'year', 'int', 120),
+    ColumnSpec('Month', 'month', 'int', 120), ColumnSpec('Issue Date', 'issue_date', 'date', 120),
+    ColumnSpec('Total', 'S_Statement_total', 'money', 120),
+], ['s_id'])
+
+
+def format_employee_row(employee):
+    # The per-row formatting gui.py used before RowMapper, kept as the benchmark baseline
+    emp_dob = employee.date_birth.strftime('%Y-%m-%d') if isinstance(employee.date_birth, datetime) else employee.date_birth
+    hire_date = employee.hire_date.strftime('%Y-%m-%d') if isinstance(employee.hire_date, datetime) else employee.hire_date
+    return (employee.emp_id, employee.title, employee.emp_name, employee.emp_phone, emp_dob, employee.gender, hire_date, f"{employee.salary:.2f}", employee.address_id)
+
+
+def benchmark(rows=100000, repeat=5):
+    Row = namedtuple('Row', [spec.column for spec in EMPLOYEES.columns])
+    start_date = datetime(1960, 1, 1)
+    batch = [Row(i, 'Pharmacist', f"Employee {i}", f"0100{i:07d}", start_date + timedelta(days=i % 15000), 'F',
+                 start_date + timedelta(days=i % 20000), Decimal('1234.50') + i % 1000, i % 500)
+             for i in range(rows)]
+    assert [format_employee_row(row) for row in batch[:100]] == EMPLOYEES.format_rows(batch[:100])
+    results = {}
+    for name, run in (('per-row', lambda: [format_employee_row(row) for row in batch]),
+                      ('column-wise', lambda: EMPLOYEES.format_rows(batch))):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Treeview row formatting')
+    parser.add_argument('--rows', type=int, default=100000, help='Employee rows per batch')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per method; the fastest is reported')
+    args = parser.parse_args()
+
+    results = benchmark(args.rows, args.repeat)
+    for name, seconds in results.items():
+        print(f"{name:<12}{seconds * 1000:>10.1f} ms  {args.rows / seconds:>12,.0f} rows/s")
+    print(f"Speedup: {results['per-row'] / results['column-wise']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
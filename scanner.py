@@ -0,0 +1,106 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+
+BATCH_WINDOW = 0.05
+MAX_BATCH_IDS = 500
+# Other tills sell from the same stock, so cached quantities are only trusted this long
+CACHE_TTL = 30.0
+
+
+class MedicationCache:
+    def __init__(self, fetch_many, ttl=CACHE_TTL):
+        # fetch_many(ids) returns (med_id, med_name, price, med_quantity) rows for the ids that exist
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        # med_id -> (entry, time loaded)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, med_id):
+        with self.lock:
+            cached = self.entries.get(med_id)
+            if cached is None:
+                return None
+            if time.monotonic() - cached[1] > self.ttl:
+                del self.entries[med_id]
+                return None
+            return cached[0]
+
+    def load(self, med_ids):
+        med_ids = list(med_ids)
+        for start in range(0, len(med_ids), MAX_BATCH_IDS):
+            rows = self.fetch_many(med_ids[start:start + MAX_BATCH_IDS])
+            loaded = time.monotonic()
+            with self.lock:
+                for med_id, med_name, price, quantity in rows:
+                    self.entries[str(med_id).strip()] = ((med_name, float(price), int(quantity)), loaded)
+
+    def invalidate(self, med_id=None):
+        with self.lock:
+            if med_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(str(med_id).strip(), None)
+
+
+class ScanValidator:
+    def __init__(self, cache, batch_window=BATCH_WINDOW):
+        self.cache = cache
+        self.batch_window = batch_window
+        self.pending = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, code):
+        self.pending.put(code)
+
+    def stop(self):
+        self.pending.put(None)
+
+    def drain(self):
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def run(self):
+        while True:
+            code = self.pending.get()
+            if code is None:
+                return
+            # Gather everything scanned within the batch window so repeats coalesce
+            # and unknown codes are resolved with a single query.
+            codes = [code]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    code = self.pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if code is None:
+                    self.pending.put(None)
+                    break
+                codes.append(code)
+            counts = Counter(codes)
+            error = None
+            missing = [med_id for med_id in counts if self.cache.get(med_id) is None]
+            if missing:
+                try:
+                    self.cache.load(missing)
+                except Exception as e:
+                    logging.error(f"Scanner lookup failed: {e}")
+                    error = str(e)
+            for med_id, count in counts.items():
+                # Codes resolved before the failure (cached, or in an earlier chunk) are fine
+                entry = self.cache.get(med_id)
+                self.results.put((med_id, count, entry, error if entry is None else None))
@@ -0,0 +1,75 @@
+# Tables gui.py reads and writes, used to build embedded (SQLite) stand-ins of the
+# SQL Server database. Column order matches the SELECT lists in gui.py.
+TABLES = {
+    'Address': [
+        ('address_id', 'INTEGER'), ('Street_name', 'TEXT'), ('City', 'TEXT'), ('Area', 'TEXT'),
+        ('Building_name', 'TEXT'),
+    ],
+    'Customer': [
+        ('cust_id', 'INTEGER'), ('cust_name', 'TEXT'), ('cust_phone', 'TEXT'), ('date_birth', 'TEXT'),
+        ('gender', 'TEXT'), ('insurance', 'TEXT'), ('address_id', 'INTEGER'),
+    ],
+    'Employee': [
+        ('emp_id', 'INTEGER'), ('title', 'TEXT'), ('emp_name', 'TEXT'), ('emp_phone', 'TEXT'),
+        ('date_birth', 'TEXT'), ('gender', 'TEXT'), ('hire_date', 'TEXT'), ('salary', 'REAL'),
+        ('address_id', 'INTEGER'),
+    ],
+    'Medication': [
+        ('med_id', 'INTEGER'), ('med_name', 'TEXT'), ('manufacture', 'TEXT'), ('price', 'REAL'),
+        ('med_quantity', 'INTEGER'),
+    ],
+    'Sales': [
+        ('sale_id', 'INTEGER'), ('cust_id', 'INTEGER'), ('emp_id', 'INTEGER'), ('sale_type', 'TEXT'),
+        ('payment_method', 'TEXT'), ('sale_date', 'TEXT'), ('sale_total', 'REAL'),
+    ],
+    'Sales_Details': [
+        ('sale_id', 'INTEGER'), ('med_id', 'INTEGER'), ('unit_price', 'REAL'), ('sell_quantity', 'INTEGER'),
+        ('total', 'REAL'),
+    ],
+    'Prescription': [
+        ('p_id', 'INTEGER'), ('cust_id', 'INTEGER'), ('doctor', 'TEXT'), ('p_issue_date', 'TEXT'),
+    ],
+    'Stock': [
+        ('med_id', 'INTEGER'), ('order_id', 'INTEGER'), ('s_quantity', 'INTEGER'), ('production_date', 'TEXT'),
+        ('expire_date', 'TEXT'), ('total_price', 'REAL'),
+    ],
+    'Supplier': [
+        ('supplier_id', 'INTEGER'), ('contact_name', 'TEXT'), ('address_id', 'INTEGER'),
+        ('contact_phone', 'TEXT'), ('company_name', 'TEXT'),
+    ],
+    'Order_monthly_statement': [
+        ('O_statement_id', 'INTEGER'), ('supplier_id', 'INTEGER'), ('O_year', 'INTEGER'), ('O_month', 'INTEGER'),
+        ('O_status', 'TEXT'), ('O_issue_date', 'TEXT'), ('O_statement_total', 'REAL'),
+    ],
+    'sales_monthly_statement': [
+        ('s_id', 'INTEGER'), ('year', 'INTEGER'), ('month', 'INTEGER'), ('issue_date', 'TEXT'),
+        ('S_Statement_total', 'REAL'),
+    ],
+}
+
+PRIMARY_KEYS = {
+    'Address': ['address_id'],
+    'Customer': ['cust_id'],
+    'Employee': ['emp_id'],
+    'Medication': ['med_id'],
+    'Sales': ['sale_id'],
+    'Sales_Details': ['sale_id', 'med_id'],
+    'Prescription': ['p_id'],
+    'Stock': ['med_id', 'order_id'],
+    'Supplier': ['supplier_id'],
+    'Order_monthly_statement': ['O_statement_id'],
+    'sales_monthly_statement': ['s_id'],
+}
+
+
+def create_table_sql(table):
+    columns = [f"{name} {col_type}" for name, col_type in TABLES[table]]
+    columns.append(f"PRIMARY KEY ({', '.join(PRIMARY_KEYS[table])})")
+    return f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})"
+
+
+def create_sqlite_schema(conn):
+    cursor = conn.cursor()
+    for table in TABLES:
+        cursor.execute(create_table_sql(table))
+    conn.commit()
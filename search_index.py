@@ -0,0 +1,207 @@
+import heapq
+import re
+import unicodedata
+from array import array
+from collections import Counter
+from math import ceil
+
+
+MIN_COVERAGE = 0.5
+MAX_WORD_MATCHES = 50
+STOP_GRAM_FRACTION = 0.1
+SET_POSTING_SIZE = 1024
+FETCH_BATCH = 5000
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def ngrams(word, n=3, pad=True):
+    # pg_trgm style padding (n - 1 leading blanks, one trailing) favours prefix matches;
+    # unpadded grams suit values searched by fragment, like the last digits of a phone.
+    if pad:
+        word = ' ' * (n - 1) + word + ' '
+    if len(word) < n:
+        return {word}
+    return {word[i:i + n] for i in range(len(word) - n + 1)}
+
+
+class NgramIndex:
+    # Append-only n-gram index over distinct words; a word's id is its position in self.words.
+    def __init__(self, n=3, pad=True):
+        self.n = n
+        self.pad = pad
+        self.words = []
+        self.sizes = array('H')
+        self.ids = {}
+        self.postings = {}
+
+    def add(self, word):
+        word_id = self.ids.get(word)
+        if word_id is not None:
+            return word_id
+        word_id = len(self.words)
+        grams = ngrams(word, self.n, self.pad)
+        self.words.append(word)
+        self.sizes.append(min(len(grams), 65535))
+        self.ids[word] = word_id
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                self.postings[gram] = array('I', (word_id,))
+            else:
+                posting.append(word_id)
+        return word_id
+
+    def similar(self, word, limit=MAX_WORD_MATCHES, min_coverage=MIN_COVERAGE):
+        # Returns {word_id: similarity in 0..1}. Grams shared by a large share of the vocabulary
+        # (a common leading letter, a country prefix) say little and cost the most to count,
+        # so they are left out unless nothing else is available.
+        postings = [self.postings[gram] for gram in ngrams(word, self.n, self.pad) if gram in self.postings]
+        if not postings:
+            return {}
+        postings.sort(key=len)
+        cutoff = max(1, int(len(self.words) * STOP_GRAM_FRACTION))
+        useful = [posting for posting in postings if len(posting) <= cutoff] or postings[:1]
+        counts = Counter()
+        for posting in useful:
+            counts.update(posting)
+        considered = len(useful)
+        needed = max(1, ceil(considered * min_coverage))
+        sizes = self.sizes
+        scored = [(shared / considered + shared / (considered + sizes[word_id] - shared), word_id)
+                  for word_id, shared in counts.items() if shared >= needed]
+        # Coverage of the query ranks first so prefixes and single typos score well;
+        # Jaccard similarity pulls closer lengths ahead.
+        return {word_id: score / 2 for score, word_id in heapq.nlargest(limit, scored)}
+
+
+def top_tier(match, margin=0.1):
+    best = max(match.values())
+    return {word_id: similarity for word_id, similarity in match.items() if similarity >= best - margin}
+
+
+class FuzzyIndex:
+    # Typo-tolerant lookup of short texts (names, phone numbers). Query words are matched
+    # against the distinct-word vocabulary and documents are gathered from per-word posting
+    # lists, so the cost follows the vocabulary and the result size rather than the row count.
+    def __init__(self, n=3, pad=True):
+        self.vocabulary = NgramIndex(n, pad)
+        self.word_docs = []
+        # Long posting lists are mirrored as sets so intersections walk the shorter side
+        self.word_sets = {}
+        self.slot_keys = []
+        self.slot_texts = []
+        self.slot_words = []
+        self.slots = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, key, text):
+        self.remove(key)
+        words = list(dict.fromkeys(normalize(text).split()))
+        if not words:
+            return
+        slot = len(self.slot_keys)
+        word_ids = array('I')
+        for word in words:
+            word_id = self.vocabulary.add(word)
+            if word_id == len(self.word_docs):
+                self.word_docs.append(array('I'))
+            docs = self.word_docs[word_id]
+            docs.append(slot)
+            if word_id in self.word_sets:
+                self.word_sets[word_id].add(slot)
+            elif len(docs) > SET_POSTING_SIZE:
+                self.word_sets[word_id] = set(docs)
+            word_ids.append(word_id)
+        self.slot_keys.append(key)
+        self.slot_texts.append(text)
+        self.slot_words.append(word_ids)
+        self.slots[key] = slot
+
+    # Updating a key retires its old slot; posting lists stay append-only and retired
+    # slots are skipped when results are assembled.
+    update = add
+
+    def remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is not None:
+            self.slot_keys[slot] = None
+
+    def build(self, rows):
+        # rows: iterable of (key, text), e.g. stream_rows over a database cursor
+        for key, text in rows:
+            self.add(key, text)
+        return self
+
+    def search(self, query, limit=20):
+        query_words = list(dict.fromkeys(normalize(query).split()))
+        matches = [m for m in (self.vocabulary.similar(word) for word in query_words) if m]
+        if not matches:
+            return []
+        if len(matches) > 1:
+            # Try the closest vocabulary words first; only widen to every fuzzy match
+            # when the close ones alone do not fill the page.
+            results = self.search_all_words([top_tier(match) for match in matches], len(query_words), limit)
+            if len(results) < limit:
+                results = self.search_all_words(matches, len(query_words), limit)
+            if results:
+                return results
+            matches = [min(matches, key=self.posting_size)]
+        return self.search_one_word(matches[0], len(query_words), limit)
+
+    def posting_size(self, match):
+        return sum(len(self.word_docs[word_id]) for word_id in match)
+
+    def search_one_word(self, match, query_length, limit):
+        # Walk the matched words best-first and stop once enough live documents are collected
+        results, seen = [], set()
+        for word_id, similarity in sorted(match.items(), key=lambda item: -item[1]):
+            for slot in self.word_docs[word_id]:
+                if slot in seen or self.slot_keys[slot] is None:
+                    continue
+                seen.add(slot)
+                results.append((self.slot_keys[slot], self.slot_texts[slot], similarity / query_length))
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def search_all_words(self, matches, query_length, limit):
+        # Start from the most selective query word and narrow to documents that also match
+        # each further word; per-slot scores are carried along as {slot: summed similarity}.
+        matches.sort(key=self.posting_size)
+        totals = self.best_similarity(matches[0])
+        for match in matches[1:]:
+            best = self.best_similarity(match, within=set(totals))
+            if not best:
+                return []
+            totals = {slot: totals[slot] + similarity for slot, similarity in best.items()}
+        keys, slot_words = self.slot_keys, self.slot_words
+        scored = ((score / query_length, -len(slot_words[slot]), slot)
+                  for slot, score in totals.items() if keys[slot] is not None)
+        return [(keys[slot], self.slot_texts[slot], score) for score, _, slot in heapq.nlargest(limit, scored)]
+
+    def best_similarity(self, match, within=None):
+        # Ascending similarity so a document containing several matched words keeps its best one
+        best = {}
+        for word_id, similarity in sorted(match.items(), key=lambda item: item[1]):
+            if within is None:
+                docs = self.word_docs[word_id]
+            else:
+                docs = within.intersection(self.word_sets.get(word_id) or self.word_docs[word_id])
+            best.update(dict.fromkeys(docs, similarity))
+        return best
+
+
+def stream_rows(cursor, query, batch_size=FETCH_BATCH):
+    cursor.execute(query)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield row[0], row[1]
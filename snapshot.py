@@ -0,0 +1,240 @@
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+import time
+import zlib
+from collections import namedtuple
+from contextlib import closing
+from datetime import date, datetime, time as time_of_day
+from decimal import Decimal
+from pathlib import Path
+
+from db import SqlServerBackend, SqliteBackend, sql_server_connection_string
+from schema import PRIMARY_KEYS, TABLES, create_sqlite_schema
+
+
+CHUNK_SIZE = 5000
+# Key lookups stay well under SQL Server's 2100 parameters per statement
+MAX_KEY_PARAMS = 1000
+# Past this share of changed rows one sequential scan beats fetching by key
+FULL_SCAN_FRACTION = 0.3
+
+METADATA_SQL = (
+    "CREATE TABLE IF NOT EXISTS snapshot_rows (table_name TEXT, row_key TEXT, checksum INTEGER, "
+    "PRIMARY KEY (table_name, row_key)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS snapshot_info (table_name TEXT PRIMARY KEY, refreshed_at TEXT, "
+    "row_count INTEGER, changed INTEGER, removed INTEGER)",
+)
+
+
+def to_sqlite(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, (date, time_of_day)):
+        return value.isoformat()
+    return value
+
+
+def row_key(values):
+    return json.dumps([to_sqlite(value) for value in values])
+
+
+def begin_consistent_read(conn, dialect):
+    # With snapshot isolation enabled on the database every table is read as of the same
+    # moment; otherwise each table is consistent on its own and the next refresh catches up.
+    if dialect != 'mssql':
+        return False
+    cursor = conn.cursor()
+    cursor.execute("SELECT snapshot_isolation_state FROM sys.databases WHERE name = DB_NAME()")
+    row = cursor.fetchone()
+    # The check opened a READ COMMITTED transaction (autocommit is off); end it so the
+    # snapshot level applies from the first table read rather than failing it (error 3951)
+    conn.commit()
+    if not row or row[0] != 1:
+        return False
+    cursor.execute("SET TRANSACTION ISOLATION LEVEL SNAPSHOT")
+    return True
+
+
+def fetch_chunks(cursor, query, params=()):
+    cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def source_checksums(cursor, dialect, table):
+    # Yields (key values, checksum). SQL Server computes the checksum itself so only keys
+    # and one integer per row cross the network; SQLite sources are hashed here.
+    keys = PRIMARY_KEYS[table]
+    columns = [name for name, _ in TABLES[table]]
+    if dialect == 'mssql':
+        query = f"SELECT {', '.join(keys)}, BINARY_CHECKSUM({', '.join(columns)}) FROM {table}"
+        for rows in fetch_chunks(cursor, query):
+            for row in rows:
+                yield tuple(row[:len(keys)]), row[len(keys)]
+    else:
+        query = f"SELECT {', '.join(keys + columns)} FROM {table}"
+        for rows in fetch_chunks(cursor, query):
+            for row in rows:
+                values = [to_sqlite(value) for value in row[len(keys):]]
+                yield tuple(row[:len(keys)]), zlib.crc32(repr(values).encode())
+
+
+def fetch_rows(cursor, table, keys):
+    # Full rows for the given key tuples, a bounded number of parameters at a time
+    key_columns = PRIMARY_KEYS[table]
+    select = f"SELECT {', '.join(name for name, _ in TABLES[table])} FROM {table} WHERE "
+    per_chunk = max(1, MAX_KEY_PARAMS // len(key_columns))
+    for start in range(0, len(keys), per_chunk):
+        chunk = keys[start:start + per_chunk]
+        if len(key_columns) == 1:
+            condition = f"{key_columns[0]} IN ({', '.join('?' for _ in chunk)})"
+            params = [key[0] for key in chunk]
+        else:
+            match = '(' + ' AND '.join(f"{col} = ?" for col in key_columns) + ')'
+            condition = ' OR '.join(match for _ in chunk)
+            params = [value for key in chunk for value in key]
+        yield from fetch_chunks(cursor, select + condition, params)
+
+
+class SnapshotWriter:
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+
+    def refresh(self, full=False, tables=None):
+        tables = list(tables or TABLES)
+        stats = {}
+        with closing(self.backend.connect()) as source, closing(sqlite3.connect(self.path)) as snapshot:
+            create_sqlite_schema(snapshot)
+            for statement in METADATA_SQL:
+                snapshot.execute(statement)
+            snapshot.commit()
+            if begin_consistent_read(source, self.backend.dialect):
+                logging.info("Reading source under snapshot isolation")
+            cursor = source.cursor()
+            # Everything is written in one transaction, so readers of the file keep seeing
+            # the previous snapshot until the new one is complete.
+            refreshed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for table in tables:
+                stats[table] = self.refresh_table(cursor, snapshot, table, full, refreshed_at)
+            snapshot.commit()
+            source.rollback()
+        if full:
+            with closing(sqlite3.connect(self.path)) as snapshot:
+                snapshot.execute("VACUUM")
+        return stats
+
+    def refresh_table(self, cursor, snapshot, table, full, refreshed_at):
+        start = time.perf_counter()
+        columns = [name for name, _ in TABLES[table]]
+        key_columns = PRIMARY_KEYS[table]
+        if full:
+            snapshot.execute(f"DELETE FROM {table}")
+            snapshot.execute("DELETE FROM snapshot_rows WHERE table_name = ?", (table,))
+            stored = {}
+        else:
+            stored = dict(snapshot.execute(
+                "SELECT row_key, checksum FROM snapshot_rows WHERE table_name = ?", (table,)))
+
+        changed, changed_keys, checksums = [], [], {}
+        for key, checksum in source_checksums(cursor, self.backend.dialect, table):
+            text = row_key(key)
+            if stored.pop(text, None) != checksum:
+                changed.append(key)
+                changed_keys.append((table, text, checksum))
+            checksums[text] = checksum
+        # Whatever is left in stored no longer exists at the source
+        removed = list(stored)
+
+        key_where = ' AND '.join(f"{col} = ?" for col in key_columns)
+        snapshot.executemany(f"DELETE FROM {table} WHERE {key_where}", (json.loads(text) for text in removed))
+        snapshot.executemany("DELETE FROM snapshot_rows WHERE table_name = ? AND row_key = ?",
+                             ((table, text) for text in removed))
+
+        insert = f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        key_positions = [columns.index(col) for col in key_columns]
+        wanted = None
+        if len(changed) > FULL_SCAN_FRACTION * len(checksums):
+            if len(changed) < len(checksums):
+                wanted = {text for _, text, _ in changed_keys}
+            chunks = fetch_chunks(cursor, f"SELECT {', '.join(columns)} FROM {table}")
+        else:
+            chunks = fetch_rows(cursor, table, changed)
+        for rows in chunks:
+            values = [[to_sqlite(value) for value in row] for row in rows]
+            if wanted is not None:
+                values = [row for row in values if row_key([row[i] for i in key_positions]) in wanted]
+            snapshot.executemany(insert, values)
+        snapshot.executemany("INSERT OR REPLACE INTO snapshot_rows (table_name, row_key, checksum) VALUES (?, ?, ?)",
+                             changed_keys)
+
+        snapshot.execute("INSERT OR REPLACE INTO snapshot_info (table_name, refreshed_at, row_count, changed, removed) "
+                         "VALUES (?, ?, ?, ?, ?)", (table, refreshed_at, len(checksums), len(changed), len(removed)))
+        elapsed = time.perf_counter() - start
+        logging.info(f"Snapshot of {table}: {len(checksums)} rows, {len(changed)} written, "
+                     f"{len(removed)} removed in {elapsed:.2f}s")
+        return len(checksums), len(changed), len(removed), elapsed
+
+
+class SnapshotReader:
+    # Read-only access to a snapshot file. Rows allow attribute access by column name
+    # like pyodbc rows, so the same format_*_row methods work on either source.
+    dialect = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self.row_types = {}
+
+    def connect(self):
+        conn = sqlite3.connect(f"file:{Path(self.path).as_posix()}?mode=ro", uri=True)
+        conn.row_factory = self.make_row
+        return conn
+
+    def make_row(self, cursor, row):
+        names = tuple(col[0] for col in cursor.description)
+        row_type = self.row_types.get(names)
+        if row_type is None:
+            row_type = self.row_types[names] = namedtuple('SnapshotRow', names, rename=True)
+        return row_type(*row)
+
+    def fetch(self, query, params=()):
+        with closing(self.connect()) as conn:
+            return conn.execute(query, params or ()).fetchall()
+
+    def refreshed_at(self):
+        rows = self.fetch("SELECT MIN(refreshed_at) AS refreshed_at FROM snapshot_info")
+        return rows[0].refreshed_at if rows else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy the pharmacy database into a local SQLite snapshot')
+    parser.add_argument('--server', default='LAPTOP-VIO2PNI9', help='SQL Server instance name')
+    parser.add_argument('--database', default='project2', help='Database name')
+    parser.add_argument('--sqlite', help='Read from an embedded SQLite database instead of SQL Server')
+    parser.add_argument('--output', default='pharmacy_snapshot.db', help='Snapshot file to create or refresh')
+    parser.add_argument('--full', action='store_true', help='Rebuild every table instead of copying only changed rows')
+    parser.add_argument('--table', action='append', choices=sorted(TABLES), help='Limit the refresh to this table')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.sqlite:
+        backend = SqliteBackend(args.sqlite)
+    else:
+        backend = SqlServerBackend(sql_server_connection_string(args.server, args.database))
+    stats = SnapshotWriter(backend, args.output).refresh(full=args.full, tables=args.table)
+    print(f"{'table':<26}{'rows':>10}{'written':>10}{'removed':>10}{'seconds':>10}")
+    for table, (rows, written, removed, elapsed) in stats.items():
+        print(f"{table:<26}{rows:>10}{written:>10}{removed:>10}{elapsed:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
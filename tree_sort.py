@@ -0,0 +1,167 @@
+PAGE_SIZE = 500
+
+
+class TableQuery:
+    def __init__(self, table, columns, key_columns, dialect='mssql'):
+        # columns: (heading, sql column) pairs in Treeview order
+        self.table = table
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.dialect = dialect
+
+    def column_for(self, heading):
+        return dict(self.columns)[heading]
+
+    def select(self, where=None, params=(), sort_column=None, descending=False, after=None, limit=PAGE_SIZE):
+        # Keyset paging: `after` is the last fetched row as {column: value}; the next page
+        # continues strictly after it in (sort_column, key_columns...) order.
+        order = self.order_columns(sort_column)
+        conditions = [f"({where})"] if where else []
+        params = list(params)
+        if after is not None:
+            clause, clause_params = self.keyset_condition(order, after, descending)
+            conditions.append(clause)
+            params.extend(clause_params)
+        direction = ' DESC' if descending else ''
+        select_list = ', '.join(col for _, col in self.columns)
+        top = f"TOP ({int(limit)}) " if self.dialect == 'mssql' else ''
+        query = f"SELECT {top}{select_list} FROM {self.table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(col + direction for col in order)
+        if self.dialect != 'mssql':
+            query += f" LIMIT {int(limit)}"
+        return query, tuple(params)
+
+    def order_columns(self, sort_column):
+        if sort_column is None or sort_column in self.key_columns[:1]:
+            return list(self.key_columns)
+        return [sort_column] + [col for col in self.key_columns if col != sort_column]
+
+    def keyset_condition(self, order, after, descending):
+        # Expands (a, b, c) > (x, y, z) into OR/AND form. Only the leading sort column can be
+        # NULL; both SQL Server and SQLite sort NULL lowest.
+        op = '<' if descending else '>'
+        clause, params = None, []
+        for col in reversed(order[1:]):
+            if clause is None:
+                clause, params = f"{col} {op} ?", [after[col]]
+            else:
+                clause, params = f"({col} {op} ? OR ({col} = ? AND {clause}))", [after[col], after[col]] + params
+        lead = order[0]
+        value = after[lead]
+        if clause is None:
+            if value is None:
+                return ("1 = 0", []) if descending else (f"{lead} IS NOT NULL", [])
+            return (f"({lead} {op} ?" + (f" OR {lead} IS NULL)" if descending else ")"), [value])
+        if value is None:
+            if descending:
+                return f"({lead} IS NULL AND {clause})", params
+            return f"({lead} IS NOT NULL OR ({lead} IS NULL AND {clause}))", params
+        tail = f" OR {lead} IS NULL" if descending else ''
+        return f"({lead} {op} ? OR ({lead} = ? AND {clause}){tail})", [value, value] + params
+
+
+def sort_key(value):
+    # Numbers sort numerically, everything else (including YYYY-MM-DD dates) as text
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+
+class TreeSorter:
+    def __init__(self, tree, fetch=None, query=None, format_rows=None, page_size=PAGE_SIZE):
+        self.tree = tree
+        self.fetch = fetch
+        self.query = query
+        # format_rows converts a fetched batch into Treeview value tuples
+        self.format_rows = format_rows
+        self.page_size = page_size
+        self.sort_heading = None
+        self.descending = False
+        self.where = None
+        self.params = ()
+        self.last_row = None
+        self.complete = query is None
+        self.sort_cache = {}
+        self.loading = False
+        self.headings = {col: tree.heading(col, 'text') for col in tree['columns']}
+        for col in tree['columns']:
+            tree.heading(col, command=lambda c=col: self.sort_by(c))
+
+    def attach_scrollbar(self, scrollbar):
+        self.tree.configure(yscrollcommand=lambda first, last: self.on_scroll(scrollbar, first, last))
+
+    def on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 1.0 and not self.complete and not self.loading:
+            self.loading = True
+            self.tree.after_idle(self.load_next_page)
+
+    def reload(self, where=None, params=()):
+        self.where = where
+        self.params = params
+        self.tree.delete(*self.tree.get_children())
+        self.invalidate()
+        self.last_row = None
+        self.complete = False
+        return self.load_next_page()
+
+    def invalidate(self):
+        self.sort_cache.clear()
+
+    def show(self, rows):
+        # Displays a fixed result set (e.g. search hits) in the given order; heading sorts stay in memory
+        self.tree.delete(*self.tree.get_children())
+        for values in self.format_rows(rows):
+            self.tree.insert('', 'end', values=values)
+        self.complete = True
+        self.invalidate()
+
+    def load_next_page(self):
+        if self.complete:
+            return 0
+        self.loading = True
+        try:
+            sort_column = self.query.column_for(self.sort_heading) if self.sort_heading else None
+            sql, params = self.query.select(self.where, self.params, sort_column, self.descending,
+                                            self.last_row, self.page_size)
+            rows = self.fetch(sql, params) or []
+            for values in self.format_rows(rows):
+                self.tree.insert('', 'end', values=values)
+            if rows:
+                last = rows[-1]
+                self.last_row = {col: last[i] for i, (_, col) in enumerate(self.query.columns)}
+            self.complete = len(rows) < self.page_size
+            self.invalidate()
+            return len(rows)
+        finally:
+            self.loading = False
+
+    def sort_by(self, heading):
+        if heading == self.sort_heading:
+            self.descending = not self.descending
+        else:
+            self.sort_heading = heading
+            self.descending = False
+        for col, text in self.headings.items():
+            arrow = (' ▼' if self.descending else ' ▲') if col == heading else ''
+            self.tree.heading(col, text=text + arrow)
+        if self.complete:
+            self.sort_in_memory(heading)
+        else:
+            # Not everything is loaded, so only the database can produce the right first page
+            self.reload(self.where, self.params)
+
+    def sort_in_memory(self, heading):
+        children = self.tree.get_children()
+        order = self.sort_cache.get(heading)
+        if order is None or len(order) != len(children):
+            keyed = [(sort_key(self.tree.set(iid, heading)), iid) for iid in children]
+            keyed.sort(key=lambda pair: pair[0])
+            order = [iid for _, iid in keyed]
+            self.sort_cache[heading] = order
+        items = reversed(order) if self.descending else order
+        for position, iid in enumerate(items):
+            self.tree.move(iid, '', position)